@@ -0,0 +1,346 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+from .queries import ExecuteWrapperMiddleware, QueryRecorder
+
+
+LATENCY_BUCKETS = (0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+QUERY_COUNT_BUCKETS = (1,2,5,10,20,50,100)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+class Metric:
+    """A metric family: one value per combination of label values.
+
+    Values live in this process. With METRICS_DIR set, every process also
+    writes them to a file there, and /metrics adds up all the files.
+    """
+    kind = None
+
+    def __init__(self,name,documentation,labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+        if not self.labelnames and self.kind != "histogram":
+            # Shown as 0 before anything is recorded.
+            self.values[()] = 0
+
+        with _lock:
+            _metrics[name] = self
+
+    def key(self,labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labels": self.labelnames,
+            "values": [[list(key),value] for key,value in self.values.items()],
+        }
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self,amount=1,**labels):
+        key = self.key(labels)
+
+        with _lock:
+            self.values[key] = self.values.get(key,0) + amount
+
+
+class Gauge(Metric):
+    """A gauge; across processes, only the values of live processes are summed."""
+    kind = "gauge"
+
+    def inc(self,amount=1,**labels):
+        key = self.key(labels)
+
+        with _lock:
+            self.values[key] = self.values.get(key,0) + amount
+
+    def dec(self,amount=1,**labels):
+        self.inc(-amount,**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self,name,documentation,labelnames=(),buckets=LATENCY_BUCKETS):
+        super().__init__(name,documentation,labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self,value,**labels):
+        key = self.key(labels)
+        # Per-bucket counts, then the +Inf count, the sum and the total count.
+        index = next((i for i,bound in enumerate(self.buckets) if value <= bound),len(self.buckets))
+
+        with _lock:
+            state = self.values.get(key)
+
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0,0]
+
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = self.buckets
+
+        return snapshot
+
+
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight","Requests being served.")
+REQUESTS = Counter("http_requests_total","Requests served.",["view","method","status"])
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds","Time to build the response.",["view","method"]
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries","Database queries per request.",["view"],buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds","Time spent in database queries per request.",["view"]
+)
+TEMPLATE_RENDER_DURATION = Histogram(
+    "template_render_duration_seconds","Time to render a template, includes included ones.",["template"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total","Cache lookups by cache and result (hit or miss).",["cache","result"]
+)
+
+
+def snapshot():
+    with _lock:
+        return {name: metric.snapshot() for name,metric in _metrics.items()}
+
+
+# Writing the per-process file
+
+_last_flush = 0.0
+
+
+def metrics_file(pid=None):
+    return os.path.join(os.fspath(settings.METRICS_DIR),f"{pid or os.getpid()}.json")
+
+
+def flush(force=False):
+    """Write this process's values to METRICS_DIR, at most every METRICS_FLUSH_INTERVAL."""
+    global _last_flush
+
+    if not settings.METRICS_DIR:
+        return
+
+    now = time.monotonic()
+
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+
+    _last_flush = now
+    path = metrics_file()
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+
+    # Readers only ever see a whole file.
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+
+    with open(temporary,"w",encoding="utf-8") as out:
+        json.dump(snapshot(),out)
+
+    os.replace(temporary,path)
+
+
+def _flush_at_exit():
+    try:
+        flush(force=True)
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+# Aggregating and rendering
+
+def process_is_alive(pid):
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def read_snapshots():
+    """This process's snapshot and those of the other processes sharing METRICS_DIR.
+
+    Yields (snapshot, alive) pairs.
+    """
+    yield snapshot(),True
+
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return
+
+    for name in os.listdir(settings.METRICS_DIR):
+        pid,extension = os.path.splitext(name)
+
+        if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+
+        try:
+            with open(os.path.join(settings.METRICS_DIR,name),encoding="utf-8") as data:
+                yield json.load(data),process_is_alive(int(pid))
+        except (OSError,ValueError):
+            continue
+
+
+def aggregate():
+    """Merge the snapshots: counters and histograms add up, gauges only from live processes."""
+    families = {}
+
+    for snapshot,alive in read_snapshots():
+        for name,family in snapshot.items():
+            if family["kind"] == "gauge" and not alive:
+                continue
+
+            merged = families.setdefault(name,{**family,"values": {}})
+
+            for key,value in family["values"]:
+                key = tuple(key)
+                current = merged["values"].get(key)
+
+                if current is None:
+                    merged["values"][key] = value
+                elif family["kind"] == "histogram":
+                    merged["values"][key] = [a + b for a,b in zip(current,value)]
+                else:
+                    merged["values"][key] = current + value
+
+    return families
+
+
+def format_value(value):
+    if isinstance(value,float) and math.isinf(value):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\","\\\\").replace("\n","\\n").replace('"','\\"')
+
+
+def format_labels(names,values,extra=()):
+    pairs = list(zip(names,values)) + list(extra)
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name,value in pairs) + "}"
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+
+    for name,family in sorted(aggregate().items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+
+        for key,value in sorted(family["values"].items()):
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{format_labels(family['labels'],key)} {format_value(value)}")
+                continue
+
+            cumulative = 0
+
+            for bound,count in zip([*family["buckets"],math.inf],value):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else format_value(float(bound))
+                lines.append(f"{name}_bucket{format_labels(family['labels'],key,[('le',le)])} {cumulative}")
+
+            lines.append(f"{name}_sum{format_labels(family['labels'],key)} {format_value(float(value[-2]))}")
+            lines.append(f"{name}_count{format_labels(family['labels'],key)} {value[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Collection
+
+def metrics_view_name(request):
+    # URL names keep the label set small; unmatched paths share one label.
+    match = request.resolver_match
+
+    if match is None:
+        return "unresolved"
+
+    return match.url_name or match.view_name
+
+
+class RequestTimer(QueryRecorder):
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+
+
+class MetricsMiddleware(ExecuteWrapperMiddleware):
+    """Record latency, status, query count and DB time per URL name.
+
+    Turned on by METRICS_ENABLED; served at /metrics.
+    """
+    def is_enabled(self):
+        return settings.METRICS_ENABLED
+
+    def make_wrapper(self,request):
+        REQUESTS_IN_FLIGHT.inc()
+        return RequestTimer()
+
+    def process_wrapped(self,request,response,timer):
+        REQUESTS_IN_FLIGHT.dec()
+
+        view = metrics_view_name(request)
+
+        REQUESTS.inc(view=view,method=request.method,status=response.status_code)
+        REQUEST_DURATION.observe(time.perf_counter() - timer.started,view=view,method=request.method)
+        REQUEST_DB_QUERIES.observe(timer.count,view=view)
+        REQUEST_DB_DURATION.observe(timer.total_time,view=view)
+
+        flush()
+
+        return response
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self,context=None,request=None):
+        start = time.perf_counter()
+
+        try:
+            return super().render(context,request)
+        finally:
+            TEMPLATE_RENDER_DURATION.observe(
+                time.perf_counter() - start,
+                template=self.origin.template_name or "<string>"
+            )
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+    def from_string(self,template_code):
+        return TimedTemplate(self.engine.from_string(template_code),self)
+
+    def get_template(self,template_name):
+        return TimedTemplate(super().get_template(template_name).template,self)
@@ -0,0 +1,256 @@
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+# Names are built from URL names and our own timestamps, never from input,
+# but downloads still only accept this shape.
+# No leading dot, so "." and ".." never pass.
+SAFE_NAME_RE = re.compile(r"^(?!\.)[\w.-]+$")
+
+PROFILE_SUFFIXES = (".prof",".txt")
+
+# tracemalloc is process-wide, so one request is profiled at a time;
+# requests arriving meanwhile are served unprofiled.
+_profiling = threading.Lock()
+
+
+def profile_dir():
+    return os.fspath(settings.PROFILING_DIR)
+
+
+def safe_name(name):
+    return re.sub(r"[^\w.-]","_",name)
+
+
+class RequestProfile:
+    """cProfile and tracemalloc data for one request.
+
+    start() and stop() must run on the thread executing the view: cProfile
+    only sees the thread it was enabled on.
+    """
+    def start(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+
+        if self.started_tracing:
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+
+        self.before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+
+        self.profiler = cProfile.Profile()
+
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Another profiler is active; from Python 3.12 there can be only one.
+            if self.started_tracing:
+                tracemalloc.stop()
+
+            raise
+
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+
+        self.after = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def allocation_top(self,limit):
+        filters = [
+            tracemalloc.Filter(False,tracemalloc.__file__),
+            tracemalloc.Filter(False,"<frozen importlib._bootstrap>"),
+        ]
+        after = self.after.filter_traces(filters)
+        before = self.before.filter_traces(filters)
+
+        return after.compare_to(before,"lineno")[:limit]
+
+    def report(self,request,response):
+        out = io.StringIO()
+        out.write(f"{request.method} {request.get_full_path()} -> {response.status_code}\n")
+        out.write(f"duration: {self.duration * 1000:.1f} ms\n")
+        out.write(f"peak traced memory: {self.peak / 1024:.1f} KiB\n\n")
+
+        out.write(f"Top {settings.PROFILING_TRACEMALLOC_TOP} allocations:\n")
+
+        for stat in self.allocation_top(settings.PROFILING_TRACEMALLOC_TOP):
+            out.write(f"{stat}\n")
+
+        out.write("\nTop functions by cumulative time:\n")
+        pstats.Stats(self.profiler,stream=out).sort_stats("cumulative").print_stats(40)
+
+        return out.getvalue()
+
+    def save(self,request,response):
+        """Write <url name>/<timestamp>-<ms>ms-<id>.prof and .txt; returns the .prof path."""
+        match = request.resolver_match
+        url_name = safe_name(match.url_name or match.view_name) if match is not None else "unresolved"
+        directory = os.path.join(profile_dir(),url_name)
+        os.makedirs(directory,exist_ok=True)
+
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+        base = os.path.join(directory,f"{stamp}-{self.duration * 1000:.0f}ms-{uuid.uuid4().hex[:8]}")
+
+        self.profiler.dump_stats(f"{base}.prof")
+
+        with open(f"{base}.txt","w",encoding="utf-8") as report:
+            report.write(self.report(request,response))
+
+        prune_profiles(directory)
+
+        return f"{base}.prof"
+
+
+def prune_profiles(directory):
+    """Keep the newest PROFILING_MAX_FILES profiles of one URL name."""
+    names = sorted(
+        {name.rsplit(".",1)[0] for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIXES)},
+        reverse=True
+    )
+
+    for name in names[settings.PROFILING_MAX_FILES:]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(directory,name + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """{url name: [profile base names, newest first]}."""
+    root = profile_dir()
+
+    if not os.path.isdir(root):
+        return {}
+
+    profiles = {}
+
+    for url_name in sorted(os.listdir(root)):
+        directory = os.path.join(root,url_name)
+
+        if not os.path.isdir(directory):
+            continue
+
+        names = sorted(
+            {name.rsplit(".",1)[0] for name in os.listdir(directory) if name.endswith(".prof")},
+            reverse=True
+        )
+
+        if names:
+            profiles[url_name] = names
+
+    return profiles
+
+
+def profile_path(url_name,filename):
+    """Path of a stored profile file, or None if the names don't name one."""
+    if not (SAFE_NAME_RE.match(url_name) and SAFE_NAME_RE.match(filename)):
+        return None
+
+    if not filename.endswith(PROFILE_SUFFIXES):
+        return None
+
+    root = os.path.realpath(profile_dir())
+    path = os.path.realpath(os.path.join(root,url_name,filename))
+
+    if os.path.commonpath([root,path]) != root:
+        return None
+
+    return path if os.path.isfile(path) else None
+
+
+class RequestProfilerMiddleware:
+    """Profile a sample of requests with cProfile and tracemalloc.
+
+    Turned on by PROFILING_ENABLED. PROFILING_SAMPLE_RATE of the requests
+    are profiled, plus requests from staff users carrying PROFILING_HEADER.
+    Profiles go to PROFILING_DIR, one directory per URL name, and are
+    listed at /profiles/ for staff.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self,get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_sampled(self):
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self,request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        requested = settings.PROFILING_HEADER in request.headers and request.user.is_staff
+
+        if not (requested or self.is_sampled()) or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profile = RequestProfile()
+
+            try:
+                profile.start()
+            except ValueError:
+                return self.get_response(request)
+
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.stop()
+
+            profile.save(request,response)
+        finally:
+            _profiling.release()
+
+        return response
+
+    async def __acall__(self,request):
+        requested = settings.PROFILING_HEADER in request.headers and (await request.auser()).is_staff
+
+        if not (requested or self.is_sampled()) or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+
+        try:
+            # Under ASGI the ORM and template work of a request runs in the
+            # thread sync_to_async uses here, so that is where cProfile looks.
+            profile = RequestProfile()
+
+            try:
+                await sync_to_async(profile.start)()
+            except ValueError:
+                return await self.get_response(request)
+
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(profile.stop)()
+
+            await sync_to_async(profile.save)(request,response)
+        finally:
+            _profiling.release()
+
+        return response
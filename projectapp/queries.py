@@ -0,0 +1,206 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """The statement's shape: literals and IN lists replaced, whitespace collapsed.
+
+    Statements that differ only in their parameters have the same shape, so
+    a shape executed many times in one request is a query run in a loop.
+    """
+    sql = IN_LIST_RE.sub("IN (...)",sql)
+    sql = LITERAL_RE.sub("?",sql)
+
+    return WHITESPACE_RE.sub(" ",sql).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper that records every statement and how long it took."""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self,execute,sql,params,many,context):
+        start = time.perf_counter()
+
+        try:
+            return execute(sql,params,many,context)
+        finally:
+            self.queries.append((sql,time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for sql,duration in self.queries)
+
+    def repeated(self,threshold=None):
+        """(shape, count) for shapes executed at least threshold times."""
+        if threshold is None:
+            threshold = settings.QUERY_REPEAT_THRESHOLD
+
+        shapes = Counter(normalize_sql(sql) for sql,duration in self.queries)
+
+        return [(shape,count) for shape,count in shapes.most_common() if count >= threshold]
+
+    def report(self):
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f} ms"]
+        lines += [f"{index}. {sql}" for index,(sql,duration) in enumerate(self.queries,1)]
+
+        return "\n".join(lines)
+
+
+@contextmanager
+def record_queries(using=connection):
+    recorder = QueryRecorder()
+
+    with using.execute_wrapper(recorder):
+        yield recorder
+
+
+class query_budget(ContextDecorator):
+    """Fail the block if it runs more than max_queries statements or an N+1 loop.
+
+    Works as a context manager or a test method decorator:
+
+        with query_budget(6):
+            self.client.get(url)
+    """
+    def __init__(self,max_queries,repeat_threshold=None):
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold
+
+    def __enter__(self):
+        self.recording = record_queries()
+        self.recorder = self.recording.__enter__()
+
+        return self.recorder
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.recording.__exit__(exc_type,exc_value,traceback)
+
+        if exc_type is not None:
+            return False
+
+        if self.recorder.count > self.max_queries:
+            raise AssertionError(
+                f"Query budget of {self.max_queries} exceeded: {self.recorder.report()}"
+            )
+
+        repeated = self.recorder.repeated(self.repeat_threshold)
+
+        if repeated:
+            shapes = "\n".join(f"{count}x {shape}" for shape,count in repeated)
+            raise AssertionError(f"Repeated queries (N+1):\n{shapes}")
+
+        return False
+
+
+class ExecuteWrapperMiddleware:
+    """Install an execute_wrapper on the default connection for each request.
+
+    Subclasses build the wrapper in make_wrapper and look at it once the
+    response is ready in process_wrapped. Under ASGI a request's ORM calls
+    all run in one worker thread, the one sync_to_async uses here, so the
+    wrapper is installed on that thread's connection and async views are
+    not forced onto the sync path.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self,get_response):
+        if not self.is_enabled():
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_enabled(self):
+        return True
+
+    def make_wrapper(self,request):
+        raise NotImplementedError
+
+    def process_wrapped(self,request,response,wrapper):
+        return response
+
+    def __call__(self,request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        wrapper = self.make_wrapper(request)
+
+        with connection.execute_wrapper(wrapper):
+            response = self.get_response(request)
+
+        return self.process_wrapped(request,response,wrapper)
+
+    async def __acall__(self,request):
+        wrapper = self.make_wrapper(request)
+        installed = await sync_to_async(self.install)(wrapper)
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(installed.__exit__)(None,None,None)
+
+        return self.process_wrapped(request,response,wrapper)
+
+    def install(self,wrapper):
+        installed = connection.execute_wrapper(wrapper)
+        installed.__enter__()
+
+        return installed
+
+
+def view_name(request):
+    match = request.resolver_match
+    return match.view_name if match is not None else request.path
+
+
+class QueryInstrumentationMiddleware(ExecuteWrapperMiddleware):
+    """Log each request's query count and DB time, and warn about N+1 loops.
+
+    Turned on by QUERY_INSTRUMENTATION. Responses get X-Query-Count and
+    X-Query-Time-Ms headers. Queries run while a streaming response is
+    being consumed are not counted.
+    """
+    def is_enabled(self):
+        return settings.QUERY_INSTRUMENTATION
+
+    def make_wrapper(self,request):
+        return QueryRecorder()
+
+    def process_wrapped(self,request,response,recorder):
+        view = view_name(request)
+
+        logger.debug(
+            "%s %s: %d queries in %.1f ms",
+            request.method,view,recorder.count,recorder.total_time * 1000
+        )
+
+        for shape,count in recorder.repeated():
+            logger.warning("%s %s: N+1 query, %d times: %s",request.method,view,count,shape)
+
+        response["X-Query-Count"] = str(recorder.count)
+        response["X-Query-Time-Ms"] = f"{recorder.total_time * 1000:.1f}"
+
+        return response
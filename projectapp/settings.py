@@ -43,19 +43,24 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'projectapp.metrics.MetricsMiddleware',
+    'projectapp.queries.QueryInstrumentationMiddleware',
+    'projectapp.slowqueries.SlowQueryLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projectapp.profiling.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'projectapp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for /metrics.
+        'BACKEND': 'projectapp.metrics.DjangoTemplates',
         'DIRS': ['templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -117,6 +122,139 @@ LOGIN_REDIRECT_URL = '/projects/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 
+# Cache
+# The project role cache is invalidated from signal handlers, which only
+# reach the process that made the change. Run several processes against a
+# shared backend (Memcached, Redis) so they all see the invalidation.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # The default of 300 entries is culled by a single 200-row page
+        # (one row and one version entry per task).
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Seconds a user's role in a project is cached.
+PROJECT_ROLE_CACHE_TIMEOUT = 300
+
+# Seconds a Project or Task instance is kept by the object caches
+# (projects.cache, tasks.cache). Writes bump the object's version, so the
+# timeout only bounds memory, not staleness.
+OBJECT_CACHE_TIMEOUT = 300
+
+
+# Query instrumentation
+# QueryInstrumentationMiddleware logs every request's query count and DB
+# time and warns when one statement shape runs QUERY_REPEAT_THRESHOLD or
+# more times in a request (an N+1 loop). Tests pin budgets with
+# projectapp.queries.query_budget.
+
+QUERY_INSTRUMENTATION = DEBUG
+QUERY_REPEAT_THRESHOLD = 5
+
+# Slow query log
+# SlowQueryLogMiddleware appends statements slower than
+# SLOW_QUERY_THRESHOLD_MS to SLOW_QUERY_LOG_FILE as JSON lines, with the
+# view, redacted parameters and the query plan. The file rotates at
+# SLOW_QUERY_LOG_MAX_BYTES; `manage.py summarize_slow_queries` reports
+# the worst statements.
+
+SLOW_QUERY_LOG = True
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG_FILE = BASE_DIR / 'logs' / 'slow_queries.jsonl'
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 3
+
+
+# Request profiling
+# RequestProfilerMiddleware profiles PROFILING_SAMPLE_RATE of the requests,
+# and staff requests sending the PROFILING_HEADER header, with cProfile and
+# tracemalloc. Each profile is a .prof file (open with pstats or snakeviz)
+# and a .txt report of the top allocations and functions, kept per URL name
+# under PROFILING_DIR and listed for staff at /profiles/. Off by default:
+# a profiled request runs several times slower.
+
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_HEADER = 'X-Profile'
+PROFILING_DIR = BASE_DIR / 'logs' / 'profiles'
+PROFILING_MAX_FILES = 50
+PROFILING_TRACEMALLOC_FRAMES = 1
+PROFILING_TRACEMALLOC_TOP = 25
+
+
+# Metrics
+# MetricsMiddleware records per-URL-name latency, status, query count and
+# DB time; templates, caches and in-flight requests are tracked too. They
+# are served in the Prometheus text format at /metrics to staff users, and
+# to scrapers that connect from METRICS_ALLOWED_IPS and send
+# "Authorization: Bearer <METRICS_TOKEN>"; with no token set, only staff
+# can read them. With several worker processes on one host, point
+# METRICS_DIR at a directory they share: each process writes its values
+# there every METRICS_FLUSH_INTERVAL seconds and /metrics adds them up.
+# Clear the directory when the service restarts.
+
+METRICS_ENABLED = True
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = None
+
+
+# Benchmarks
+# run_benchmarks writes its results to BENCHMARK_DIR/latest.json and, when
+# BENCHMARK_DIR/baseline.json exists, fails if a benchmark's median got
+# slower than the baseline's by more than BENCHMARK_REGRESSION_THRESHOLD
+# (0.25 is 25%). Timings depend on the machine: keep baselines local.
+
+BENCHMARK_DIR = BASE_DIR / 'benchmarks'
+BENCHMARK_REGRESSION_THRESHOLD = 0.25
+
+
+# Task search
+# SQLiteFTSSearchBackend falls back to LIKE matching when the database has
+# no FTS5 table; use 'tasks.search.LikeSearchBackend' to always use LIKE.
+
+TASKS_SEARCH_BACKEND = 'tasks.search.SQLiteFTSSearchBackend'
+
+# Seconds the ids matching a task list search are cached; 0 turns it off.
+# Entries are keyed by the project version, which task writes and renaming
+# or deleting an assignee bump.
+TASKS_SEARCH_CACHE_TIMEOUT = 60
+
+
+# Task list page cache
+# Seconds a rendered task list page is cached for viewers sharing a role;
+# 0 turns the cache off. Entries are keyed by the project version, so the
+# timeout only bounds memory.
+
+TASKS_LIST_CACHE_TIMEOUT = 0
+
+# Seconds a rendered task row is cached. Rows are keyed by the task's
+# object cache version, so unlike whole pages they are cached by default;
+# 0 renders every row on every request.
+
+TASKS_ROW_CACHE_TIMEOUT = 300
+
+
+# Live task events
+# The hub fans committed task changes out to the project's SSE listeners;
+# InProcessEventHub only reaches listeners served by the same process.
+# Listeners get a keep-alive comment after TASKS_EVENTS_HEARTBEAT idle seconds.
+
+TASKS_EVENT_HUB = 'tasks.events.InProcessEventHub'
+TASKS_EVENTS_HEARTBEAT = 15
+
+
+# Task change feed
+# prune_task_changes deletes changes older than this many days; clients
+# whose cursor predates the pruned changes get a 410 and reload the tasks.
+
+TASKS_CHANGES_RETENTION_DAYS = 30
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
@@ -0,0 +1,170 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError, transaction
+
+from .queries import ExecuteWrapperMiddleware, view_name
+
+
+# Statements worth a plan; EXPLAIN of anything else is either rejected or
+# says nothing useful.
+EXPLAINED_STATEMENTS = ("SELECT","UPDATE","DELETE","WITH")
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def get_slow_query_logger():
+    """Logger writing one JSON object per line to SLOW_QUERY_LOG_FILE, rotated by size."""
+    global _handler
+
+    logger = logging.getLogger("projectapp.slowqueries")
+
+    with _handler_lock:
+        path = os.fspath(settings.SLOW_QUERY_LOG_FILE)
+
+        if _handler is None or _handler.baseFilename != os.path.abspath(path):
+            os.makedirs(os.path.dirname(path) or ".",exist_ok=True)
+
+            if _handler is not None:
+                logger.removeHandler(_handler)
+                _handler.close()
+
+            _handler = RotatingFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+            logger.addHandler(_handler)
+            logger.setLevel(logging.INFO)
+            # The records are data, not messages for the console.
+            logger.propagate = False
+
+    return logger
+
+
+def redact(value):
+    """Keep numbers, booleans and None; replace everything else by its type."""
+    if value is None or isinstance(value,(bool,int,float)):
+        return value
+
+    if isinstance(value,(list,tuple)):
+        return [redact(item) for item in value]
+
+    if isinstance(value,(str,bytes)):
+        return f"<{type(value).__name__} len={len(value)}>"
+
+    return f"<{type(value).__name__}>"
+
+
+def explain(connection,sql,params):
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return None
+
+    try:
+        prefix = connection.ops.explain_query_prefix()
+    except NotSupportedError:
+        return None
+
+    try:
+        # In a savepoint of its own: a failed EXPLAIN must not abort the
+        # transaction of the view that ran the query (PostgreSQL).
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}",params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+
+    # SQLite rows are (id, parent, notused, detail); other backends return
+    # one text column per row.
+    return [" ".join(str(column) for column in row[3:]) if len(row) >= 4 else str(row[0]) for row in rows]
+
+
+class SlowQueryLogger:
+    """execute_wrapper that logs statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+    Pass the request being served to record its view and path.
+    """
+    def __init__(self,request=None):
+        self.request = request
+        self.explaining = False
+
+    def __call__(self,execute,sql,params,many,context):
+        if self.explaining:
+            return execute(sql,params,many,context)
+
+        start = time.perf_counter()
+        result = execute(sql,params,many,context)
+        duration = (time.perf_counter() - start) * 1000
+
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.log(context["connection"],sql,params,many,duration)
+
+        return result
+
+    def log(self,connection,sql,params,many,duration):
+        plan = None
+
+        if not many and not connection.needs_rollback:
+            self.explaining = True
+
+            try:
+                plan = explain(connection,sql,params)
+            finally:
+                self.explaining = False
+
+        record = {
+            "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "duration_ms": round(duration,3),
+            # Resolved by now: URL resolution runs before the view's queries.
+            "view": view_name(self.request) if self.request is not None else None,
+            "path": self.request.path if self.request is not None else None,
+            "database": connection.alias,
+            "sql": sql,
+            "params": redact(list(params)) if params is not None and not many else None,
+            "many": many,
+            "plan": plan,
+        }
+
+        get_slow_query_logger().info(json.dumps(record))
+
+
+class SlowQueryLogMiddleware(ExecuteWrapperMiddleware):
+    """Log the slow statements of each request with their view and plan.
+
+    Turned on by SLOW_QUERY_LOG; see the settings next to it.
+    """
+    def is_enabled(self):
+        return settings.SLOW_QUERY_LOG
+
+    def make_wrapper(self,request):
+        return SlowQueryLogger(request)
+
+
+def read_slow_queries(path):
+    """Records from path and its rotated backups, oldest file first."""
+    path = os.fspath(path)
+    files = [f"{path}.{index}" for index in range(settings.SLOW_QUERY_LOG_BACKUP_COUNT,0,-1)] + [path]
+
+    for name in files:
+        if not os.path.exists(name):
+            continue
+
+        with open(name,encoding="utf-8") as lines:
+            for line in lines:
+                line = line.strip()
+
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash or a rotation.
+                        continue
@@ -0,0 +1,14 @@
+from django.core.cache import cache
+from django.test import TestCase as DjangoTestCase
+
+
+class TestCase(DjangoTestCase):
+    """TestCase that starts every test with an empty cache.
+
+    Tests run against the configured cache, as the site does. Test
+    databases roll back and reuse primary keys, so entries left by an
+    earlier test would otherwise be served for unrelated rows.
+    """
+    def setUp(self):
+        super().setUp()
+        cache.clear()
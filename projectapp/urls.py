@@ -21,7 +21,12 @@ from. import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',views.home,name="home"),
+    path('metrics',views.metrics,name="metrics"),
+    path('profiles/',views.profile_list,name="profile_list"),
+    path('profiles/<str:url_name>/<str:filename>',views.profile_download,name="profile_download"),
     path('projects/',include('projects.urls')),
     path('tasks/',include('tasks.urls')),
+    path('api/',include('projects.api_urls')),
+    path('api/',include('tasks.api_urls')),
     path('accounts/',include("django.contrib.auth.urls"))
 ]
@@ -1,9 +1,58 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.utils.crypto import constant_time_compare
 
-
-from django.shortcuts import redirect
+from .metrics import render_metrics
+from .profiling import list_profiles, profile_path
 
 
 def home(request):
     if request.user.is_authenticated:
        return  redirect("list_projects")
-    return redirect("login")
\ No newline at end of file
+    return redirect("login")
+
+
+def is_metrics_scraper(request):
+    # Scrapers don't log in. The address alone is not enough: behind a
+    # reverse proxy on the same host every request comes from 127.0.0.1.
+    token = settings.METRICS_TOKEN
+
+    if not token or request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return False
+
+    return constant_time_compare(request.headers.get("Authorization",""),f"Bearer {token}")
+
+
+def metrics(request):
+    if not (request.user.is_staff or is_metrics_scraper(request)):
+        raise PermissionDenied
+
+    return HttpResponse(render_metrics(),content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@login_required
+def profile_list(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    return render(
+        request,
+        "profiles.html",
+        {"profiles": list_profiles(),"header": settings.PROFILING_HEADER}
+    )
+
+
+@login_required
+def profile_download(request,url_name,filename):
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    path = profile_path(url_name,filename)
+
+    if path is None:
+        raise Http404
+
+    return FileResponse(open(path,"rb"),as_attachment=filename.endswith(".prof"),filename=filename)
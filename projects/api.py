@@ -0,0 +1,370 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from tasks.access import resolve_project
+
+from .cache import object_cache_stats
+from .forms import ProjectForm
+from .models import Project, ProjectMembership
+from .permissions import OWNER, can_transfer_ownership, get_project_role, is_project_owner
+from .services import add_member, bump_project_version, get_api_token_user, remove_member, transfer_project_ownership
+
+
+class ApiError(Exception):
+    def __init__(self,status,message,errors=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+
+
+def api_error(status,message,errors=None):
+    payload = {"error": message}
+
+    if errors:
+        payload["errors"] = errors
+
+    return JsonResponse(payload,status=status)
+
+
+class ApiCsrfCheck(CsrfViewMiddleware):
+    # The middleware's checks, failing with a JSON 403 instead of a page.
+    def _reject(self,request,reason):
+        return api_error(403,f"CSRF check failed: {reason}")
+
+
+def authenticate_api_request(request):
+    """None when the request may go on, otherwise the error response.
+
+    Scripts send "Authorization: Bearer <token>" (see create_api_token) and
+    need no CSRF token. Browser sessions are still CSRF-checked on writes.
+    """
+    authorization = request.headers.get("Authorization","")
+
+    if authorization.startswith("Bearer "):
+        user = get_api_token_user(authorization.removeprefix("Bearer ").strip())
+
+        if user is None:
+            return api_error(401,"Invalid API token")
+
+        request.user = user
+        return None
+
+    if not request.user.is_authenticated:
+        return api_error(401,"Authentication required")
+
+    return ApiCsrfCheck(lambda request: None).process_view(request,None,(),{})
+
+
+def api_view(*methods):
+    """Turn a view into a JSON endpoint for the given HTTP methods.
+
+    Requests are authenticated by authenticate_api_request; anonymous ones
+    get 401. Http404, PermissionDenied, BadRequest and ApiError raised by
+    the view become JSON error responses, so views can use
+    get_object_or_404 and the projects.permissions helpers as the HTML
+    views do.
+    """
+    def decorator(view):
+        # CSRF is checked in authenticate_api_request, for sessions only.
+        @csrf_exempt
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request,*args,**kwargs):
+            rejected = authenticate_api_request(request)
+
+            if rejected is not None:
+                return rejected
+
+            try:
+                return view(request,*args,**kwargs)
+            except ApiError as exc:
+                return api_error(exc.status,exc.message,exc.errors)
+            except BadRequest as exc:
+                return api_error(400,str(exc) or "Bad request")
+            except PermissionDenied:
+                return api_error(403,"Permission denied")
+            except Http404:
+                return api_error(404,"Not found")
+
+        return wrapper
+
+    return decorator
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ApiError(400,"Request body is not valid JSON")
+
+    if not isinstance(data,dict):
+        raise ApiError(400,"Request body must be a JSON object")
+
+    return data
+
+
+def raise_invalid(form):
+    raise ApiError(400,"Invalid data",form.errors.get_json_data())
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(repr(parts).encode(),usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def query_key(request):
+    return sorted(request.GET.lists())
+
+
+def conditional_json(request,etag,last_modified,build):
+    """Answer with 304 when the client's validators still match.
+
+    build is only called for a full response, so an unchanged resource
+    costs the validator lookup and nothing else.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request,etag=etag,last_modified=timestamp)
+
+    if response is None:
+        response = JsonResponse(build())
+
+    response["ETag"] = etag
+
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+
+    # Payloads depend on who is asking.
+    patch_vary_headers(response,["Authorization","Cookie"])
+
+    return response
+
+
+def get_project_for(request,project_id):
+    """The project and the caller's role; reads are cached, writes load the row."""
+    project = resolve_project(request,project_id)
+
+    if request.project_role is None:
+        raise PermissionDenied
+
+    return project,request.project_role
+
+
+def find_user(value):
+    try:
+        return User.objects.filter(pk=int(value)).first()
+    except (TypeError,ValueError):
+        return None
+
+
+def serialize_user(user):
+    if user is None:
+        return None
+
+    return {"id": user.pk,"username": user.username}
+
+
+def serialize_project(project,role):
+    return {
+        "id": project.pk,
+        "name": project.name,
+        "owner": serialize_user(project.owner),
+        "role": role,
+        "created_at": project.created_at,
+        "updated_at": project.updated_at,
+        "version": project.version,
+    }
+
+
+def user_projects(user):
+    # pk__in rather than a join on memberships: no duplicate rows, so
+    # the aggregates behind the list ETag stay exact.
+    return Project.objects.filter(
+        Q(owner=user) |
+        Q(pk__in=ProjectMembership.objects.filter(user=user).values("project"))
+    )
+
+
+@api_view("GET","POST")
+def api_project_list(request):
+    if request.method == "POST":
+        form = ProjectForm(read_json(request))
+
+        if not form.is_valid():
+            raise_invalid(form)
+
+        project = form.save(commit=False)
+        project.owner = request.user
+        project.save()
+
+        return JsonResponse(serialize_project(project,OWNER),status=201)
+
+    projects = user_projects(request.user)
+    state = projects.aggregate(
+        count=Count("pk"),
+        versions=Sum("version"),
+        updated_at=Max("updated_at"),
+    )
+
+    def build():
+        membership_role = ProjectMembership.objects.filter(
+            project=OuterRef("pk"),
+            user=request.user
+        ).values("role")[:1]
+
+        rows = projects.select_related("owner").annotate(
+            membership_role=Subquery(membership_role)
+        ).order_by("-created_at","-pk")
+
+        return {
+            "results": [
+                serialize_project(
+                    project,
+                    OWNER if project.owner_id == request.user.pk else project.membership_role
+                )
+                for project in rows
+            ]
+        }
+
+    etag = make_etag("projects",request.user.pk,state["count"],state["versions"],state["updated_at"])
+
+    return conditional_json(request,etag,state["updated_at"],build)
+
+
+@api_view("GET","PATCH","DELETE")
+def api_project_detail(request,project_id):
+    project,role = get_project_for(request,project_id)
+
+    if request.method == "DELETE":
+        if not is_project_owner(request.user,project):
+            raise PermissionDenied
+
+        project.delete()
+
+        return HttpResponse(status=204)
+
+    if request.method == "PATCH":
+        data = read_json(request)
+
+        if not is_project_owner(request.user,project):
+            raise PermissionDenied
+
+        # Rename and transfer together or not at all.
+        with transaction.atomic():
+            if "name" in data:
+                form = ProjectForm({"name": data["name"]},instance=project)
+
+                if not form.is_valid():
+                    raise_invalid(form)
+
+                project.save(update_fields=["name","updated_at"])
+                bump_project_version(project)
+
+            if "owner" in data:
+                new_owner = find_user(data["owner"])
+
+                if new_owner is None or not can_transfer_ownership(request.user,project,new_owner):
+                    raise ApiError(400,"The new owner must be a member of the project")
+
+                transfer_project_ownership(project,new_owner)
+
+        project = Project.objects.select_related("owner").get(pk=project.pk)
+        role = get_project_role(request.user,project)
+
+        return JsonResponse(serialize_project(project,role))
+
+    def build():
+        payload = serialize_project(project,role)
+        payload["members"] = [
+            {**serialize_user(membership.user),"role": membership.role,"joined_at": membership.joined_at}
+            for membership in project.memberships.select_related("user").order_by("joined_at","pk")
+        ]
+
+        return payload
+
+    etag = make_etag("project",project.pk,project.version,request.user.pk)
+
+    return conditional_json(request,etag,project.updated_at,build)
+
+
+@api_view("GET","POST")
+def api_project_members(request,project_id):
+    project,role = get_project_for(request,project_id)
+
+    if request.method == "POST":
+        if not is_project_owner(request.user,project):
+            raise PermissionDenied
+
+        user = find_user(read_json(request).get("user"))
+
+        if user is None:
+            raise ApiError(400,"Unknown user")
+
+        if user.pk == project.owner_id:
+            raise ApiError(400,"The owner is already part of the project")
+
+        if ProjectMembership.objects.filter(project=project,user=user).exists():
+            raise ApiError(400,"The user is already a member")
+
+        membership = add_member(project,user)
+
+        return JsonResponse(
+            {**serialize_user(user),"role": membership.role,"joined_at": membership.joined_at},
+            status=201
+        )
+
+    def build():
+        return {
+            "results": [
+                {**serialize_user(membership.user),"role": membership.role,"joined_at": membership.joined_at}
+                for membership in project.memberships.select_related("user").order_by("joined_at","pk")
+            ]
+        }
+
+    etag = make_etag("members",project.pk,project.version,request.user.pk)
+
+    return conditional_json(request,etag,project.updated_at,build)
+
+
+@api_view("DELETE")
+def api_project_member(request,project_id,user_id):
+    project,role = get_project_for(request,project_id)
+
+    # The owner manages members; a member may leave.
+    if not (role == OWNER or request.user.pk == user_id):
+        raise PermissionDenied
+
+    if user_id == project.owner_id:
+        raise ApiError(400,"The owner cannot be removed; transfer ownership first")
+
+    user = get_object_or_404(User,pk=user_id)
+
+    if not ProjectMembership.objects.filter(project=project,user=user).exists():
+        raise Http404
+
+    remove_member(project,user)
+
+    return HttpResponse(status=204)
+
+
+@api_view("GET")
+def api_cache_stats(request):
+    """Hit, miss and invalidation counts of this process's object caches."""
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    return JsonResponse({"object_caches": object_cache_stats()})
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import api
+
+
+urlpatterns = [
+    path("projects/",api.api_project_list,name="api_project_list"),
+    path("projects/<int:project_id>/",api.api_project_detail,name="api_project_detail"),
+    path("projects/<int:project_id>/members/",api.api_project_members,name="api_project_members"),
+    path("projects/<int:project_id>/members/<int:user_id>/",api.api_project_member,name="api_project_member"),
+    path("cache-stats/",api.api_cache_stats,name="api_cache_stats"),
+]
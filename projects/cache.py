@@ -0,0 +1,216 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from projectapp.metrics import CACHE_REQUESTS
+
+from .models import Project
+
+
+class ObjectCache:
+    """Read-through cache of model instances, keyed by pk and a version.
+
+    Each object has a version number in the cache; its instance is stored
+    under "<pk>:<version>". bump() moves the version on, which orphans the
+    stored instance, so writers never have to know what readers cached.
+    Versions start from a timestamp rather than 1, so a version that was
+    evicted can't come back and meet an old instance again.
+
+    Only concrete fields and the relations named in related are stored.
+    """
+    def __init__(self,model,related=(),timeout=None):
+        self.model = model
+        self.related = tuple(related)
+        self.timeout = timeout
+        self.prefix = f"objects:{model._meta.label_lower}"
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bumps = 0
+
+    def get_timeout(self):
+        return self.timeout if self.timeout is not None else settings.OBJECT_CACHE_TIMEOUT
+
+    def version_key(self,pk):
+        return f"{self.prefix}:{pk}:version"
+
+    def get_version(self,pk):
+        key = self.version_key(pk)
+        version = cache.get(key)
+
+        if version is None:
+            cache.add(key,time.time_ns(),self.get_timeout())
+            version = cache.get(key)
+
+        return version
+
+    def get_versions(self,pks):
+        """get_version for many pks, in two round trips at most."""
+        keys = {self.version_key(pk): pk for pk in pks}
+        versions = cache.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+
+        if missing:
+            for key in missing:
+                cache.add(key,time.time_ns(),self.get_timeout())
+
+            versions.update(cache.get_many(missing))
+
+        return {pk: versions.get(key) for key,pk in keys.items()}
+
+    def object_key(self,pk,version):
+        return f"{self.prefix}:{pk}:{version}"
+
+    def count(self,hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        CACHE_REQUESTS.inc(cache=self.prefix,result="hit" if hit else "miss")
+
+    def lookup(self,pk):
+        version = self.get_version(pk)
+        instance = cache.get(self.object_key(pk,version))
+        self.count(instance is not None)
+
+        return instance,version
+
+    def peek(self,pk):
+        """The cached instance, or None; never queries the database."""
+        return self.lookup(pk)[0]
+
+    def store(self,instance,version=None):
+        """Cache instance under version, by default the current one.
+
+        Pass the version read before loading the row: if a writer bumped it
+        in between, the possibly stale row lands under a dead key.
+        """
+        if version is None:
+            version = self.get_version(instance.pk)
+
+        clean = self.model.from_db(
+            instance._state.db,
+            [field.attname for field in self.model._meta.concrete_fields],
+            [getattr(instance,field.attname) for field in self.model._meta.concrete_fields]
+        )
+
+        for name in self.related:
+            if name in instance._state.fields_cache:
+                clean._state.fields_cache[name] = instance._state.fields_cache[name]
+
+        cache.set(self.object_key(instance.pk,version),clean,self.get_timeout())
+
+    def get(self,pk):
+        """Cached instance for pk, loading it on a miss; raises DoesNotExist."""
+        instance,version = self.lookup(pk)
+
+        if instance is None:
+            instance = self.model._default_manager.select_related(*self.related).get(pk=pk)
+            self.store(instance,version)
+
+        return instance
+
+    def get_or_404(self,pk):
+        try:
+            return self.get(pk)
+        except self.model.DoesNotExist:
+            raise Http404(f"No {self.model._meta.object_name} matches the given query.")
+
+    def bump(self,*pks):
+        def bump():
+            for pk in pks:
+                try:
+                    cache.incr(self.version_key(pk))
+                except ValueError:
+                    # No version yet: nothing cached under it either.
+                    pass
+
+        with self.lock:
+            self.bumps += len(pks)
+
+        # Again after commit, in case a reader cached the old row meanwhile.
+        bump()
+        transaction.on_commit(bump)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bumps": self.bumps,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = self.misses = self.bumps = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and get its result. If it raises, each waiter runs the
+    function itself, so an error is never handed to a request that didn't
+    cause it.
+    """
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.failed = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coalesced = 0
+
+    def do(self,key,func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self.calls[key] = self.Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            return func() if call.failed else call.result
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+            call.done.set()
+
+        return call.result
+
+
+_caches = []
+
+
+def register_object_cache(object_cache):
+    _caches.append(object_cache)
+    return object_cache
+
+
+def object_cache_stats():
+    return {object_cache.model._meta.label_lower: object_cache.stats() for object_cache in _caches}
+
+
+project_cache = register_object_cache(ObjectCache(Project,related=("owner",)))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.services import create_api_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Create an API token for a user and print it. Scripts send it as "
+        "'Authorization: Bearer <token>' and need no CSRF token. Only a digest "
+        "is stored, so the token cannot be shown again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--name",default="",help="What the token is for.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        self.stdout.write(create_api_token(user,options["name"]))
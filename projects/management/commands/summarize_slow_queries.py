@@ -0,0 +1,46 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from projectapp.queries import normalize_sql
+from projectapp.slowqueries import read_slow_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the slow query log: statements grouped by shape, worst "
+        "total time first, with the views that ran them and their last plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file",default=None,help="Log file (default: SLOW_QUERY_LOG_FILE).")
+        parser.add_argument("--limit",type=int,default=10)
+
+    def handle(self, *args, **options):
+        shapes = defaultdict(lambda: {"count": 0,"total_ms": 0.0,"max_ms": 0.0,"views": set(),"plan": None})
+
+        for record in read_slow_queries(options["file"] or settings.SLOW_QUERY_LOG_FILE):
+            shape = shapes[normalize_sql(record["sql"])]
+            shape["count"] += 1
+            shape["total_ms"] += record["duration_ms"]
+            shape["max_ms"] = max(shape["max_ms"],record["duration_ms"])
+            shape["views"].add(record.get("view") or "-")
+            shape["plan"] = record.get("plan") or shape["plan"]
+
+        if not shapes:
+            self.stdout.write("No slow queries logged")
+            return
+
+        worst = sorted(shapes.items(),key=lambda item: item[1]["total_ms"],reverse=True)
+
+        for rank,(sql,shape) in enumerate(worst[:options["limit"]],1):
+            self.stdout.write(
+                f"{rank}. {shape['total_ms']:.1f} ms total, {shape['count']} calls, "
+                f"avg {shape['total_ms'] / shape['count']:.1f} ms, max {shape['max_ms']:.1f} ms"
+            )
+            self.stdout.write(f"   views: {', '.join(sorted(shape['views']))}")
+            self.stdout.write(f"   {sql}")
+
+            for line in shape["plan"] or []:
+                self.stdout.write(f"   plan: {line}")
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_delete_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
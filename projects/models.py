@@ -18,6 +18,11 @@ class Project(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Bumped by every write to the project, its memberships or its tasks;
+    # used to validate cached and conditional responses.
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
     
@@ -54,3 +59,23 @@ class ProjectMembership(models.Model):
     def __str__(self):
         return f"{self.user} works in  ${self.project}"
     
+
+
+class ApiToken(models.Model):
+    """Bearer token for scripts calling the JSON API as user.
+
+    Only a SHA-256 digest of the token is stored; the token itself is shown
+    once, when create_api_token makes it.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="api_tokens"
+    )
+    name = models.CharField(max_length=100,blank=True)
+    digest = models.CharField(max_length=64,unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True,blank=True)
+
+    def __str__(self):
+        return f"{self.user} {self.name}".strip()
@@ -1,30 +1,127 @@
+from collections import namedtuple
 
+from django.conf import settings
+from django.core.cache import cache
+
+from projectapp.metrics import CACHE_REQUESTS
+
+from .models import ProjectMembership
+
+
+OWNER = "owner"
+
+# Stored for users without a membership, so misses are cached too.
+NO_ROLE = ""
+
+
+def role_cache_key(project_id,user_id):
+    return f"projects:role:{project_id}:{user_id}"
+
+
+def get_membership_role(project_id,user_id):
+    """Role of the user's membership in the project, or None.
+
+    Cached; projects.signals drops the entry when the membership or the
+    project's owner changes.
+    """
+    if user_id is None:
+        return None
+
+    key = role_cache_key(project_id,user_id)
+    role = cache.get(key)
+    CACHE_REQUESTS.inc(cache="projects:role",result="miss" if role is None else "hit")
+
+    if role is None:
+        role = ProjectMembership.objects.filter(
+            project_id=project_id,
+            user_id=user_id
+        ).values_list("role",flat=True).first() or NO_ROLE
+
+        cache.set(key,role,settings.PROJECT_ROLE_CACHE_TIMEOUT)
+
+    return role or None
+
+
+def remember_membership_role(project_id,user_id,role):
+    """Seed the cache with a role the caller has just read from the database."""
+    cache.set(role_cache_key(project_id,user_id),role or NO_ROLE,settings.PROJECT_ROLE_CACHE_TIMEOUT)
+
+
+def forget_membership_role(project_id,user_id):
+    cache.delete(role_cache_key(project_id,user_id))
+
+
+def get_project_role(user,project):
+    if not user.is_authenticated:
+        return None
+
+    if project.owner_id == user.pk:
+        return OWNER
+
+    return get_membership_role(project.pk,user.pk)
 
 
 def is_project_owner(user,project):
-    return project.owner == user
+    return user.is_authenticated and project.owner_id == user.pk
 
 
 def is_project_member(user,project):
-    return project.members.filter(pk=user.pk).exists()
+    return get_membership_role(project.pk,user.pk) is not None
 
 def can_edit_taks(user,task):
-    return (task.project.owner == user) or (task.assigned_to == user)
+    return is_project_owner(user,task.project) or (user.is_authenticated and task.assigned_to_id == user.pk)
 
 
 def can_toggle_task(user,task):
-    return (task.assigned_to == user or  user == task.project.owner)
+    return can_edit_taks(user,task)
 
 
 def can_assign_task(user,task,assignee):
-    if task.project.owner != user:
+    if not is_project_owner(user,task.project):
         return False
-    
-    return task.project.members.filter(pk=assignee.pk).exists()
+
+    return is_project_member(assignee,task.project)
 
 def can_transfer_ownership(curr_user,project,new_owner):
-    if project.owner != curr_user:
+    if not is_project_owner(curr_user,project):
         return False
-    
-    return project.members.filter(pk=new_owner.pk).exists()
 
+    return is_project_member(new_owner,project)
+
+
+TaskPermissions = namedtuple("TaskPermissions",["can_edit","can_complete","can_assign","can_delete"])
+
+NO_TASK_PERMISSIONS = TaskPermissions(False,False,False,False)
+
+_UNRESOLVED = object()
+
+
+def get_task_permissions(user,project,tasks,role=_UNRESOLVED):
+    """TaskPermissions for every task of project, keyed by task pk.
+
+    Same rules as can_edit_taks/can_toggle_task and the owner-only views,
+    read from project.owner_id and each task's assigned_to_id and
+    is_completed, so a page costs at most the role lookup. Pass role when
+    the caller has already resolved it.
+    """
+    if role is _UNRESOLVED:
+        role = get_project_role(user,project)
+
+    if role is None:
+        return {task.pk: NO_TASK_PERMISSIONS for task in tasks}
+
+    is_owner = role == OWNER
+
+    permissions = {}
+
+    for task in tasks:
+        is_assignee = task.assigned_to_id == user.pk
+
+        permissions[task.pk] = TaskPermissions(
+            can_edit=is_owner or is_assignee,
+            can_complete=(is_owner or is_assignee) and not task.is_completed,
+            can_assign=is_owner,
+            can_delete=is_owner,
+        )
+
+    return permissions
@@ -0,0 +1,143 @@
+import hashlib
+import secrets
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from tasks.models import Task
+
+from .cache import project_cache
+from .models import ApiToken, Project, ProjectMembership
+from .permissions import OWNER
+
+
+PROJECTS_PER_PAGE = 20
+
+
+def bump_project_version(project):
+    """Increment the project's version and return the new value.
+
+    The UPDATE holds its write lock until the surrounding transaction ends, so
+    versions are handed out in commit order.
+    """
+    Project.objects.filter(pk=project.pk).update(
+        version=F("version") + 1,
+        updated_at=timezone.now()
+    )
+    project_cache.bump(project.pk)
+
+    return Project.objects.filter(pk=project.pk).values_list("version",flat=True).get()
+
+
+def add_member(project,user):
+    with transaction.atomic():
+        membership = ProjectMembership.objects.create(
+            project=project,
+            user=user,
+        )
+        bump_project_version(project)
+
+    return membership
+
+
+def remove_member(project,user):
+    with transaction.atomic():
+        ProjectMembership.objects.filter(
+            project=project,
+            user=user
+        ).delete()
+        bump_project_version(project)
+
+
+def transfer_project_ownership(project,new_owner):
+    old_owner = project.owner
+
+    with transaction.atomic():
+        project.owner = new_owner
+        project.save(update_fields=["owner","updated_at"])
+
+        ProjectMembership.objects.filter(
+            project=project,
+            user=new_owner
+        ).delete()
+
+        ProjectMembership.objects.get_or_create(
+            project=project,
+            user=old_owner
+        )
+
+        bump_project_version(project)
+
+
+def count_subquery(queryset):
+    # COUNT(*) of queryset per outer row, usable as an annotation.
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values("project").annotate(count=Count("pk")).values("count")[:1],
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def get_project_list_queryset(user,search=""):
+    """The user's projects with their role, member count and task counts.
+
+    One statement: membership is a pk__in subquery rather than a join, so
+    no DISTINCT is needed, and every figure is a correlated subquery or
+    comes from the task counter row.
+    """
+    memberships = ProjectMembership.objects.filter(project=OuterRef("pk"))
+    tasks = Task.objects.filter(project=OuterRef("pk"))
+
+    projects = Project.objects.filter(
+        Q(owner=user) |
+        Q(pk__in=ProjectMembership.objects.filter(user=user).values("project"))
+    )
+
+    if search:
+        projects = projects.filter(name__icontains=search)
+
+    return projects.select_related("owner").annotate(
+        role=Case(
+            When(owner_id=user.pk,then=Value(OWNER)),
+            default=Subquery(memberships.filter(user=user).values("role")[:1]),
+        ),
+        member_count=count_subquery(memberships),
+        # The counter row is kept up to date by the task views; projects
+        # that never had one fall back to counting.
+        open_count=Coalesce(
+            F("task_counter__pending_count"),
+            count_subquery(tasks.filter(is_completed=False))
+        ),
+        completed_count=Coalesce(
+            F("task_counter__completed_count"),
+            count_subquery(tasks.filter(is_completed=True))
+        ),
+    ).order_by("-created_at","-pk")
+
+
+def api_token_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def create_api_token(user,name=""):
+    """Make an API token for user; returns the key, which is not stored."""
+    key = secrets.token_urlsafe(32)
+    ApiToken.objects.create(user=user,name=name,digest=api_token_digest(key))
+
+    return key
+
+
+def get_api_token_user(key):
+    """The active user the key belongs to, or None."""
+    token = ApiToken.objects.select_related("user").filter(digest=api_token_digest(key)).first()
+
+    if token is None or not token.user.is_active:
+        return None
+
+    ApiToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+
+    return token.user
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import project_cache
+from .models import Project, ProjectMembership
+from .permissions import forget_membership_role
+
+
+def forget_roles(project_id,*user_ids):
+    def forget():
+        for user_id in user_ids:
+            forget_membership_role(project_id,user_id)
+
+    # Once now, and again after commit in case a concurrent request cached
+    # the old role in between.
+    forget()
+    transaction.on_commit(forget)
+
+
+@receiver(post_save,sender=ProjectMembership)
+@receiver(post_delete,sender=ProjectMembership)
+def membership_changed(sender,instance,**kwargs):
+    forget_roles(instance.project_id,instance.user_id)
+
+
+@receiver(post_init,sender=Project)
+def remember_owner(sender,instance,**kwargs):
+    # __dict__, so a deferred owner is not loaded just to remember it.
+    instance._loaded_owner_id = instance.__dict__.get("owner_id")
+
+
+@receiver(post_save,sender=Project)
+def owner_changed(sender,instance,created,**kwargs):
+    previous = instance._loaded_owner_id
+
+    if not created and previous != instance.owner_id:
+        forget_roles(instance.pk,*{previous,instance.owner_id} - {None})
+
+    instance._loaded_owner_id = instance.owner_id
+
+
+@receiver(post_save,sender=Project)
+@receiver(post_delete,sender=Project)
+def project_changed(sender,instance,**kwargs):
+    project_cache.bump(instance.pk)
@@ -1,13 +1,36 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
-from projects.models import Project,ProjectMembership
-from tasks.models import Task
+from projectapp.testing import TestCase
+from projectapp.queries import normalize_sql, query_budget, record_queries
+from projectapp.metrics import flush, metrics_file
+from projectapp.profiling import list_profiles, profile_path
+from projectapp.slowqueries import explain, read_slow_queries, redact
+from projects.cache import project_cache
+from projects.models import ApiToken,Project,ProjectMembership
+from django.utils import timezone
+from projects.permissions import (NO_TASK_PERMISSIONS, OWNER, TaskPermissions, can_edit_taks, get_membership_role,
+                                  get_project_role, get_task_permissions, is_project_member, role_cache_key)
+from projects.services import (PROJECTS_PER_PAGE, add_member, get_project_list_queryset, remove_member,
+                               transfer_project_ownership)
+from tasks.models import ProjectTaskCounter, Task
 
 # Create your tests here.
 
 class DeleteProjectTest(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(
             username="testuser",
             password="password123"
@@ -57,6 +80,7 @@ class DeleteProjectTest(TestCase):
 
 class ProjectMemberManagementTest(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(
             username="owner",
             password="pass123"
@@ -132,6 +156,7 @@ class ProjectMemberManagementTest(TestCase):
 
 class TestProjectOwnership(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(username="owner",password="pass123")
         self.member = User.objects.create_user(username="member",password="pass123")
         self.other = User.objects.create_user(username="other",password="pass123")
@@ -200,8 +225,823 @@ class TestProjectOwnership(TestCase):
         self.assertEqual(self.project.owner,self.owner)
         self.assertEqual(response.status_code,302)
 
-        
 
 
+class ProjectApiTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        ProjectMembership.objects.create(
+            project=self.project,
+            user=self.member
+        )
+
+        self.list_url = reverse("api_project_list")
+        self.detail_url = reverse("api_project_detail",args=[self.project.pk])
+        self.members_url = reverse("api_project_members",args=[self.project.pk])
+
+    def send(self,method,url,data):
+        return getattr(self.client,method)(url,data=json.dumps(data),content_type="application/json")
+
+    def test_anonymous_gets_401(self):
+        response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code,401)
+
+    def test_scripts_use_a_bearer_token_without_csrf(self):
+        out = StringIO()
+        call_command("create_api_token","owner","--name","sync script",stdout=out)
+        key = out.getvalue().strip()
+
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            self.list_url,
+            json.dumps({"name": "From a script"}),
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {key}"}
+        )
+
+        self.assertEqual(response.status_code,201)
+        self.assertEqual(Project.objects.get(name="From a script").owner,self.owner)
+        self.assertIsNotNone(ApiToken.objects.get(user=self.owner).last_used_at)
+
+        response = client.get(self.list_url,headers={"Authorization": "Bearer wrong"})
+
+        self.assertEqual(response.status_code,401)
+        self.assertEqual(response.json()["error"],"Invalid API token")
+
+    def test_sessions_still_need_a_csrf_token_and_fail_as_json(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.owner)
+
+        response = client.post(self.list_url,json.dumps({"name": "New"}),content_type="application/json")
+
+        self.assertEqual(response.status_code,403)
+        self.assertIn("CSRF check failed",response.json()["error"])
+        self.assertEqual(client.get(self.list_url).status_code,200)
+
+    def test_lists_projects_with_role(self):
+        Project.objects.create(name="Not Mine",owner=self.other)
+        self.client.login(username="member",password="pass123")
+
+        response = self.client.get(self.list_url)
+
+        self.assertEqual(
+            [(item["name"],item["role"]) for item in response.json()["results"]],
+            [("Test Project","member")]
+        )
+
+    def test_list_conditional_get(self):
+        self.client.login(username="owner",password="pass123")
+
+        first = self.client.get(self.list_url)
+        cached = self.client.get(self.list_url,HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(cached.status_code,304)
+
+        self.client.post(reverse("add_project_member",args=[self.project.pk,self.other.pk]))
+        changed = self.client.get(self.list_url,HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(changed.status_code,200)
+        self.assertNotEqual(changed["ETag"],first["ETag"])
+
+    def test_detail_conditional_get_and_members(self):
+        self.client.login(username="member",password="pass123")
+
+        first = self.client.get(self.detail_url)
+
+        self.assertEqual([item["username"] for item in first.json()["members"]],["member"])
+        self.assertIn("Last-Modified",first)
+        self.assertEqual(
+            self.client.get(self.detail_url,HTTP_IF_NONE_MATCH=first["ETag"]).status_code,
+            304
+        )
+
+    def test_stranger_cannot_read_project(self):
+        self.client.login(username="other",password="pass123")
+
+        response = self.client.get(self.detail_url)
+
+        self.assertEqual(response.status_code,403)
+
+    def test_create_project(self):
+        self.client.login(username="other",password="pass123")
+
+        response = self.send("post",self.list_url,{"name": "API Project"})
+
+        self.assertEqual(response.status_code,201)
+        self.assertEqual(response.json()["role"],"owner")
+        self.assertTrue(Project.objects.filter(name="API Project",owner=self.other).exists())
+
+    def test_owner_adds_member(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.send("post",self.members_url,{"user": self.other.pk})
+
+        self.assertEqual(response.status_code,201)
+        self.assertTrue(ProjectMembership.objects.filter(project=self.project,user=self.other).exists())
+
+    def test_member_cannot_add_member(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.send("post",self.members_url,{"user": self.other.pk})
+
+        self.assertEqual(response.status_code,403)
+
+    def test_member_can_leave(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.client.delete(reverse("api_project_member",args=[self.project.pk,self.member.pk]))
+
+        self.assertEqual(response.status_code,204)
+        self.assertFalse(ProjectMembership.objects.filter(project=self.project,user=self.member).exists())
+
+    def test_owner_transfers_ownership(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.send("patch",self.detail_url,{"owner": self.member.pk})
+
+        self.project.refresh_from_db()
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()["role"],"member")
+        self.assertEqual(self.project.owner,self.member)
+
+    def test_failed_transfer_keeps_the_old_name(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.send("patch",self.detail_url,{"name": "Renamed","owner": self.other.pk})
+
+        self.project.refresh_from_db()
+
+        self.assertEqual(response.status_code,400)
+        self.assertEqual(self.project.name,"Test Project")
+        self.assertEqual(self.project.owner,self.owner)
+
+
+class AsyncProjectListTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.owned = Project.objects.create(name="Owned",owner=self.owner)
+        self.shared = Project.objects.create(name="Shared",owner=self.member)
+        Project.objects.create(name="Unrelated",owner=self.member)
+
+        ProjectMembership.objects.create(project=self.shared,user=self.owner)
+
+    def test_lists_owned_and_member_projects(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(reverse("list_projects_async"))
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(
+            {project.name: project.role for project in response.context["projects"]},
+            {"Owned": OWNER,"Shared": ProjectMembership.MEMBER}
+        )
+
+    def test_anonymous_user_is_redirected(self):
+        response = self.client.get(reverse("list_projects_async"))
+
+        self.assertEqual(response.status_code,302)
+
+
+class ProjectRoleCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+    def test_steady_state_costs_no_queries(self):
+        self.assertEqual(get_project_role(self.member,self.project),ProjectMembership.MEMBER)
+        self.assertIsNone(get_project_role(self.other,self.project))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_project_role(self.member,self.project),ProjectMembership.MEMBER)
+            self.assertIsNone(get_project_role(self.other,self.project))
+            self.assertEqual(get_project_role(self.owner,self.project),OWNER)
+            self.assertTrue(is_project_member(self.member,self.project))
+
+    def test_adding_and_removing_members_invalidates(self):
+        self.assertFalse(is_project_member(self.other,self.project))
+
+        add_member(self.project,self.other)
+        self.assertTrue(is_project_member(self.other,self.project))
+
+        remove_member(self.project,self.other)
+        self.assertFalse(is_project_member(self.other,self.project))
+
+    def test_ownership_transfer_invalidates(self):
+        self.assertEqual(get_project_role(self.member,self.project),ProjectMembership.MEMBER)
+        self.assertFalse(is_project_member(self.owner,self.project))
+
+        transfer_project_ownership(self.project,self.member)
+        project = Project.objects.get(pk=self.project.pk)
+
+        self.assertEqual(get_project_role(self.member,project),OWNER)
+        self.assertFalse(is_project_member(self.member,project))
+        self.assertEqual(get_project_role(self.owner,project),ProjectMembership.MEMBER)
+
+    def test_owner_change_forgets_both_owners(self):
+        get_membership_role(self.project.pk,self.owner.pk)
+        get_membership_role(self.project.pk,self.other.pk)
+
+        self.project.owner = self.other
+        self.project.save()
+
+        self.assertIsNone(cache.get(role_cache_key(self.project.pk,self.owner.pk)))
+        self.assertIsNone(cache.get(role_cache_key(self.project.pk,self.other.pk)))
+
+    def test_api_permission_check_is_cached(self):
+        task = Task.objects.create(title="Task",project=self.project,assigned_to=self.member)
+        self.client.login(username="member",password="pass123")
+        url = reverse("api_task_detail",args=[task.pk])
+
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code,200)
+
+        self.assertFalse(any("projects_projectmembership" in query["sql"] for query in queries))
+
+
+class ProjectObjectCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        project_cache.reset_stats()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.staff = User.objects.create_user(username="staff",password="pass123",is_staff=True)
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+
+    def test_get_reads_through(self):
+        project_cache.get(self.project.pk)
+
+        with self.assertNumQueries(0):
+            project = project_cache.get(self.project.pk)
+            self.assertEqual(project.owner,self.owner)
+
+        self.assertEqual(project_cache.stats()["hits"],1)
+        self.assertEqual(project_cache.stats()["misses"],1)
+
+    def test_rename_through_api_invalidates(self):
+        self.client.login(username="owner",password="pass123")
+        url = reverse("api_project_detail",args=[self.project.pk])
+
+        self.client.get(url)
+        self.client.patch(url,json.dumps({"name": "Renamed"}),content_type="application/json")
+
+        self.assertEqual(self.client.get(url).json()["name"],"Renamed")
+
+    def test_writes_check_the_owner_in_the_database(self):
+        new_owner = User.objects.create_user(username="new_owner",password="pass123")
+        project_cache.get(self.project.pk)
+        # Another process transferred the project; this one's cache missed it.
+        Project.objects.filter(pk=self.project.pk).update(owner=new_owner)
+
+        self.client.login(username="owner",password="pass123")
+
+        self.assertEqual(self.client.post(reverse("delete_project",args=[self.project.pk])).status_code,403)
+        self.assertEqual(self.client.delete(reverse("api_project_detail",args=[self.project.pk])).status_code,403)
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+
+    def test_stats_are_staff_only(self):
+        self.client.login(username="owner",password="pass123")
+        self.assertEqual(self.client.get(reverse("api_cache_stats")).status_code,403)
+
+        self.client.login(username="staff",password="pass123")
+        response = self.client.get(reverse("api_cache_stats"))
+
+        self.assertEqual(response.status_code,200)
+        self.assertIn("projects.project",response.json()["object_caches"])
+        self.assertIn("tasks.task",response.json()["object_caches"])
+
 
+class TaskPermissionsTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.mine = Task.objects.create(title="Mine",project=self.project,assigned_to=self.member)
+        self.done = Task.objects.create(
+            title="Done",
+            project=self.project,
+            assigned_to=self.member,
+            is_completed=True,
+            completed_by=self.member,
+            completed_at=timezone.now()
+        )
+        self.other = Task.objects.create(title="Other",project=self.project)
+
+        # Fresh instances: nothing related is loaded.
+        self.tasks = list(Task.objects.filter(project=self.project))
+        self.project = Project.objects.get(pk=self.project.pk)
+
+    def test_owner_can_do_everything_but_complete_done_tasks(self):
+        with self.assertNumQueries(0):
+            permissions = get_task_permissions(self.owner,self.project,self.tasks,OWNER)
+
+        self.assertEqual(permissions[self.other.pk],TaskPermissions(True,True,True,True))
+        self.assertEqual(permissions[self.done.pk],TaskPermissions(True,False,True,True))
+
+    def test_member_acts_on_assigned_tasks_only(self):
+        with self.assertNumQueries(1):
+            permissions = get_task_permissions(self.member,self.project,self.tasks)
+
+        self.assertEqual(permissions[self.mine.pk],TaskPermissions(True,True,False,False))
+        self.assertEqual(permissions[self.done.pk],TaskPermissions(True,False,False,False))
+        self.assertEqual(permissions[self.other.pk],NO_TASK_PERMISSIONS)
+
+    def test_outsiders_get_nothing_even_when_assigned(self):
+        Task.objects.filter(pk=self.other.pk).update(assigned_to=self.stranger)
+        tasks = list(Task.objects.filter(project=self.project))
+
+        permissions = get_task_permissions(self.stranger,self.project,tasks)
+
+        self.assertTrue(all(flags == NO_TASK_PERMISSIONS for flags in permissions.values()))
+
+    def test_matches_single_task_rules(self):
+        for user in (self.owner,self.member,self.stranger):
+            permissions = get_task_permissions(user,self.project,self.tasks)
+
+            for task in self.tasks:
+                self.assertEqual(permissions[task.pk].can_edit,can_edit_taks(user,task) and get_project_role(user,self.project) is not None)
+
+
+class ProjectListTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.owned = Project.objects.create(name="Apollo",owner=self.owner)
+        self.shared = Project.objects.create(name="Gemini",owner=self.member)
+        Project.objects.create(name="Unrelated",owner=self.other)
+
+        ProjectMembership.objects.create(project=self.owned,user=self.member)
+        ProjectMembership.objects.create(project=self.owned,user=self.other)
+        ProjectMembership.objects.create(project=self.shared,user=self.owner)
+
+        Task.objects.create(title="Open",project=self.owned)
+        Task.objects.create(
+            title="Done",
+            project=self.owned,
+            is_completed=True,
+            completed_by=self.owner,
+            completed_at=timezone.now()
+        )
+
+    def test_one_query_for_roles_and_counts(self):
+        with self.assertNumQueries(1):
+            projects = {project.name: project for project in get_project_list_queryset(self.owner)}
+
+        self.assertEqual(set(projects),{"Apollo","Gemini"})
+        self.assertEqual(projects["Apollo"].role,OWNER)
+        self.assertEqual(projects["Gemini"].role,ProjectMembership.MEMBER)
+        self.assertEqual(projects["Apollo"].member_count,2)
+        self.assertEqual((projects["Apollo"].open_count,projects["Apollo"].completed_count),(1,1))
+        self.assertEqual((projects["Gemini"].open_count,projects["Gemini"].completed_count),(0,0))
+
+    def test_counts_come_from_the_task_counter_when_present(self):
+        ProjectTaskCounter.objects.create(project=self.owned,total_count=7,completed_count=3,pending_count=4)
+
+        project = get_project_list_queryset(self.owner).get(pk=self.owned.pk)
+
+        self.assertEqual((project.open_count,project.completed_count),(4,3))
+
+    def test_view_paginates_and_searches(self):
+        Project.objects.bulk_create(
+            Project(name=f"Bulk {i}",owner=self.owner) for i in range(PROJECTS_PER_PAGE + 5)
+        )
+        self.client.login(username="owner",password="pass123")
+
+        first = self.client.get(reverse("list_projects"))
+        second = self.client.get(reverse("list_projects"),{"page": 2})
+        search = self.client.get(reverse("list_projects"),{"search": "apol"})
+
+        self.assertEqual(len(first.context["projects"]),PROJECTS_PER_PAGE)
+        self.assertEqual(len(second.context["projects"]),7)
+        self.assertEqual([project.name for project in search.context["projects"]],["Apollo"])
+        self.assertContains(search,"2 members, 1 open, 1 completed")
+
+    def test_view_query_count_does_not_grow_with_projects(self):
+        Project.objects.bulk_create(Project(name=f"Bulk {i}",owner=self.owner) for i in range(10))
+        self.client.login(username="owner",password="pass123")
+        self.client.get(reverse("list_projects"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("list_projects"))
+
+        project_queries = [query for query in queries if '"projects_project"' in query["sql"]]
+
+        # The page and the paginator COUNT.
+        self.assertEqual(len(project_queries),2)
+
+
+class ProjectViewQueryBudgetTest(TestCase):
+    """Pinned query counts, session and auth lookups included."""
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.projects = [Project.objects.create(name=f"Project {i}",owner=self.owner) for i in range(6)]
+        self.project = self.projects[0]
+
+        for project in self.projects:
+            ProjectMembership.objects.create(project=project,user=self.member)
+
+        self.client.force_login(self.owner)
+
+    def test_project_list_is_flat_in_the_number_of_projects(self):
+        with query_budget(4):
+            response = self.client.get(reverse("list_projects"))
+
+        self.assertEqual(response.status_code,200)
+
+    def test_create_project(self):
+        with query_budget(3):
+            response = self.client.post(reverse("create_project"),{"name": "New"})
+
+        self.assertEqual(response.status_code,302)
+
+    def test_delete_project(self):
+        with query_budget(10):
+            response = self.client.get(reverse("delete_project",args=[self.project.pk]))
+
+        self.assertEqual(response.status_code,302)
+
+    def test_add_member(self):
+        with query_budget(9):
+            response = self.client.get(reverse("add_project_member",args=[self.project.pk,self.other.pk]))
+
+        self.assertEqual(response.status_code,302)
+
+    def test_remove_member(self):
+        self.client.force_login(self.member)
+
+        with query_budget(11):
+            response = self.client.get(reverse("remove_project_member",args=[self.project.pk,self.member.pk]))
+
+        self.assertEqual(response.status_code,302)
+
+    def test_transfer_ownership(self):
+        with query_budget(16):
+            response = self.client.get(reverse("transfer_project_ownership",args=[self.project.pk,self.member.pk]))
+
+        self.assertEqual(response.status_code,302)
+
+
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.projects = [Project.objects.create(name=f"Project {i}",owner=self.owner) for i in range(5)]
+
+    def test_normalize_sql_ignores_parameters(self):
+        self.assertEqual(
+            normalize_sql('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s) AND "n" = 5 LIMIT 21'),
+            normalize_sql('SELECT "a"  FROM "t"\nWHERE "id" IN (%s) AND "n" = 7 LIMIT 21')
+        )
+
+    def test_budget_flags_a_query_loop(self):
+        with self.assertRaisesMessage(AssertionError,"N+1"):
+            with query_budget(10):
+                for project in Project.objects.all():
+                    project.owner
+
+    def test_budget_flags_too_many_queries(self):
+        with self.assertRaisesMessage(AssertionError,"Query budget of 1 exceeded"):
+            with query_budget(1):
+                list(Project.objects.all())
+                list(User.objects.all())
+
+    def test_recorder_counts_queries_and_time(self):
+        with record_queries() as recorder:
+            list(Project.objects.all())
+
+        self.assertEqual(recorder.count,1)
+        self.assertGreaterEqual(recorder.total_time,0)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_middleware_reports_queries_and_n_plus_one(self):
+        self.client.force_login(self.owner)
+
+        def looping_list(user,search=""):
+            # One membership query per project, as list_projects used to run.
+            return [project for project in Project.objects.filter(owner=user) if not project.memberships.exists()]
+
+        with patch("projects.views.get_project_list_queryset",looping_list):
+            with self.assertLogs("projectapp.queries","WARNING") as logs:
+                response = self.client.get(reverse("list_projects"))
+
+        self.assertEqual(response.status_code,200)
+        self.assertIn("X-Query-Count",response)
+        self.assertIn("N+1 query, 5 times",logs.output[0])
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_middleware_can_be_turned_off(self):
+        self.client.force_login(self.owner)
+
+        self.assertNotIn("X-Query-Count",self.client.get(reverse("list_projects")))
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    async def test_middleware_counts_async_views(self):
+        await self.async_client.aforce_login(self.owner)
+
+        response = await self.async_client.get(reverse("list_projects_async"))
+
+        self.assertEqual(response.status_code,200)
+        self.assertGreater(int(response["X-Query-Count"]),0)
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name,"slow.jsonl")
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        Project.objects.create(name="Test Project",owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def records(self):
+        return list(read_slow_queries(self.path))
+
+    def test_records_view_redacted_params_and_plan(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0,SLOW_QUERY_LOG_FILE=self.path):
+            self.client.get(reverse("list_projects"),{"search": "secret"})
+
+        records = self.records()
+        project_query = next(record for record in records if '"projects_project"' in record["sql"])
+
+        self.assertEqual(project_query["view"],"list_projects")
+        self.assertTrue(project_query["plan"])
+        self.assertNotIn("secret",json.dumps(records))
+        self.assertIn("<str len=8>",json.dumps(project_query["params"]))
+
+    def test_failed_explain_is_rolled_back_to_a_savepoint(self):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNone(explain(connection,"SELECT * FROM missing_table",[]))
+
+            # The surrounding transaction is still usable.
+            self.assertEqual(Project.objects.count(),1)
+
+        self.assertTrue(any(query["sql"].startswith("ROLLBACK TO SAVEPOINT") for query in queries))
+
+    def test_fast_queries_are_not_logged(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=10_000,SLOW_QUERY_LOG_FILE=self.path):
+            self.client.get(reverse("list_projects"))
+
+        self.assertEqual(self.records(),[])
+
+    def test_log_rotates_and_backups_are_read(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0,
+            SLOW_QUERY_LOG_FILE=self.path,
+            SLOW_QUERY_LOG_MAX_BYTES=2000,
+            SLOW_QUERY_LOG_BACKUP_COUNT=50
+        ):
+            for _ in range(5):
+                self.client.get(reverse("list_projects"))
+
+            self.assertTrue(os.path.exists(f"{self.path}.1"))
+            self.assertGreater(len(self.records()),10)
+
+    def test_summary_ranks_by_total_time(self):
+        with open(self.path,"w") as log:
+            for sql,duration in [("SELECT 1 FROM a WHERE id = %s",5),("SELECT 1 FROM b",30),("SELECT 1 FROM a WHERE id = %s",40)]:
+                log.write(json.dumps({"sql": sql,"duration_ms": duration,"view": "list_projects","plan": ["SCAN a"]}) + "\n")
+
+        out = StringIO()
+        call_command("summarize_slow_queries","--file",self.path,stdout=out)
+        lines = out.getvalue().splitlines()
+
+        self.assertTrue(lines[0].startswith("1. 45.0 ms total, 2 calls"))
+        self.assertIn("FROM a",lines[2])
+        self.assertIn("plan: SCAN a",out.getvalue())
 
+    def test_redact(self):
+        self.assertEqual(redact([1,None,True,"alice",b"xy",timezone.now()]),[1,None,True,"<str len=5>","<bytes len=2>","<datetime>"])
+
+
+class RequestProfilingTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        settings_override = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_SAMPLE_RATE=0,
+            PROFILING_DIR=os.path.join(directory.name,"profiles")
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.staff = User.objects.create_user(username="staff",password="pass123",is_staff=True)
+        Project.objects.create(name="Test Project",owner=self.owner)
+
+    def test_staff_header_profiles_the_request(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse("list_projects"),headers={"X-Profile": "1"})
+
+        profiles = list_profiles()
+        self.assertEqual(list(profiles),["list_projects"])
+
+        report = self.client.get(reverse("profile_download",args=["list_projects",profiles["list_projects"][0] + ".txt"]))
+        content = b"".join(report.streaming_content).decode()
+
+        self.assertIn("GET /projects/ -> 200",content)
+        self.assertIn("allocations",content)
+        self.assertIn("Top functions by cumulative time",content)
+
+    def test_header_is_ignored_for_other_users(self):
+        self.client.force_login(self.owner)
+        self.client.get(reverse("list_projects"),headers={"X-Profile": "1"})
+
+        self.assertEqual(list_profiles(),{})
+
+    def test_sampled_requests_are_profiled(self):
+        self.client.force_login(self.owner)
+
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            self.client.get(reverse("list_projects"))
+
+        self.assertIn("list_projects",list_profiles())
+
+    async def test_async_views_are_profiled(self):
+        await self.async_client.aforce_login(self.staff)
+        await self.async_client.get(reverse("list_projects_async"),headers={"X-Profile": "1"})
+
+        name = list_profiles()["list_projects_async"][0]
+        path = profile_path("list_projects_async",name + ".txt")
+
+        with open(path) as report:
+            # The ORM work done in sync_to_async threads is in the profile.
+            self.assertIn("execute_sql",report.read())
+
+    def test_old_profiles_are_pruned(self):
+        self.client.force_login(self.staff)
+
+        with override_settings(PROFILING_MAX_FILES=1):
+            for _ in range(3):
+                self.client.get(reverse("list_projects"),headers={"X-Profile": "1"})
+
+        self.assertEqual(len(list_profiles()["list_projects"]),1)
+
+    def test_profiles_are_staff_only(self):
+        self.client.force_login(self.owner)
+
+        self.assertEqual(self.client.get(reverse("profile_list")).status_code,403)
+
+        self.client.force_login(self.staff)
+
+        self.assertEqual(self.client.get(reverse("profile_list")).status_code,200)
+        self.assertEqual(self.client.get(reverse("profile_download",args=["list_projects","..prof"])).status_code,404)
+        self.assertEqual(self.client.get("/profiles/..%2F..%2Fetc/passwd.txt").status_code,404)
+
+    def test_profiles_outside_the_directory_are_not_served(self):
+        root = settings.PROFILING_DIR
+        os.makedirs(os.path.join(root,"list_projects"))
+
+        # Beside the profiles directory, inside the test's temporary one.
+        with open(os.path.join(os.path.dirname(root),"secret.txt"),"w") as secret:
+            secret.write("secret")
+
+        self.client.force_login(self.staff)
+
+        for path in ["/profiles/%2E%2E/secret.txt","/profiles/list_projects/%2E%2E","/profiles/.hidden/secret.txt"]:
+            self.assertEqual(self.client.get(path).status_code,404,path)
+
+        self.assertIsNone(profile_path("..","secret.txt"))
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        Project.objects.create(name="Test Project",owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def sample(self,text,series):
+        for line in text.splitlines():
+            if line.startswith(series + " "):
+                return float(line.rsplit(" ",1)[1])
+
+        return 0.0
+
+    def scrape(self):
+        with override_settings(METRICS_TOKEN="scrape-token"):
+            response = self.client.get(reverse("metrics"),headers={"Authorization": "Bearer scrape-token"})
+
+        self.assertEqual(response.status_code,200)
+
+        return response.content.decode()
+
+    def test_request_latency_queries_and_templates(self):
+        before = self.scrape()
+        self.client.get(reverse("list_projects"))
+        after = self.scrape()
+
+        for series in [
+            'http_request_duration_seconds_count{view="list_projects",method="GET"}',
+            'http_request_duration_seconds_bucket{view="list_projects",method="GET",le="+Inf"}',
+            'http_requests_total{view="list_projects",method="GET",status="200"}',
+            'http_request_db_queries_count{view="list_projects"}',
+            'template_render_duration_seconds_count{template="project_list.html"}',
+        ]:
+            self.assertEqual(self.sample(after,series) - self.sample(before,series),1,series)
+
+        self.assertGreater(
+            self.sample(after,'http_request_db_queries_sum{view="list_projects"}') -
+            self.sample(before,'http_request_db_queries_sum{view="list_projects"}'),
+            0
+        )
+        # The scrape itself is in flight.
+        self.assertEqual(self.sample(after,"http_requests_in_flight"),1)
+        self.assertIn("# TYPE http_request_duration_seconds histogram",after)
+
+    def test_cache_lookups_are_counted(self):
+        before = self.scrape()
+        project_cache.get(Project.objects.get().pk)
+        after = self.scrape()
+
+        series = 'cache_requests_total{cache="objects:projects.project",result="miss"}'
+        self.assertEqual(self.sample(after,series) - self.sample(before,series),1)
+
+    def test_processes_sharing_a_directory_are_added_up(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        with override_settings(METRICS_DIR=directory.name):
+            flush(force=True)
+            with open(metrics_file()) as own:
+                self.assertIn("http_requests_total",json.load(own))
+
+            live_pid,dead_pid = os.getppid(),2 ** 22 + 12345
+            other = {
+                "http_requests_total": {
+                    "kind": "counter","help": "Requests served.","labels": ["view","method","status"],
+                    "values": [[["elsewhere","GET","200"],3]],
+                },
+                "http_requests_in_flight": {
+                    "kind": "gauge","help": "Requests being served.","labels": [],"values": [[[],2]],
+                },
+            }
+
+            for pid in (live_pid,dead_pid):
+                with open(metrics_file(pid),"w") as out:
+                    json.dump(other,out)
+
+            text = self.scrape()
+
+        self.assertEqual(self.sample(text,'http_requests_total{view="elsewhere",method="GET",status="200"}'),6)
+        # The dead process's gauge is dropped; the live one's adds to this scrape.
+        self.assertEqual(self.sample(text,"http_requests_in_flight"),3)
+
+    def test_scrapers_need_the_token_and_an_allowed_address(self):
+        url = reverse("metrics")
+        bearer = {"Authorization": "Bearer scrape-token"}
+
+        # No token configured: the address alone lets nobody in.
+        self.assertEqual(self.client.get(url).status_code,403)
+
+        with override_settings(METRICS_TOKEN="scrape-token"):
+            self.assertEqual(self.client.get(url).status_code,403)
+            self.assertEqual(self.client.get(url,headers={"Authorization": "Bearer wrong"}).status_code,403)
+            self.assertEqual(self.client.get(url,headers=bearer,REMOTE_ADDR="10.0.0.1").status_code,403)
+            self.assertEqual(self.client.get(url,headers=bearer).status_code,200)
+
+    def test_other_addresses_need_staff(self):
+        self.assertEqual(self.client.get(reverse("metrics"),REMOTE_ADDR="10.0.0.1").status_code,403)
+
+        self.owner.is_staff = True
+        self.owner.save()
+
+        self.assertEqual(self.client.get(reverse("metrics"),REMOTE_ADDR="10.0.0.1").status_code,200)
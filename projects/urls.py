@@ -11,6 +11,7 @@ urlpatterns =[
     #list project
 
     path("",views.list_projects,name= "list_projects"),
+    path("async/",views.list_projects_async,name= "list_projects_async"),
     #Delete Project
     path('<int:project_id>/delete',views.delete_project,name='delete_project'),
 
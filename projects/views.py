@@ -1,17 +1,24 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404,redirect
-from .models import Project,ProjectMembership
-from tasks.models import Task
+from .models import Project
 from django.contrib.auth.models import User
-from .permissions import can_transfer_ownership, is_project_owner,is_project_member,can_edit_taks
+from .permissions import can_transfer_ownership, is_project_owner,is_project_member
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
+from django.core.paginator import Page,Paginator
 from .forms import ProjectForm
+from .services import PROJECTS_PER_PAGE,add_member,get_project_list_queryset,remove_member,transfer_project_ownership
 
 
 # Create your views here.
 
+def get_project_for_write(project_id):
+    # These views change the project on any method, so the owner and
+    # membership checks run against the row, never a cached copy.
+    return get_object_or_404(Project.objects.select_related("owner"),pk=project_id)
+
+
 @login_required
 def create_project(request):
     if request.method == "POST":
@@ -30,34 +37,64 @@ def create_project(request):
 
 @login_required 
 def list_projects(request):
-    projects = Project.objects.filter(
-        Q(owner = request.user) |
-        Q(members__pk = request.user.pk)
-    ).distinct()
+    search = request.GET.get("search","").strip()
+
+    paginator = Paginator(get_project_list_queryset(request.user,search),PROJECTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    context = {
+        "projects": page_obj,
+        "page_obj": page_obj,
+        "search": search,
+    }
+
+    return render(request,"project_list.html",context)
 
-    project_data = []
 
-    for project in projects:
-        can_create_task = (
-            project.owner == request.user or 
-            project.members.filter(pk=request.user.pk).exists()
-        )
+@login_required
+async def list_projects_async(request):
+    """Async variant of list_projects for the ASGI entry point.
+
+    The ORM's async calls run one after another on the request's
+    connection, so the page and the paginator COUNT are awaited in turn.
+    """
+    user = await request.auser()
+    search = request.GET.get("search","").strip()
 
-        project_data.append({
-            "project" : project,
-            "can_create_task": can_create_task
-        })
+    projects = get_project_list_queryset(user,search)
+    paginator = Paginator(projects,PROJECTS_PER_PAGE)
+
+    try:
+        number = max(int(request.GET.get("page") or 1),1)
+    except ValueError:
+        number = 1
+
+    async def fetch_page(number):
+        bottom = (number - 1) * PROJECTS_PER_PAGE
+        return [project async for project in projects[bottom:bottom + PROJECTS_PER_PAGE]]
+
+    rows = await fetch_page(number)
+    paginator.count = await projects.acount()
+
+    if number > paginator.num_pages:
+        # Same fallback as Paginator.get_page: out of range shows the last page.
+        number = paginator.num_pages
+        rows = await fetch_page(number)
+
+    page_obj = Page(rows,number,paginator)
 
     context = {
-        "project_data": project_data
+        "projects": page_obj,
+        "page_obj": page_obj,
+        "search": search,
     }
 
-    return render(request,"project_list.html",context)
+    return await sync_to_async(render)(request,"project_list.html",context)
 
 
 @login_required
 def delete_project(request,project_id):
-    project = get_object_or_404(Project,id=project_id)
+    project = get_project_for_write(project_id)
 
     if not is_project_owner(request.user,project):
         raise PermissionDenied
@@ -68,7 +105,7 @@ def delete_project(request,project_id):
 
 @login_required
 def add_project_member(request,user_id,project_id):
-    project = get_object_or_404(Project,pk=project_id)
+    project = get_project_for_write(project_id)
 
     if not is_project_owner(request.user,project):
         raise PermissionDenied
@@ -78,16 +115,13 @@ def add_project_member(request,user_id,project_id):
     if user == project.owner:
         raise PermissionDenied
     
-    ProjectMembership.objects.create(
-        project = project,
-        user=user,
-    )
+    add_member(project,user)
 
     return redirect("/")
 
 @login_required
 def remove_project_member(request,project_id,user_id):
-    project = get_object_or_404(Project,pk=project_id)
+    project = get_project_for_write(project_id)
 
     if not is_project_member(request.user,project):
         raise PermissionDenied
@@ -97,36 +131,20 @@ def remove_project_member(request,project_id,user_id):
     if user == project.owner:
         raise PermissionDenied
 
-    ProjectMembership.objects.filter(
-        project=project,
-        user=user
-    ).delete()
+    remove_member(project,user)
 
     return redirect("/")
 
 
 @login_required
 def transfer_ownership(request,project_id,user_id):
-    project = get_object_or_404(Project,pk=project_id)
+    project = get_project_for_write(project_id)
     new_owner = get_object_or_404(User,pk=user_id)
 
     if not can_transfer_ownership(request.user,project,new_owner):
         raise PermissionDenied
     
-    old_owner = project.owner
-
-    project.owner = new_owner
-    project.save()
-
-    ProjectMembership.objects.filter(
-        project=project,
-        user=new_owner
-    ).delete()
-
-    ProjectMembership.objects.get_or_create(
-        project=project,
-        user=old_owner
-    )
+    transfer_project_ownership(project,new_owner)
 
     return redirect("/")
 
@@ -0,0 +1,131 @@
+from django.db.models import Exists, OuterRef, Value
+from django.http import HttpResponseForbidden
+from django.shortcuts import get_object_or_404
+
+from projects.cache import project_cache
+from projects.models import Project, ProjectMembership
+from projects.permissions import OWNER, get_project_role, remember_membership_role
+
+from .cache import task_cache
+from .models import Task
+
+
+def with_membership_flag(queryset,user,project_ref):
+    """Annotate is_member: whether user has a membership in the row's project."""
+    if not user.is_authenticated:
+        return queryset.annotate(is_member=Value(False))
+
+    return queryset.annotate(
+        is_member=Exists(
+            ProjectMembership.objects.filter(project=OuterRef(project_ref),user_id=user.pk)
+        )
+    )
+
+
+def project_access_queryset(user):
+    return with_membership_flag(Project.objects.select_related("owner"),user,"pk")
+
+
+def task_access_queryset(user):
+    return with_membership_flag(
+        Task.objects.select_related("project__owner","assigned_to","completed_by"),
+        user,
+        "project"
+    )
+
+
+def resolve_role(user,project,is_member):
+    if not user.is_authenticated:
+        return None
+
+    if project.owner_id == user.pk:
+        return OWNER
+
+    role = ProjectMembership.MEMBER if is_member else None
+    # So the next request can take the cached path without a query.
+    remember_membership_role(project.pk,user.pk,role)
+
+    return role
+
+
+def use_object_cache(request):
+    # Writes start from the database row, never from a cached copy.
+    return request.method in ("GET","HEAD")
+
+
+def resolve_project(request,project_id):
+    """Load the project and the caller's role.
+
+    Reads come from the object and role caches when warm; otherwise one
+    query loads both. The role is stored as request.project_role (None for
+    outsiders); the caller decides what an outsider may see.
+    """
+    version = None
+
+    if use_object_cache(request):
+        project,version = project_cache.lookup(project_id)
+
+        if project is not None:
+            request.project_role = get_project_role(request.user,project)
+            return project
+
+    project = get_object_or_404(project_access_queryset(request.user),pk=project_id)
+    request.project_role = resolve_role(request.user,project,project.is_member)
+    project_cache.store(project,version)
+
+    return project
+
+
+def resolve_task(request,task_id):
+    """Load the task, its project and owner, and the caller's role.
+
+    Same as resolve_project: cached for reads, otherwise one query.
+    """
+    task_version = None
+
+    if use_object_cache(request):
+        task,task_version = task_cache.lookup(task_id)
+
+        if task is not None:
+            project = project_cache.peek(task.project_id)
+
+            if project is not None:
+                task.project = project
+                request.project_role = get_project_role(request.user,project)
+                return task
+
+    task = get_object_or_404(task_access_queryset(request.user),pk=task_id)
+    request.project_role = resolve_role(request.user,task.project,task.is_member)
+    task_cache.store(task,task_version)
+    project_cache.store(task.project)
+
+    return task
+
+
+class ProjectAccessMixin:
+    """Resolve self.project (and self.task for views routed by pk) before dispatch.
+
+    Callers without a role in the project get 403. Views with stricter
+    rules override has_task_access.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if "project_id" in kwargs:
+            self.task = None
+            self.project = resolve_project(request,kwargs["project_id"])
+        else:
+            self.task = resolve_task(request,kwargs["pk"])
+            self.project = self.task.project
+
+        if request.project_role is None or not self.has_task_access():
+            return HttpResponseForbidden()
+
+        return super().dispatch(request, *args, **kwargs)
+
+    def has_task_access(self):
+        return True
+
+    def get_object(self, queryset=None):
+        if self.task is not None:
+            return self.task
+
+        return super().get_object(queryset)
@@ -0,0 +1,263 @@
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+
+from projects.api import (ApiError, api_view, conditional_json, get_project_for, make_etag, query_key,
+                          raise_invalid, read_json, serialize_user)
+from projects.permissions import OWNER, can_edit_taks, can_toggle_task, get_task_permissions
+
+from .access import resolve_task
+from .forms import AssignTaskForm, TaskForm
+from .models import Task, TaskChange
+from .pagination import paginate_by_cursor
+from .services import (VALID_ORDERING, VALID_STATUS, filter_tasks, get_ordering, get_task_change_floor,
+                       get_task_changes, get_task_counter, mark_task_completed, record_task_changes, record_tasks_created,
+                       remove_task, search_tasks)
+
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+TASK_FIELDS = {"title","assigned_to","is_completed"}
+
+
+def serialize_task(task,permissions=None):
+    payload = {
+        "id": task.pk,
+        "project": task.project_id,
+        "title": task.title,
+        "is_completed": task.is_completed,
+        "assigned_to": serialize_user(task.assigned_to),
+        "completed_by": serialize_user(task.completed_by),
+        "completed_at": task.completed_at,
+        "created_at": task.created_at,
+    }
+
+    if permissions is not None:
+        payload["permissions"] = permissions._asdict()
+
+    return payload
+
+
+def get_page_size(request):
+    try:
+        size = int(request.GET.get("limit",API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400,"limit must be a number")
+
+    return max(1,min(size,API_MAX_PAGE_SIZE))
+
+
+def get_choice(request,name,choices,default):
+    value = request.GET.get(name,default)
+
+    if value not in choices:
+        raise ApiError(400,f"{name} must be one of: {', '.join(choices)}")
+
+    return value
+
+
+def validated_assignment(task,project,assignee):
+    form = AssignTaskForm(
+        {"assigned_to": "" if assignee is None else assignee},
+        instance=task,
+        project=project
+    )
+
+    if not form.is_valid():
+        raise_invalid(form)
+
+
+@api_view("GET","POST")
+def api_task_list(request,project_id):
+    project,role = get_project_for(request,project_id)
+
+    if request.method == "POST":
+        data = read_json(request)
+
+        form = TaskForm({"title": data.get("title","")})
+
+        if not form.is_valid():
+            raise_invalid(form)
+
+        task = form.save(commit=False)
+        task.project = project
+
+        if data.get("assigned_to") is not None:
+            if role != OWNER:
+                raise PermissionDenied
+
+            validated_assignment(task,project,data["assigned_to"])
+
+        with transaction.atomic():
+            task.save()
+            record_tasks_created(project)
+            record_task_changes(project,TaskChange.CREATED,[task.pk],request.user)
+
+        return JsonResponse(serialize_task(task),status=201)
+
+    status = get_choice(request,"status",VALID_STATUS,"all")
+    order = get_choice(request,"order",VALID_ORDERING,"newest")
+    search = request.GET.get("search","").strip()
+
+    def build():
+        qs = Task.objects.filter(project=project).select_related("assigned_to","completed_by")
+        qs = filter_tasks(qs,status)
+        qs = search_tasks(qs,search,project=project)
+
+        page = paginate_by_cursor(
+            qs,
+            request.GET.get("cursor"),
+            get_page_size(request),
+            descending=get_ordering(order).startswith("-")
+        )
+        counter = get_task_counter(project)
+        permissions = get_task_permissions(request.user,project,page.object_list,role)
+
+        return {
+            "results": [serialize_task(task,permissions[task.pk]) for task in page],
+            "next_cursor": page.next_cursor,
+            "previous_cursor": page.previous_cursor,
+            "counts": {
+                "total": counter.total_count,
+                "completed": counter.completed_count,
+                "pending": counter.pending_count,
+            },
+        }
+
+    etag = make_etag("tasks",project.pk,project.version,request.user.pk,query_key(request))
+
+    return conditional_json(request,etag,project.updated_at,build)
+
+
+@api_view("GET","PATCH","DELETE")
+def api_task_detail(request,task_id):
+    task = resolve_task(request,task_id)
+    project = task.project
+    role = request.project_role
+
+    if role is None:
+        raise PermissionDenied
+
+    if request.method == "DELETE":
+        if role != OWNER:
+            raise PermissionDenied
+
+        if not remove_task(task,request.user):
+            raise Http404
+
+        return HttpResponse(status=204)
+
+    if request.method == "PATCH":
+        data = read_json(request)
+        unknown = set(data) - TASK_FIELDS
+
+        if unknown:
+            raise ApiError(400,f"Unknown fields: {', '.join(sorted(unknown))}")
+
+        # Same rules as edit_task, assign_task and complete_task; all are
+        # checked before anything is written.
+        if "title" in data and not can_edit_taks(request.user,task):
+            raise PermissionDenied
+
+        if "assigned_to" in data and role != OWNER:
+            raise PermissionDenied
+
+        if "is_completed" in data:
+            if data["is_completed"] is not True:
+                raise ApiError(400,"Tasks can only be marked as completed")
+
+            if not can_toggle_task(request.user,task):
+                raise PermissionDenied
+
+            if task.is_completed:
+                raise ApiError(400,"The Task is Already Completed")
+
+        update_fields = []
+
+        if "title" in data:
+            form = TaskForm({"title": data["title"]},instance=task)
+
+            if not form.is_valid():
+                raise_invalid(form)
+
+            update_fields.append("title")
+
+        if "assigned_to" in data:
+            validated_assignment(task,project,data["assigned_to"])
+            update_fields.append("assigned_to")
+
+        with transaction.atomic():
+            if update_fields:
+                task.save(update_fields=update_fields)
+
+            # One change per field, so a rename next to a reassignment is
+            # not reported as the reassignment alone.
+            if "title" in update_fields:
+                record_task_changes(project,TaskChange.UPDATED,[task.pk],request.user)
+
+            if "assigned_to" in update_fields:
+                record_task_changes(project,TaskChange.ASSIGNED,[task.pk],request.user)
+
+            if "is_completed" in data and not mark_task_completed(task,request.user):
+                raise ApiError(400,"The Task is Already Completed")
+
+        task = Task.objects.select_related("assigned_to","completed_by").get(pk=task.pk)
+
+        return JsonResponse(serialize_task(task))
+
+    etag = make_etag("task",task.pk,project.version,request.user.pk)
+
+    def build():
+        permissions = get_task_permissions(request.user,project,[task],role)
+        return serialize_task(task,permissions[task.pk])
+
+    return conditional_json(request,etag,project.updated_at,build)
+
+
+@api_view("GET")
+def api_task_changes(request,project_id):
+    """Tasks changed after ?since=N: current state for live ones, ids for deleted.
+
+    Several changes to one task collapse into its latest state, so the
+    payload grows with the number of tasks touched, not with project size.
+    A since older than the pruned part of the feed gets a 410: the client
+    reloads the tasks and continues from the project version.
+    """
+    project,role = get_project_for(request,project_id)
+
+    try:
+        since = int(request.GET.get("since",0))
+    except ValueError:
+        raise ApiError(400,"since must be a number")
+
+    if since < 0:
+        raise ApiError(400,"since must not be negative")
+
+    if since < get_task_change_floor(project):
+        raise ApiError(410,"Changes after since were pruned; reload the tasks and use the project version")
+
+    changes,cursor,has_more = get_task_changes(project,since,get_page_size(request))
+
+    latest = {}
+
+    for change in changes:
+        latest[change.task_id] = change.kind
+
+    live = Task.objects.filter(
+        project=project,
+        pk__in=[task_id for task_id,kind in latest.items() if kind != TaskChange.DELETED]
+    ).select_related("assigned_to","completed_by")
+
+    tasks = [serialize_task(task) for task in live]
+    found = {task["id"] for task in tasks}
+
+    return JsonResponse({
+        "since": since,
+        "cursor": cursor,
+        "has_more": has_more,
+        "tasks": tasks,
+        # A task missing here was deleted after the cursor; its tombstone
+        # also comes with the next call.
+        "deleted": sorted(task_id for task_id in latest if task_id not in found),
+    })
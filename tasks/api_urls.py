@@ -0,0 +1,9 @@
+from django.urls import path
+from . import api
+
+
+urlpatterns = [
+    path("projects/<int:project_id>/tasks/",api.api_task_list,name="api_task_list"),
+    path("projects/<int:project_id>/tasks/changes/",api.api_task_changes,name="api_task_changes"),
+    path("tasks/<int:task_id>/",api.api_task_detail,name="api_task_detail"),
+]
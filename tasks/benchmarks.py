@@ -0,0 +1,303 @@
+import copy
+import json
+import platform
+import statistics
+import time
+from collections import namedtuple
+from itertools import cycle
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from projects.models import Project, ProjectMembership
+from projects.permissions import can_edit_taks, get_project_role, get_task_permissions
+
+from .cache import task_cache
+from .models import Task
+from .services import filter_tasks, get_tasks_preferences, search_tasks, rebuild_task_counter, update_task_counter
+from .templatetags.highlight import highlight
+
+
+# Rows the service and permission benchmarks work on, about one page.
+PAGE_SIZE = 50
+
+SEARCH = "login"
+
+TITLES = ["Fix login bug","Update the docs","Refactor search","Review billing","Deploy the api"]
+
+
+# run is timed, number calls per round; reset runs untimed before each round.
+Case = namedtuple("Case",["run","reset","number"],defaults=[None,1])
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return register
+
+
+class Dataset:
+    """Users, projects and tasks seeded for one run, removed by delete().
+
+    The owner owns every project and each member belongs to all of them.
+    Tasks alternate between assigned and unassigned, and one in four is
+    completed.
+    """
+    def __init__(self,projects,tasks,members):
+        self.sizes = {"projects": projects,"tasks": tasks,"members": members}
+
+        prefix = f"bench-{time.time_ns()}"
+        self.owner = User.objects.create_user(username=f"{prefix}-owner")
+        self.members = [User.objects.create_user(username=f"{prefix}-member-{i}") for i in range(members)]
+        self.projects = []
+
+        now = timezone.now()
+
+        for i in range(projects):
+            project = Project.objects.create(name=f"Benchmark Project {i}",owner=self.owner)
+            ProjectMembership.objects.bulk_create(
+                ProjectMembership(project=project,user=member) for member in self.members
+            )
+            Task.objects.bulk_create(
+                Task(
+                    title=f"{TITLES[n % len(TITLES)]} #{n}",
+                    project=project,
+                    assigned_to=self.members[n % members] if members and n % 2 else None,
+                    is_completed=n % 4 == 0,
+                    completed_by=self.owner if n % 4 == 0 else None,
+                    completed_at=now if n % 4 == 0 else None,
+                )
+                for n in range(tasks)
+            )
+            rebuild_task_counter(project)
+            self.projects.append(project)
+
+        self.project = self.projects[0]
+        self.member = self.members[0] if self.members else self.owner
+        self.page = list(Task.objects.filter(project=self.project).order_by("-created_at")[:PAGE_SIZE])
+
+    def client(self,user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def delete(self):
+        for project in self.projects:
+            project.delete()
+
+        User.objects.filter(pk__in=[self.owner.pk] + [member.pk for member in self.members]).delete()
+
+
+@benchmark("services.filter_tasks")
+def bench_filter_tasks(dataset):
+    qs = Task.objects.filter(project=dataset.project).order_by("-created_at")
+    return Case(lambda: list(filter_tasks(qs,"pending")[:PAGE_SIZE]))
+
+
+@benchmark("services.search_tasks")
+def bench_search_tasks(dataset):
+    qs = Task.objects.filter(project=dataset.project).order_by("-created_at")
+    return Case(lambda: list(search_tasks(qs,SEARCH,project=dataset.project)[:PAGE_SIZE]))
+
+
+@benchmark("services.get_tasks_preferences")
+def bench_get_tasks_preferences(dataset):
+    request = RequestFactory().get("/",{"status": "all","order": "oldest"})
+    request.session = {}
+    return Case(lambda: get_tasks_preferences(request),number=1000)
+
+
+@benchmark("permissions.get_project_role")
+def bench_get_project_role(dataset):
+    # A member, so the role comes from the membership lookup.
+    return Case(lambda: get_project_role(dataset.member,dataset.project),number=100)
+
+
+@benchmark("permissions.can_edit_taks")
+def bench_can_edit_taks(dataset):
+    def run():
+        for task in dataset.page:
+            can_edit_taks(dataset.member,task)
+
+    return Case(run,number=100)
+
+
+@benchmark("permissions.get_task_permissions")
+def bench_get_task_permissions(dataset):
+    return Case(lambda: get_task_permissions(dataset.member,dataset.project,dataset.page),number=100)
+
+
+@benchmark("templatetags.highlight")
+def bench_highlight(dataset):
+    def run():
+        for task in dataset.page:
+            highlight(task.title,SEARCH)
+
+    return Case(run,number=100)
+
+
+def check(response,status):
+    # A benchmark of an error page would measure the wrong thing.
+    assert response.status_code == status,response.status_code
+    return response
+
+
+@benchmark("views.TaskListView")
+def bench_task_list_view(dataset):
+    client = dataset.client(dataset.owner)
+    url = reverse("list_tasks",args=[dataset.project.pk])
+    return Case(lambda: check(client.get(url,{"status": "all"}),200))
+
+
+@benchmark("views.TaskListView.search")
+def bench_task_list_view_search(dataset):
+    client = dataset.client(dataset.owner)
+    url = reverse("list_tasks",args=[dataset.project.pk])
+    return Case(lambda: check(client.get(url,{"status": "all","search": SEARCH}),200))
+
+
+@benchmark("views.list_projects")
+def bench_list_projects(dataset):
+    client = dataset.client(dataset.owner)
+    url = reverse("list_projects")
+    return Case(lambda: check(client.get(url),200))
+
+
+@benchmark("views.complete_task")
+def bench_complete_task(dataset):
+    client = dataset.client(dataset.owner)
+    task = Task.objects.filter(project=dataset.project,is_completed=False).first()
+    url = reverse("complete_task",args=[task.pk])
+
+    def reset():
+        # Reopen the task so every round completes it again.
+        with transaction.atomic():
+            if Task.objects.filter(pk=task.pk,is_completed=True).update(is_completed=False,completed_by=None,completed_at=None):
+                update_task_counter(dataset.project,completed=-1,pending=1)
+
+        task_cache.bump(task.pk)
+
+    return Case(lambda: check(client.post(url),302),reset)
+
+
+@benchmark("views.assign_task")
+def bench_assign_task(dataset):
+    client = dataset.client(dataset.owner)
+    task = dataset.page[0]
+    url = reverse("assign_task",args=[task.pk])
+    assignees = cycle([dataset.owner] + dataset.members)
+
+    return Case(lambda: check(client.post(url,{"assigned_to": next(assignees).pk}),302))
+
+
+def time_case(case,repeat,warmup):
+    """Milliseconds per call: min, median, mean and max over repeat rounds."""
+    timings = []
+
+    for i in range(warmup + repeat):
+        if case.reset is not None:
+            case.reset()
+
+        start = time.perf_counter()
+
+        for _ in range(case.number):
+            case.run()
+
+        elapsed = (time.perf_counter() - start) / case.number
+
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+
+    return {
+        "rounds": repeat,
+        "number": case.number,
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.mean(timings),
+        "max_ms": max(timings),
+    }
+
+
+def select_benchmarks(only=None):
+    if not only:
+        return list(BENCHMARKS)
+
+    return [name for name in BENCHMARKS if any(part in name for part in only)]
+
+
+def own_cache():
+    """Settings override giving the default cache a key prefix of its own.
+
+    Each benchmark starts from an empty namespace instead of clearing a
+    cache that other processes may share; its entries expire as usual.
+    """
+    caches = copy.deepcopy(settings.CACHES)
+    default = caches["default"]
+    default["KEY_PREFIX"] = f"{default.get('KEY_PREFIX','')}benchmark-{time.time_ns()}"
+
+    return override_settings(CACHES=caches)
+
+
+def run_benchmarks(dataset,names,repeat,warmup):
+    results = {}
+
+    for name in names:
+        with own_cache():
+            results[name] = time_case(BENCHMARKS[name](dataset),repeat,warmup)
+
+    return results
+
+
+def benchmark_report(dataset,results,repeat,warmup):
+    return {
+        "created_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "dataset": dataset.sizes,
+        "repeat": repeat,
+        "warmup": warmup,
+        "benchmarks": results,
+    }
+
+
+def save_report(report,path):
+    path.parent.mkdir(parents=True,exist_ok=True)
+    path.write_text(json.dumps(report,indent=2) + "\n")
+
+
+def load_report(path):
+    return json.loads(path.read_text())
+
+
+Comparison = namedtuple("Comparison",["name","baseline_ms","current_ms","change","regressed"])
+
+
+def compare_reports(report,baseline,threshold):
+    """Compare medians of the benchmarks both reports ran.
+
+    change is relative to the baseline; a benchmark regressed when it got
+    slower by more than threshold (0.25 is 25%).
+    """
+    comparisons = []
+
+    for name,result in report["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+
+        if previous is None:
+            continue
+
+        change = result["median_ms"] / previous["median_ms"] - 1 if previous["median_ms"] else 0.0
+
+        comparisons.append(Comparison(name,previous["median_ms"],result["median_ms"],change,change > threshold))
+
+    return comparisons
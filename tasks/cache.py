@@ -0,0 +1,107 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.html import escape
+
+from projects.cache import ObjectCache, SingleFlight, register_object_cache
+from projects.permissions import OWNER
+
+from .models import Task
+
+
+# The project is cached on its own (projects.cache.project_cache), so a
+# project change doesn't have to reach every cached task.
+task_cache = register_object_cache(ObjectCache(Task,related=("assigned_to","completed_by")))
+
+
+# Shared by the threads of this process running the same task search.
+search_flight = SingleFlight()
+
+# Longer id lists are not cached; the search runs as a normal query.
+SEARCH_CACHE_MAX_IDS = 5000
+
+
+def search_cache_key(project,status,order,search):
+    search_digest = hashlib.md5(search.encode(),usedforsecurity=False).hexdigest()
+    return f"tasks:search:{project.pk}:{project.version}:{status}:{order}:{search_digest}"
+
+
+# Cached list pages are shared between viewers, so the two values that
+# belong to one viewer are rendered as markers and filled in per request.
+CSRF_TOKEN_MARKER = "tasks-list-page-csrf-token"
+USERNAME_MARKER = "tasks-list-page-username"
+
+
+class ViewerPlaceholder:
+    """Stands in for the user in a shared page; base.html only shows the name."""
+    is_authenticated = True
+    username = USERNAME_MARKER
+
+
+def list_page_placeholders():
+    return {"csrf_token": CSRF_TOKEN_MARKER,"user": ViewerPlaceholder()}
+
+
+def get_assignee_ids(project):
+    """Ids of the users with a task in project, cached per project version."""
+    key = f"tasks:assignees:{project.pk}:{project.version}"
+    assignee_ids = cache.get(key)
+
+    if assignee_ids is None:
+        assignee_ids = set(
+            Task.objects.filter(project=project,assigned_to__isnull=False)
+            .values_list("assigned_to_id",flat=True)
+            .distinct()
+        )
+        cache.set(key,assignee_ids,settings.TASKS_LIST_CACHE_TIMEOUT)
+
+    return assignee_ids
+
+
+def list_page_cache_key(request,project,role,status,order):
+    """Key of the rendered task list page this request would get.
+
+    Every task write and membership change bumps project.version, which
+    moves all of the project's pages to new keys. Owners see the same page
+    whoever is assigned; a member's Edit and Complete links depend on the
+    rows assigned to them, so members with assignments get their own pages.
+    """
+    viewer = "-"
+
+    if role != OWNER and request.user.pk in get_assignee_ids(project):
+        viewer = request.user.pk
+
+    params = [status,order,request.GET.get("search","").strip()]
+
+    if request.GET.get("paginate") == "cursor":
+        params += ["cursor",request.GET.get("cursor","")]
+    else:
+        params += ["page",request.GET.get("page") or "1"]
+
+    digest = hashlib.md5(json.dumps(params).encode(),usedforsecurity=False).hexdigest()
+
+    return f"tasks:list:{project.pk}:{project.version}:{role}:{viewer}:{digest}"
+
+
+def task_row_cache_key(task,version,search):
+    """Key of a task's rendered row.
+
+    The version is task_cache's, which every write to the task bumps; the
+    permission flags and the search term are all the row depends on besides
+    the task itself.
+    """
+    flags = "".join("1" if flag else "0" for flag in task.permissions)
+    search_digest = hashlib.md5(search.encode(),usedforsecurity=False).hexdigest()
+
+    return f"tasks:row:{task.pk}:{version}:{flags}:{search_digest}"
+
+
+def personalize_list_page(request,content):
+    return content.replace(
+        CSRF_TOKEN_MARKER.encode(),get_token(request).encode()
+    ).replace(
+        USERNAME_MARKER.encode(),escape(request.user.username).encode()
+    )
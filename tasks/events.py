@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One listener's queue of events for a project.
+
+    Events are pushed from whatever thread committed the write and read on
+    the event loop that subscribed. A listener that falls SUBSCRIBER_QUEUE_SIZE
+    events behind is marked overflowed instead of growing without bound.
+    """
+    def __init__(self,hub,project_id,loop):
+        self.hub = hub
+        self.project_id = project_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self,event):
+        # Runs on self.loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.hub.unsubscribe(self)
+
+    async def get(self,timeout=None):
+        return await asyncio.wait_for(self.queue.get(),timeout)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class InProcessEventHub:
+    """Fan task events out to the subscribers of this process.
+
+    Only listeners connected to the same process see an event, which is
+    enough for a single ASGI worker. A shared broker can replace it through
+    TASKS_EVENT_HUB without touching the views.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self,project_id):
+        subscription = Subscription(self,project_id,asyncio.get_running_loop())
+
+        with self.lock:
+            self.subscribers.setdefault(project_id,set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self,subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.project_id,set())
+            subscribers.discard(subscription)
+
+            if not subscribers:
+                self.subscribers.pop(subscription.project_id,None)
+
+    def publish(self,project_id,event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(project_id,()))
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver,event)
+            except RuntimeError:
+                # The subscriber's loop is closed; it will not read again.
+                self.unsubscribe(subscription)
+
+
+class RecordingEventHub(InProcessEventHub):
+    """InProcessEventHub that also keeps every published event, for tests."""
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self,project_id,event):
+        self.published.append((project_id,event))
+        super().publish(project_id,event)
+
+    def clear(self):
+        self.published.clear()
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_event_hub():
+    # One instance per configured class, shared by every thread of the process.
+    path = settings.TASKS_EVENT_HUB
+
+    with _hubs_lock:
+        if path not in _hubs:
+            _hubs[path] = import_string(path)()
+
+        return _hubs[path]
+
+
+def task_event(project_id,sequence,kind,task_ids,user=None):
+    return {
+        "project": project_id,
+        "sequence": sequence,
+        "kind": kind,
+        "tasks": list(task_ids),
+        "user": user.pk if user is not None else None,
+    }
+
+
+def format_sse(event):
+    return f"id: {event['sequence']}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,54 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_FIELDS = [
+    ("id","id"),
+    ("title","title"),
+    ("is_completed","is_completed"),
+    ("assigned_to","assigned_to__username"),
+    ("completed_by","completed_by__username"),
+    ("completed_at","completed_at"),
+    ("created_at","created_at"),
+]
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object that hands back what csv.writer writes to it."""
+
+    def write(self,value):
+        return value
+
+
+def export_rows(queryset,chunk_size=CHUNK_SIZE):
+    # Tuples straight from the cursor: no model instances, and memory
+    # bounded by chunk_size however large the project is.
+    return queryset.order_by("created_at","id").values_list(
+        *[lookup for _,lookup in EXPORT_FIELDS]
+    ).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+
+    yield writer.writerow([name for name,_ in EXPORT_FIELDS])
+
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows):
+    names = [name for name,_ in EXPORT_FIELDS]
+    encoder = DjangoJSONEncoder()
+
+    for row in rows:
+        yield encoder.encode(dict(zip(names,row))) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv",stream_csv),
+    "jsonl": ("application/x-ndjson",stream_jsonl),
+}
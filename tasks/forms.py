@@ -28,4 +28,61 @@ class AssignTaskForm(forms.ModelForm):
         self.fields["assigned_to"].queryset = User.objects.filter(
             Q(project_memberships__project=project) | 
             Q(pk=project.owner.pk)
-        ).distinct()
\ No newline at end of file
+        ).distinct()
+
+class BulkTaskActionForm(forms.Form):
+    COMPLETE = "complete"
+    ASSIGN = "assign"
+    DELETE = "delete"
+    ACTION_CHOICES = [
+        (COMPLETE,"Mark as Completed"),
+        (ASSIGN,"Assign To"),
+        (DELETE,"Delete"),
+    ]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+
+    task_ids = forms.ModelMultipleChoiceField(
+        queryset=Task.objects.none(),
+        widget=forms.MultipleHiddenInput
+    )
+
+    assigned_to = forms.ModelChoiceField(
+        queryset=User.objects.none(),
+        required=False
+    )
+
+    def __init__(self,*args,**kwargs):
+        project = kwargs.pop("project",None)
+
+        if project is None:
+            raise ValueError("BulkTaskActionForm requires a project")
+
+        super().__init__(*args,**kwargs)
+
+        self.fields["task_ids"].queryset = Task.objects.filter(project=project).only(
+            "pk","project","assigned_to","is_completed"
+        )
+
+        self.fields["assigned_to"].queryset = User.objects.filter(
+            Q(project_memberships__project=project) |
+            Q(pk=project.owner_id)
+        ).distinct()
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        if cleaned_data.get("action") == self.ASSIGN and not cleaned_data.get("assigned_to"):
+            self.add_error("assigned_to","Choose who to assign the tasks to.")
+
+        return cleaned_data
+
+
+class TaskImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ("csv","CSV"),
+        ("jsonl","JSON Lines"),
+    ]
+
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES)
@@ -0,0 +1,188 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from .forms import TaskForm
+from .models import Task, TaskChange
+from .services import record_task_changes, record_tasks_created
+
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self,max_errors=MAX_REPORTED_ERRORS):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+        # (line, message) when the file stopped being readable there.
+        self.unreadable = None
+
+    def add_error(self,line,message):
+        # Only the first max_errors are kept so a bad file cannot grow the
+        # report without bound.
+        self.error_count += 1
+
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line,message))
+
+
+class UnreadableFile(str):
+    """Error for the point where the file could no longer be read.
+
+    Readers yield it as the last row's error: nothing after it can be
+    decoded or parsed reliably, so the import stops there.
+    """
+
+
+def unreadable_file(exc):
+    if isinstance(exc,UnicodeDecodeError):
+        return UnreadableFile("The file is not valid UTF-8")
+
+    return UnreadableFile(f"Invalid CSV: {exc}")
+
+
+def iter_csv_rows(textfile):
+    reader = csv.DictReader(textfile)
+
+    try:
+        for row in reader:
+            yield reader.line_num,row,None
+    except (UnicodeDecodeError,csv.Error) as exc:
+        yield reader.line_num + 1,None,unreadable_file(exc)
+
+
+def iter_jsonl_rows(textfile):
+    line_num = 0
+    lines = iter(textfile)
+
+    while True:
+        try:
+            line = next(lines,None)
+        except UnicodeDecodeError as exc:
+            yield line_num + 1,None,unreadable_file(exc)
+            return
+
+        if line is None:
+            return
+
+        line_num += 1
+
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_num,None,f"Invalid JSON: {exc}"
+            continue
+
+        if not isinstance(row,dict):
+            yield line_num,None,"Expected a JSON object"
+            continue
+
+        yield line_num,row,None
+
+
+ROW_READERS = {
+    "csv": iter_csv_rows,
+    "jsonl": iter_jsonl_rows,
+}
+
+
+def row_value(row,field):
+    value = row.get(field)
+    return "" if value is None else str(value).strip()
+
+
+def resolve_assignees(project,usernames,known):
+    missing = usernames - known.keys()
+
+    if missing:
+        known.update(
+            User.objects.filter(username__in=missing).filter(
+                Q(project_memberships__project=project) |
+                Q(pk=project.owner_id)
+            ).distinct().values_list("username","pk")
+        )
+
+
+def import_tasks(project,rows,user=None,chunk_size=CHUNK_SIZE):
+    """Create tasks in project from (line, row, error) tuples.
+
+    rows is consumed chunk_size at a time, so the input is never held in
+    memory as a whole. Rows are validated with TaskForm, and assignee
+    usernames are resolved against the project's members once per chunk.
+    Each chunk is inserted with one bulk_create. If user is given and is
+    not the project owner, rows that assign a task are rejected, as
+    assign_task does.
+    """
+    report = ImportReport()
+    can_assign = user is None or user.pk == project.owner_id
+    assignees = {}
+
+    rows = iter(rows)
+
+    while chunk := list(islice(rows,chunk_size)):
+        usernames = {
+            row_value(row,"assigned_to")
+            for _,row,error in chunk
+            if row and not error
+        }
+        usernames.discard("")
+
+        if usernames and can_assign:
+            resolve_assignees(project,usernames,assignees)
+
+        tasks = []
+
+        for line,row,error in chunk:
+            if error:
+                report.add_error(line,error)
+
+                if isinstance(error,UnreadableFile):
+                    report.unreadable = (line,str(error))
+
+                continue
+
+            form = TaskForm(data={"title": row_value(row,"title")})
+
+            if not form.is_valid():
+                report.add_error(line,"; ".join(
+                    message for messages in form.errors.values() for message in messages
+                ))
+                continue
+
+            task = form.save(commit=False)
+            task.project = project
+
+            username = row_value(row,"assigned_to")
+
+            if username:
+                if not can_assign:
+                    report.add_error(line,"Only the project owner can assign tasks")
+                    continue
+
+                if username not in assignees:
+                    report.add_error(line,f"{username} is not a member of this project")
+                    continue
+
+                task.assigned_to_id = assignees[username]
+
+            tasks.append(task)
+
+        if tasks:
+            with transaction.atomic():
+                Task.objects.bulk_create(tasks)
+                record_tasks_created(project,len(tasks))
+                record_task_changes(project,TaskChange.CREATED,[task.pk for task in tasks],user)
+
+            report.created += len(tasks)
+
+    return report
@@ -0,0 +1,90 @@
+import re
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from projects.models import Project
+from tasks.models import Task
+from tasks.templatetags.highlight import compile_highlight_pattern, highlight
+from tasks.views import attach_task_permissions, attach_task_rows
+
+
+class Command(BaseCommand):
+    help = "Time the highlight filter alone and inside a full list_task.html render."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows",type=int,default=500)
+        parser.add_argument("--repeat",type=int,default=20)
+        parser.add_argument("--search",default="fix login")
+
+    def handle(self, *args, **options):
+        rows,repeat,search = options["rows"],options["repeat"],options["search"]
+
+        # Unsaved instances: the benchmark never touches the database.
+        owner = User(pk=1,username="owner")
+        project = Project(pk=1,name="Benchmark Project",owner=owner)
+        tasks = [
+            Task(
+                pk=i,
+                title=f"Fix login <bug> #{i} & follow up",
+                project=project,
+                assigned_to=owner if i % 2 else None,
+                created_at=timezone.now(),
+            )
+            for i in range(1,rows + 1)
+        ]
+
+        def compile_per_row():
+            for task in tasks:
+                # re keeps its own compile cache; purge it too so every row
+                # pays for a real compile, as the old filter could.
+                compile_highlight_pattern.cache_clear()
+                re.purge()
+                highlight(task.title,search)
+
+        uncached = self.time(compile_per_row,repeat)
+
+        compile_highlight_pattern.cache_clear()
+        cached = self.time(lambda: [highlight(task.title,search) for task in tasks],repeat)
+
+        request = RequestFactory().get("/",{"search": search})
+        request.user = AnonymousUser()
+
+        context = {
+            "project": project,
+            "tasks": tasks,
+            "status": "all",
+            "order": "newest",
+            "search": search,
+            "total_count": rows,
+            "completed_count": 0,
+            "pending_count": rows,
+        }
+        attach_task_permissions(request.user,project,tasks,None)
+
+        def render_page():
+            attach_task_rows(tasks,search)
+            return render_to_string("list_task.html",context,request=request)
+
+        # Rows would otherwise come from the row cache after the first run.
+        with override_settings(TASKS_ROW_CACHE_TIMEOUT=0):
+            render = self.time(render_page,repeat)
+
+        self.stdout.write(f"highlight x{rows}, pattern compiled per row: {uncached * 1000:.2f} ms")
+        self.stdout.write(f"highlight x{rows}, cached pattern:          {cached * 1000:.2f} ms")
+        self.stdout.write(f"list_task.html with {rows} rows:           {render * 1000:.2f} ms")
+        self.stdout.write(f"pattern cache: {compile_highlight_pattern.cache_info()}")
+
+    def time(self, func, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
@@ -0,0 +1,136 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from projects.models import Project
+from tasks.models import Task
+from tasks.services import rebuild_task_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare tail latency of the sync task list (WSGI handler, one thread per "
+        "client) with the async one (ASGI handler, one event loop) under "
+        "concurrent load. Seeds its own project and removes it afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks",type=int,default=2000)
+        parser.add_argument("--requests",type=int,default=400)
+        parser.add_argument("--concurrency",type=int,default=16)
+
+    # The test clients send Host: testserver.
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        owner,project = self.seed(options["tasks"])
+
+        try:
+            query = {"status": "all","search": "task"}
+            sync_url = reverse("list_tasks",args=[project.pk])
+            async_url = reverse("list_tasks_async",args=[project.pk])
+
+            wsgi = self.run_sync(owner,sync_url,query,options)
+            asgi = asyncio.run(self.run_async(owner,async_url,query,options))
+
+            self.report("WSGI TaskListView",wsgi)
+            self.report("ASGI list_tasks_async",asgi)
+        finally:
+            project.delete()
+            owner.delete()
+
+    def seed(self, count):
+        owner = User.objects.create_user(username=f"bench-latency-{time.time_ns()}")
+        project = Project.objects.create(name="Latency Benchmark",owner=owner)
+
+        now = timezone.now()
+        Task.objects.bulk_create(
+            Task(
+                title=f"Benchmark task {i}",
+                project=project,
+                assigned_to=owner if i % 2 else None,
+                is_completed=i % 4 == 0,
+                completed_by=owner if i % 4 == 0 else None,
+                completed_at=now if i % 4 == 0 else None,
+            )
+            for i in range(count)
+        )
+        rebuild_task_counter(project)
+
+        return owner,project
+
+    def run_sync(self, owner, url, query, options):
+        timings = []
+        lock = threading.Lock()
+        per_client = max(options["requests"] // options["concurrency"],1)
+
+        def worker():
+            client = Client()
+            client.force_login(owner)
+
+            try:
+                for _ in range(per_client):
+                    start = time.perf_counter()
+                    response = client.get(url,query)
+                    elapsed = time.perf_counter() - start
+
+                    assert response.status_code == 200,response.status_code
+
+                    with lock:
+                        timings.append(elapsed)
+
+                client.logout()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return timings
+
+    async def run_async(self, owner, url, query, options):
+        timings = []
+        clients = []
+        per_client = max(options["requests"] // options["concurrency"],1)
+
+        async def worker():
+            client = AsyncClient()
+            await client.aforce_login(owner)
+            clients.append(client)
+
+            for _ in range(per_client):
+                start = time.perf_counter()
+                response = await client.get(url,query)
+                timings.append(time.perf_counter() - start)
+
+                assert response.status_code == 200,response.status_code
+
+        await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+
+        for client in clients:
+            await client.alogout()
+
+        return timings
+
+    def report(self, label, timings):
+        cuts = statistics.quantiles(timings,n=100)
+
+        self.stdout.write(
+            f"{label}: {len(timings)} requests  "
+            f"p50 {cuts[49] * 1000:.1f} ms  "
+            f"p95 {cuts[94] * 1000:.1f} ms  "
+            f"p99 {cuts[98] * 1000:.1f} ms  "
+            f"max {max(timings) * 1000:.1f} ms"
+        )
@@ -0,0 +1,90 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from projects.models import Project
+from tasks.cache import task_cache
+from tasks.models import Task
+from tasks.views import attach_task_permissions, attach_task_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Time list_task.html with every row rendered, with all rows served from "
+        "the row cache, and with one changed row re-rendered per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows",type=int,default=200)
+        parser.add_argument("--repeat",type=int,default=20)
+        parser.add_argument("--search",default="login")
+
+    def handle(self, *args, **options):
+        rows,repeat,search = options["rows"],options["repeat"],options["search"]
+
+        # Unsaved instances: the benchmark never touches the database.
+        owner = User(pk=1,username="owner")
+        project = Project(pk=1,name="Benchmark Project",owner=owner)
+        tasks = [
+            Task(
+                pk=i,
+                title=f"Fix login <bug> #{i} & follow up",
+                project=project,
+                assigned_to=owner if i % 2 else None,
+                created_at=timezone.now(),
+            )
+            for i in range(1,rows + 1)
+        ]
+
+        request = RequestFactory().get("/",{"search": search})
+        request.user = owner
+        attach_task_permissions(owner,project,tasks,"owner")
+
+        context = {
+            "project": project,
+            "tasks": tasks,
+            "status": "all",
+            "order": "newest",
+            "search": search,
+            "total_count": rows,
+            "completed_count": 0,
+            "pending_count": rows,
+        }
+
+        def render_page():
+            attach_task_rows(tasks,search)
+            return render_to_string("list_task.html",context,request=request)
+
+        with override_settings(TASKS_ROW_CACHE_TIMEOUT=0):
+            uncached = self.time(render_page,repeat)
+
+        cache.clear()
+        render_page()
+        warm = self.time(render_page,repeat)
+
+        changed = iter(range(repeat))
+
+        def render_after_change():
+            task_cache.bump(tasks[next(changed) % rows].pk)
+            render_page()
+
+        one_changed = self.time(render_after_change,repeat)
+
+        self.stdout.write(f"list_task.html with {rows} rows, every row rendered: {uncached * 1000:.2f} ms")
+        self.stdout.write(f"list_task.html with {rows} rows, rows from cache:    {warm * 1000:.2f} ms")
+        self.stdout.write(f"list_task.html with {rows} rows, one row changed:    {one_changed * 1000:.2f} ms")
+
+    def time(self, func, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
@@ -0,0 +1,128 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from projects.models import Project
+from tasks.models import Task
+from tasks.services import filter_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large task table inside a transaction that is rolled back, then "
+        "compare query plans and timings of the task list access paths with and "
+        "without the Task indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows",type=int,default=1_000_000)
+        parser.add_argument("--projects",type=int,default=100)
+        parser.add_argument("--users",type=int,default=50)
+        parser.add_argument("--batch-size",type=int,default=10_000)
+        parser.add_argument("--repeat",type=int,default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            project,user = self.seed(options)
+
+            queries = self.access_paths(project,user)
+
+            with transaction.atomic():
+                self.drop_indexes()
+                without = self.measure(queries,options["repeat"])
+                transaction.set_rollback(True)
+
+            with_indexes = self.measure(queries,options["repeat"])
+
+            for label in queries:
+                self.report(label,without[label],with_indexes[label])
+
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        self.stdout.write(f"Seeding {options['rows']} tasks (rolled back afterwards)...")
+
+        users = User.objects.bulk_create(
+            User(username=f"bench-index-user-{i}") for i in range(options["users"])
+        )
+        projects = Project.objects.bulk_create(
+            Project(name=f"Bench Project {i}",owner=users[0]) for i in range(options["projects"])
+        )
+
+        now = timezone.now()
+        batch = []
+
+        for i in range(options["rows"]):
+            completed = i % 3 == 0
+            user = users[(i // 7) % len(users)]
+
+            batch.append(Task(
+                title=f"Task {i}",
+                project=projects[i % len(projects)],
+                assigned_to=user if i % 5 else None,
+                is_completed=completed,
+                completed_by=user if completed else None,
+                completed_at=now if completed else None,
+            ))
+
+            if len(batch) == options["batch_size"]:
+                Task.objects.bulk_create(batch)
+                batch = []
+
+        Task.objects.bulk_create(batch)
+
+        if connection.vendor in ("sqlite","postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        return projects[0],users[1]
+
+    def access_paths(self, project, user):
+        base_qs = Task.objects.filter(project=project).select_related("assigned_to")
+
+        return {
+            "pending, newest": filter_tasks(base_qs,"pending").order_by("-created_at","-id")[:3],
+            "completed, oldest": filter_tasks(base_qs,"completed").order_by("created_at","id")[:3],
+            "all, newest": filter_tasks(base_qs,"all").order_by("-created_at","-id")[:3],
+            "recently completed": filter_tasks(base_qs,"completed").order_by("-completed_at")[:3],
+            "assigned to user": Task.objects.filter(assigned_to=user).order_by("-created_at")[:3],
+        }
+
+    def drop_indexes(self):
+        editor = connection.schema_editor()
+        quote_name = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            for index in Task._meta.indexes:
+                cursor.execute(editor.sql_delete_index % {
+                    "table": quote_name(Task._meta.db_table),
+                    "name": quote_name(index.name),
+                })
+
+    def measure(self, queries, repeat):
+        results = {}
+
+        for label,qs in queries.items():
+            plan = qs.explain()
+            timings = []
+
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(qs.all())
+                timings.append(time.perf_counter() - start)
+
+            results[label] = (plan,min(timings))
+
+        return results
+
+    def report(self, label, without, with_indexes):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+
+        for name,(plan,elapsed) in (("without indexes",without),("with indexes",with_indexes)):
+            self.stdout.write(f"  {name}: {elapsed * 1000:.2f} ms")
+
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.models import Project
+from tasks.imports import CHUNK_SIZE, ROW_READERS, import_tasks
+
+
+class Command(BaseCommand):
+    help = "Import tasks into a project from a CSV or JSON Lines file, one chunk at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_id",type=int)
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=sorted(ROW_READERS),
+            help="File format (default: from the file extension).",
+        )
+        parser.add_argument("--chunk-size",type=int,default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options["project_id"])
+        except Project.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} does not exist")
+
+        path = Path(options["path"])
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+
+        if file_format not in ROW_READERS:
+            raise CommandError(f"Cannot tell the format of {path}; pass --format")
+
+        with path.open(encoding="utf-8-sig",newline="") as textfile:
+            report = import_tasks(
+                project,
+                ROW_READERS[file_format](textfile),
+                chunk_size=options["chunk_size"]
+            )
+
+        for line,message in report.errors:
+            self.stderr.write(f"Line {line}: {message}")
+
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... and {report.error_count - len(report.errors)} more error(s)")
+
+        if report.unreadable:
+            line,message = report.unreadable
+            raise CommandError(
+                f"{message} (line {line}); created {report.created} task(s) from the rows before it"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report.created} task(s), skipped {report.error_count} row(s)"
+        ))
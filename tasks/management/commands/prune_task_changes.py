@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks.services import prune_task_changes
+
+
+class Command(BaseCommand):
+    help = "Delete task change feed entries older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Keep changes from the last DAYS days (default: TASKS_CHANGES_RETENTION_DAYS).",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+
+        if days is None:
+            days = settings.TASKS_CHANGES_RETENTION_DAYS
+
+        if days < 1:
+            raise CommandError("--days must be at least 1")
+
+        deleted = prune_task_changes(timezone.now() - timedelta(days=days))
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} task change(s)"))
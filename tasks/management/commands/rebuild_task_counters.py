@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects.models import Project
+from tasks.models import ProjectTaskCounter
+from tasks.services import count_tasks, rebuild_task_counter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-project task counters from the task table, or verify them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_ids",nargs="*",type=int,help="Only these projects (default: all).")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report counters that drifted from the task table without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by("pk")
+
+        if options["project_ids"]:
+            projects = projects.filter(pk__in=options["project_ids"])
+
+        counters = {
+            counter.project_id: counter
+            for counter in ProjectTaskCounter.objects.filter(project__in=projects)
+        }
+
+        drifted = 0
+
+        for project in projects.iterator():
+            with transaction.atomic():
+                counter = counters.get(project.pk)
+
+                if counter is None and options["check"]:
+                    # Missing counters are built lazily on first read.
+                    continue
+
+                expected = count_tasks(project)
+                actual = {
+                    field: getattr(counter,field) if counter else None
+                    for field in expected
+                }
+
+                if actual == expected:
+                    continue
+
+                drifted += 1
+                self.stdout.write(f"Project {project.pk}: counter {actual} != tasks {expected}")
+
+                if not options["check"]:
+                    rebuild_task_counter(project)
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{drifted} project counter(s) out of date")
+
+            self.stdout.write(self.style.SUCCESS("All task counters are up to date"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {drifted} project counter(s)"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tasks.search import FTS_TABLE, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Repopulate the task full-text search table from tasks_task and compact it."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+
+        if not getattr(backend,"is_available",lambda using: False)(connection.alias):
+            raise CommandError("The configured search backend has no full-text index to rebuild")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"""
+                INSERT INTO {FTS_TABLE}(rowid, title, assignee, project_id)
+                SELECT task.id, task.title, COALESCE(auth_user.username, ''), task.project_id
+                FROM tasks_task AS task
+                LEFT JOIN auth_user ON auth_user.id = task.assigned_to_id
+            """)
+            indexed = cursor.rowcount
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} task(s)"))
@@ -0,0 +1,135 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from tasks.benchmarks import (BENCHMARKS, Dataset, benchmark_report, compare_reports, load_report, run_benchmarks,
+                              save_report, select_benchmarks)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the task services, permission helpers, the highlight filter and "
+        "full request cycles of the main views against a seeded dataset. "
+        "Results are saved as JSON and compared with a baseline; the command "
+        "fails when a benchmark regressed by more than the threshold. Runs "
+        "against a test database created for the run and destroyed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--projects",type=int,default=10)
+        parser.add_argument("--tasks",type=int,default=1000,help="Tasks per project.")
+        parser.add_argument("--members",type=int,default=5,help="Members of every project.")
+        parser.add_argument("--repeat",type=int,default=20)
+        parser.add_argument("--warmup",type=int,default=3)
+        parser.add_argument("--only",action="append",help="Run the benchmarks whose name contains this; repeatable.")
+        parser.add_argument("--output",default=None,help="Results file (default: BENCHMARK_DIR/latest.json).")
+        parser.add_argument("--baseline",default=None,help="Baseline file (default: BENCHMARK_DIR/baseline.json, if any).")
+        parser.add_argument("--save-baseline",action="store_true",help="Also save the results as the baseline.")
+        parser.add_argument("--threshold",type=float,default=None,help="Allowed slowdown (default: BENCHMARK_REGRESSION_THRESHOLD).")
+        parser.add_argument("--list",action="store_true",help="List the benchmarks and exit.")
+        parser.add_argument(
+            "--use-configured-database",
+            action="store_true",
+            help="Seed the configured database instead of a test database; the seeded rows are removed afterwards.",
+        )
+        parser.add_argument(
+            "--noinput","--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Replace a leftover test database without asking.",
+        )
+
+    # The test clients send Host: testserver.
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name in BENCHMARKS:
+                self.stdout.write(name)
+            return
+
+        if options["projects"] < 1 or options["tasks"] < 1 or options["repeat"] < 1:
+            raise CommandError("--projects, --tasks and --repeat must be at least 1")
+
+        names = select_benchmarks(options["only"])
+
+        if not names:
+            raise CommandError("No benchmark matches --only")
+
+        directory = Path(settings.BENCHMARK_DIR)
+        output = Path(options["output"]) if options["output"] else directory / "latest.json"
+        baseline_path = Path(options["baseline"]) if options["baseline"] else directory / "baseline.json"
+
+        if options["baseline"] and not baseline_path.exists():
+            raise CommandError(f"No baseline at {baseline_path}")
+
+        threshold = options["threshold"]
+
+        if threshold is None:
+            threshold = settings.BENCHMARK_REGRESSION_THRESHOLD
+
+        baseline = load_report(baseline_path) if baseline_path.exists() and not options["save_baseline"] else None
+
+        if options["use_configured_database"]:
+            report = self.run_suite(names,options)
+        else:
+            old_name = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(verbosity=0,autoclobber=not options["interactive"])
+
+            try:
+                report = self.run_suite(names,options)
+            finally:
+                connection.creation.destroy_test_db(old_name,verbosity=0)
+
+        save_report(report,output)
+
+        for name,result in report["benchmarks"].items():
+            self.stdout.write(
+                f"{name:<36} median {result['median_ms']:9.3f} ms  "
+                f"min {result['min_ms']:9.3f} ms  max {result['max_ms']:9.3f} ms"
+            )
+
+        self.stdout.write(f"Results written to {output}")
+
+        if options["save_baseline"]:
+            save_report(report,baseline_path)
+            self.stdout.write(f"Baseline saved to {baseline_path}")
+
+        if baseline is None:
+            return
+
+        if baseline.get("dataset") != report["dataset"]:
+            self.stderr.write(
+                f"Baseline dataset {baseline.get('dataset')} differs from this run's "
+                f"{report['dataset']}; timings may not be comparable"
+            )
+
+        regressions = []
+
+        for comparison in compare_reports(report,baseline,threshold):
+            flag = "  REGRESSION" if comparison.regressed else ""
+            self.stdout.write(
+                f"{comparison.name:<36} {comparison.baseline_ms:9.3f} -> {comparison.current_ms:9.3f} ms "
+                f"({comparison.change:+.1%}){flag}"
+            )
+
+            if comparison.regressed:
+                regressions.append(comparison.name)
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                f"{threshold:.0%}: {', '.join(regressions)}"
+            )
+
+    def run_suite(self, names, options):
+        dataset = Dataset(options["projects"],options["tasks"],options["members"])
+
+        try:
+            results = run_benchmarks(dataset,names,options["repeat"],options["warmup"])
+        finally:
+            dataset.delete()
+
+        return benchmark_report(dataset,results,options["repeat"],options["warmup"])
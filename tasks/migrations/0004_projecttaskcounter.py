@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 18:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_delete_task'),
+        ('tasks', '0003_task_task_completion_audit_consistency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='task_counter', to='projects.project')),
+            ],
+        ),
+    ]
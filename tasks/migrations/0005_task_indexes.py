@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 18:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_delete_task'),
+        ('tasks', '0004_projecttaskcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['project', '-created_at', '-id'], name='task_proj_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['project', '-created_at', '-id'], name='task_proj_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='task_proj_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['project', '-completed_at'], name='task_proj_completed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', False)), fields=['assigned_to', '-created_at'], name='task_assignee_created_idx'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+
+FTS_TABLE = "tasks_task_fts"
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title,
+        assignee,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, assignee) VALUES (
+            new.id,
+            new.title,
+            COALESCE((SELECT username FROM auth_user WHERE id = new.assigned_to_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON tasks_task BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF title, assigned_to_id ON tasks_task BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, assignee) VALUES (
+            new.id,
+            new.title,
+            COALESCE((SELECT username FROM auth_user WHERE id = new.assigned_to_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_assignee_rename AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE {FTS_TABLE} SET assignee = new.username
+        WHERE rowid IN (SELECT id FROM tasks_task WHERE assigned_to_id = new.id);
+    END
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, assignee)
+    SELECT task.id, task.title, COALESCE(auth_user.username, '')
+    FROM tasks_task AS task
+    LEFT JOIN auth_user ON auth_user.id = task.assigned_to_id
+    """,
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_assignee_rename",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def fts5_supported(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases, or SQLite builds without FTS5, use the LIKE search.
+    if not fts5_supported(schema_editor):
+        return
+
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tasks', '0005_task_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
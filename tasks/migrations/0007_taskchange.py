@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 18:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_changes(apps,schema_editor):
+    # Existing tasks enter the feed as creations under one new version per
+    # project, so a client syncing from 0 still receives them.
+    Project = apps.get_model("projects","Project")
+    Task = apps.get_model("tasks","Task")
+    TaskChange = apps.get_model("tasks","TaskChange")
+
+    for project_id in Task.objects.values_list("project_id",flat=True).distinct():
+        Project.objects.filter(pk=project_id).update(version=F("version") + 1)
+        sequence = Project.objects.filter(pk=project_id).values_list("version",flat=True).get()
+
+        TaskChange.objects.bulk_create(
+            (
+                TaskChange(project_id=project_id,task_id=task_id,sequence=sequence,kind="created")
+                for task_id in Task.objects.filter(project_id=project_id).values_list("pk",flat=True).iterator()
+            ),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_project_version'),
+        ('tasks', '0006_task_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField()),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('completed', 'Completed'), ('assigned', 'Assigned'), ('deleted', 'Deleted')], max_length=20)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_changes', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'sequence'], name='task_change_seq_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_changes,migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+FTS_TABLE = "tasks_task_fts"
+
+# Migration modules start with a digit, so they can't be imported by name.
+previous = import_module("tasks.migrations.0006_task_search_index")
+
+# project_id is stored but not tokenized, so a search can be limited to one
+# project inside the FTS subquery.
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title,
+        assignee,
+        project_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, assignee, project_id) VALUES (
+            new.id,
+            new.title,
+            COALESCE((SELECT username FROM auth_user WHERE id = new.assigned_to_id), ''),
+            new.project_id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON tasks_task BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF title, assigned_to_id, project_id ON tasks_task BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, assignee, project_id) VALUES (
+            new.id,
+            new.title,
+            COALESCE((SELECT username FROM auth_user WHERE id = new.assigned_to_id), ''),
+            new.project_id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_assignee_rename AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE {FTS_TABLE} SET assignee = new.username
+        WHERE rowid IN (SELECT id FROM tasks_task WHERE assigned_to_id = new.id);
+    END
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, assignee, project_id)
+    SELECT task.id, task.title, COALESCE(auth_user.username, ''), task.project_id
+    FROM tasks_task AS task
+    LEFT JOIN auth_user ON auth_user.id = task.assigned_to_id
+    """,
+]
+
+
+def add_project_column(apps, schema_editor):
+    if not previous.fts5_supported(schema_editor):
+        return
+
+    for sql in previous.DROP_SQL + CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def remove_project_column(apps, schema_editor):
+    if not previous.fts5_supported(schema_editor):
+        return
+
+    for sql in previous.DROP_SQL + previous.CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_taskchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_project_column, remove_project_column),
+    ]
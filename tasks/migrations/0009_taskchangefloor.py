@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 19:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_apitoken'),
+        ('tasks', '0008_task_search_project'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChangeFloor',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_change_floor', serialize=False, to='projects.project')),
+                ('sequence', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
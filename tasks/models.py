@@ -49,7 +49,128 @@ class Task(models.Model):
             ),
         ]
 
-    
+        indexes = [
+            # Status tabs of the list page, newest/oldest order with the id
+            # tie-breaker used by cursor pagination. Partial rather than
+            # keyed on is_completed: boolean filters compile to
+            # "NOT is_completed", which only a matching index condition can use.
+            models.Index(
+                fields=["project","-created_at","-id"],
+                condition=Q(is_completed=False),
+                name="task_proj_pending_idx",
+            ),
+            models.Index(
+                fields=["project","-created_at","-id"],
+                condition=Q(is_completed=True),
+                name="task_proj_completed_idx",
+            ),
+            # "All" tab of the list page.
+            models.Index(
+                fields=["project","-created_at","-id"],
+                name="task_proj_created_idx",
+            ),
+            # Completed tasks by completion time.
+            models.Index(
+                fields=["project","-completed_at"],
+                condition=Q(is_completed=True),
+                name="task_proj_completed_at_idx",
+            ),
+            # Tasks assigned to a user.
+            models.Index(
+                fields=["assigned_to","-created_at"],
+                condition=Q(assigned_to__isnull=False),
+                name="task_assignee_created_idx",
+            ),
+        ]
+
+
+class ProjectTaskCounter(models.Model):
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="task_counter"
+    )
+
+    total_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.project}: {self.completed_count}/{self.total_count} completed"
+
+
+class TaskChange(models.Model):
+    """One entry of a project's task change feed.
+
+    sequence is the project version the change was committed under, so a
+    client that has seen version N asks for everything after N. Writes that
+    touch several tasks share one sequence.
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    COMPLETED = "completed"
+    ASSIGNED = "assigned"
+    DELETED = "deleted"
+    KIND_CHOICES = [
+        (CREATED,"Created"),
+        (UPDATED,"Updated"),
+        (COMPLETED,"Completed"),
+        (ASSIGNED,"Assigned"),
+        (DELETED,"Deleted"),
+    ]
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="task_changes"
+    )
+
+    # Not a foreign key: deletions are kept as tombstones.
+    task_id = models.BigIntegerField()
+
+    sequence = models.PositiveBigIntegerField()
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES
+    )
+
+    changed_by = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+"
+    )
+
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["project","sequence"],
+                name="task_change_seq_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}#{self.sequence}: task {self.task_id} {self.kind}"
+
+
+class TaskChangeFloor(models.Model):
+    """Highest sequence pruned from a project's change feed.
+
+    A client whose cursor is below it missed changes that are gone and has
+    to reload the tasks instead.
+    """
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="task_change_floor"
+    )
 
-  
+    sequence = models.PositiveBigIntegerField(default=0)
 
+    def __str__(self):
+        return f"{self.project_id}: pruned through #{self.sequence}"
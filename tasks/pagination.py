@@ -0,0 +1,123 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+NEXT = "next"
+PREVIOUS = "prev"
+
+
+def encode_cursor(task,direction,descending):
+    payload = {
+        "c": task.created_at.isoformat(),
+        "i": task.pk,
+        "d": direction,
+        "o": "desc" if descending else "asc",
+    }
+    raw = json.dumps(payload,separators=(",",":")).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        created_at = parse_datetime(payload["c"])
+        pk = int(payload["i"])
+        direction = payload["d"]
+        descending = payload["o"] == "desc"
+    except (binascii.Error,ValueError,TypeError,KeyError):
+        raise BadRequest("Invalid cursor")
+
+    if created_at is None or direction not in (NEXT,PREVIOUS):
+        raise BadRequest("Invalid cursor")
+
+    return created_at,pk,direction,descending
+
+
+class CursorPage:
+    """A page of tasks keyed on (created_at, id) instead of an offset.
+
+    Mirrors the parts of django.core.paginator.Page the templates use, but
+    has no page number or page count: working those out needs a COUNT.
+    """
+
+    def __init__(self,object_list,next_cursor=None,previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self,index):
+        return self.object_list[index]
+
+
+def paginate_by_cursor(queryset,cursor,per_page,descending=True):
+    if descending:
+        ordering = ("-created_at","-id")
+    else:
+        ordering = ("created_at","id")
+
+    direction = NEXT
+
+    if cursor:
+        created_at,pk,direction,cursor_descending = decode_cursor(cursor)
+
+        if cursor_descending != descending:
+            # The ordering changed since the cursor was issued; start over.
+            cursor = None
+            direction = NEXT
+
+    if not cursor:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        has_next,has_previous = has_more,False
+    else:
+        # Moving forward on a descending ordering (or backward on an
+        # ascending one) walks towards smaller keys.
+        lookup = "lt" if (direction == NEXT) == descending else "gt"
+        keyset = (
+            Q(**{f"created_at__{lookup}": created_at}) |
+            Q(created_at=created_at,**{f"id__{lookup}": pk})
+        )
+
+        if direction == NEXT:
+            rows = list(queryset.filter(keyset).order_by(*ordering)[:per_page + 1])
+            has_next,has_previous = len(rows) > per_page,True
+            rows = rows[:per_page]
+        else:
+            reverse = tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+            rows = list(queryset.filter(keyset).order_by(*reverse)[:per_page + 1])
+            has_next,has_previous = True,len(rows) > per_page
+            rows = rows[:per_page][::-1]
+
+    next_cursor = None
+    previous_cursor = None
+
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1],NEXT,descending)
+
+    if rows and has_previous:
+        previous_cursor = encode_cursor(rows[0],PREVIOUS,descending)
+
+    return CursorPage(rows,next_cursor,previous_cursor)
@@ -0,0 +1,101 @@
+import functools
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+FTS_TABLE = "tasks_task_fts"
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class LikeSearchBackend:
+    """Substring match on the title or the assignee's username."""
+
+    def search(self,queryset,search_query,ranked=False,project=None):
+        return queryset.filter(
+            Q(title__icontains=search_query) |
+            Q(assigned_to__username__icontains=search_query)
+        )
+
+
+class SQLiteFTSSearchBackend(LikeSearchBackend):
+    """Prefix search against the tasks_task_fts FTS5 table.
+
+    The table is created by migrations 0006 and 0008 and kept in sync by triggers on
+    tasks_task and auth_user. Every word of the query must prefix-match a
+    word of the title or the assignee's username; given a project, only its
+    tasks are matched. When the database has no FTS table, or the query has
+    no words, it falls back to the LIKE search.
+    """
+
+    def __init__(self):
+        # Per connection alias: whether it has the FTS table.
+        self._available = {}
+
+    def is_available(self,using):
+        if using not in self._available:
+            connection = connections[using]
+
+            try:
+                available = (
+                    connection.vendor == "sqlite" and
+                    FTS_TABLE in connection.introspection.table_names()
+                )
+            except DatabaseError:
+                available = False
+
+            self._available[using] = available
+
+        return self._available[using]
+
+    def build_match(self,search_query):
+        tokens = TOKEN_RE.findall(search_query)
+
+        if not tokens:
+            return None
+
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def search(self,queryset,search_query,ranked=False,project=None):
+        match = self.build_match(search_query)
+
+        if match is None or not self.is_available(queryset.db):
+            return super().search(queryset,search_query,ranked,project)
+
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        params = [match]
+
+        if project is not None:
+            sql += " AND project_id = %s"
+            params.append(project.pk)
+
+        queryset = queryset.filter(pk__in=RawSQL(sql,params))
+
+        if not ranked:
+            return queryset
+
+        table = queryset.model._meta.db_table
+
+        # bm25() is negative; lower is more relevant.
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                [match],
+                output_field=FloatField(),
+            )
+        ).order_by("search_rank","-created_at")
+
+
+@functools.cache
+def load_search_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    # One instance per backend, so its availability checks are kept.
+    return load_search_backend(settings.TASKS_SEARCH_BACKEND)
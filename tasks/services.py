@@ -1,9 +1,24 @@
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
 
-def get_tasks_preferences(request):
-    VALID_STATUS = ["all","completed","pending"]
-    VALID_ORDERING = ["newest","oldest"]
+from projectapp.metrics import CACHE_REQUESTS
+from projects.models import Project
+from projects.services import bump_project_version
+
+from .cache import SEARCH_CACHE_MAX_IDS, search_cache_key, search_flight, task_cache
+from .events import get_event_hub, task_event
+from .models import ProjectTaskCounter, Task, TaskChange, TaskChangeFloor
+from .search import get_search_backend
+
+
+VALID_STATUS = ["all","completed","pending"]
+VALID_ORDERING = ["newest","oldest"]
 
+
+def get_tasks_preferences(request):
     status = request.GET.get("status")
     order = request.GET.get("order")
 
@@ -31,12 +46,303 @@ def filter_tasks(base_qs,status):
         return base_qs
     
 
-def search_tasks(queryset,search_query):
+def get_task_list_queryset(project,status,order,search_query):
+    qs = (
+        Task.objects.filter(project=project).order_by(get_ordering(order)).select_related("assigned_to","completed_by")
+    )
+
+    qs = filter_tasks(qs,status)
+
+    if search_query:
+        task_ids = get_search_result_ids(project,status,order,search_query)
+
+        if task_ids is not None:
+            return qs.filter(pk__in=task_ids)
+
+    return search_tasks(qs,search_query,project=project)
+
+
+def get_search_result_ids(project,status,order,search_query):
+    """Ids of the project's tasks matching the search, or None if too many.
+
+    Cached per project version, so any task write starts a new entry.
+    Concurrent misses for the same search share one query.
+    """
+    if not settings.TASKS_SEARCH_CACHE_TIMEOUT:
+        return None
+
+    key = search_cache_key(project,status,order,search_query)
+
+    def run_search():
+        # A caller that just finished may have filled it.
+        task_ids = cache.get(key)
+
+        if task_ids is None:
+            qs = filter_tasks(Task.objects.filter(project=project),status)
+            qs = search_tasks(qs,search_query,project=project).order_by(get_ordering(order))
+            task_ids = list(qs.values_list("pk",flat=True)[:SEARCH_CACHE_MAX_IDS + 1])
+            cache.set(key,task_ids,settings.TASKS_SEARCH_CACHE_TIMEOUT)
+
+        return task_ids
+
+    task_ids = cache.get(key)
+    CACHE_REQUESTS.inc(cache="tasks:search",result="miss" if task_ids is None else "hit")
+
+    if task_ids is None:
+        task_ids = search_flight.do(key,run_search)
+
+    return task_ids if len(task_ids) <= SEARCH_CACHE_MAX_IDS else None
+
+
+def search_tasks(queryset,search_query,ranked=False,project=None):
+    # project narrows the index lookup; queryset must already be limited to it.
     if not search_query:
         return queryset
     
-    return queryset.filter(
-        Q(title__icontains=search_query) | 
-        Q(assigned_to__username__icontains=search_query)
+    return get_search_backend().search(queryset,search_query,ranked=ranked,project=project)
+
+
+def count_tasks(project):
+    counts = Task.objects.filter(project=project).aggregate(
+        total=Count("pk"),
+        completed=Count("pk",filter=Q(is_completed=True)),
+    )
+
+    return {
+        "total_count": counts["total"],
+        "completed_count": counts["completed"],
+        "pending_count": counts["total"] - counts["completed"],
+    }
+
+
+def rebuild_task_counter(project):
+    counter,_ = ProjectTaskCounter.objects.update_or_create(
+        project=project,
+        defaults=count_tasks(project)
+    )
+
+    return counter
+
+
+def get_task_counter(project):
+    counter = ProjectTaskCounter.objects.filter(project=project).first()
+
+    if counter is None:
+        counter = rebuild_task_counter(project)
+
+    return counter
+
+
+def update_task_counter(project,total=0,completed=0,pending=0):
+    # Must run inside the transaction that applied the change: a missing
+    # counter is rebuilt from the rows, which already include it.
+    updated = ProjectTaskCounter.objects.filter(project=project).update(
+        total_count=F("total_count") + total,
+        completed_count=F("completed_count") + completed,
+        pending_count=F("pending_count") + pending,
+    )
+
+    if not updated:
+        rebuild_task_counter(project)
+
+
+def record_tasks_created(project,count=1):
+    update_task_counter(project,total=count,pending=count)
+
+
+def record_tasks_completed(project,count=1):
+    update_task_counter(project,completed=count,pending=-count)
+
+
+def record_tasks_deleted(project,completed=0,pending=0):
+    update_task_counter(
+        project,
+        total=-(completed + pending),
+        completed=-completed,
+        pending=-pending
+    )
+
+
+def record_task_changes(project,kind,task_ids,user=None):
+    """Bump the project version and log kind for each task under it.
+
+    Call inside the transaction that makes the change; returns the sequence.
+    Live listeners are told once the transaction commits.
+    """
+    task_ids = list(task_ids)
+    sequence = bump_project_version(project)
+
+    TaskChange.objects.bulk_create(
+        TaskChange(
+            project_id=project.pk,
+            task_id=task_id,
+            sequence=sequence,
+            kind=kind,
+            changed_by=user
+        )
+        for task_id in task_ids
     )
 
+    # Bulk updates bypass the model signals, so bump here too.
+    task_cache.bump(*task_ids)
+
+    event = task_event(project.pk,sequence,kind,task_ids,user)
+    transaction.on_commit(lambda: get_event_hub().publish(project.pk,event))
+
+    return sequence
+
+
+def get_task_changes(project,since,limit):
+    """Changes after sequence since, oldest first, cut at a sequence boundary.
+
+    Returns (changes, cursor, has_more). cursor is what the client sends as
+    since next time; once it has caught up that is the project version, so
+    membership-only bumps are skipped too.
+    """
+    # Read the version first: anything committed after it is left for the
+    # next call rather than half-reported now.
+    version = Project.objects.filter(pk=project.pk).values_list("version",flat=True).get()
+
+    qs = TaskChange.objects.filter(
+        project=project,
+        sequence__gt=since,
+        sequence__lte=version
+    ).order_by("sequence","pk")
+
+    changes = list(qs[:limit + 1])
+    has_more = len(changes) > limit
+
+    if not has_more:
+        return changes,max(since,version),False
+
+    changes = changes[:limit]
+    last = changes[-1].sequence
+
+    if changes[0].sequence == last:
+        # A single write larger than the limit is returned whole.
+        changes = list(qs.filter(sequence=last))
+    else:
+        changes = [change for change in changes if change.sequence < last]
+
+    return changes,changes[-1].sequence,True
+
+
+def get_task_change_floor(project):
+    """Sequence the project's change feed was pruned through; 0 if never."""
+    return TaskChangeFloor.objects.filter(project=project).values_list("sequence",flat=True).first() or 0
+
+
+def prune_task_changes(before):
+    """Delete changes made before the given time, whole sequences at a time.
+
+    Each project's floor moves up to the last sequence removed, so clients
+    still holding an older cursor can be told to reload. Returns the number
+    of changes deleted.
+    """
+    cutoffs = (
+        TaskChange.objects.filter(changed_at__lt=before)
+        .values("project_id")
+        .annotate(sequence=Max("sequence"))
+        .order_by("project_id")
+    )
+
+    deleted = 0
+
+    for cutoff in cutoffs:
+        with transaction.atomic():
+            floor,_ = TaskChangeFloor.objects.select_for_update().get_or_create(project_id=cutoff["project_id"])
+
+            if floor.sequence < cutoff["sequence"]:
+                floor.sequence = cutoff["sequence"]
+                floor.save(update_fields=["sequence"])
+
+            count,_ = TaskChange.objects.filter(
+                project_id=cutoff["project_id"],
+                sequence__lte=cutoff["sequence"]
+            ).delete()
+            deleted += count
+
+    return deleted
+
+
+def mark_task_completed(task,user):
+    with transaction.atomic():
+        # Conditional update so a concurrent completion is not counted twice.
+        completed = Task.objects.filter(pk=task.pk,is_completed=False).update(
+            is_completed=True,
+            completed_by=user,
+            completed_at=timezone.now()
+        )
+
+        if not completed:
+            return False
+
+        record_tasks_completed(task.project)
+        record_task_changes(task.project,TaskChange.COMPLETED,[task.pk],user)
+
+    return True
+
+
+def remove_task(task,user):
+    """Delete task and record it; False if the row was already gone."""
+    project = task.project
+    task_pk = task.pk
+
+    with transaction.atomic():
+        # Counted from the locked row: task may be stale by now.
+        is_completed = Task.objects.select_for_update().filter(pk=task_pk).values_list("is_completed",flat=True).first()
+
+        if is_completed is None:
+            return False
+
+        _,deleted = task.delete()
+
+        if not deleted.get(Task._meta.label):
+            return False
+
+        record_tasks_deleted(project,completed=int(is_completed),pending=int(not is_completed))
+        record_task_changes(project,TaskChange.DELETED,[task_pk],user)
+
+    return True
+
+
+def complete_tasks(project,task_ids,user):
+    """Complete the pending tasks among task_ids; returns how many."""
+    with transaction.atomic():
+        # The rows as they are now, locked: the caller's copies may be stale.
+        pending = list(
+            Task.objects.select_for_update().filter(project=project,pk__in=task_ids,is_completed=False).values_list("pk",flat=True)
+        )
+
+        if not pending:
+            return 0
+
+        completed = Task.objects.filter(pk__in=pending,is_completed=False).update(
+            is_completed=True,
+            completed_by=user,
+            completed_at=timezone.now()
+        )
+
+        record_tasks_completed(project,completed)
+        record_task_changes(project,TaskChange.COMPLETED,pending,user)
+
+    return completed
+
+
+def delete_tasks(project,task_ids,user):
+    """Delete the tasks among task_ids that still exist; returns how many."""
+    with transaction.atomic():
+        rows = dict(
+            Task.objects.select_for_update().filter(project=project,pk__in=task_ids).values_list("pk","is_completed")
+        )
+
+        if not rows:
+            return 0
+
+        Task.objects.filter(pk__in=rows).delete()
+
+        completed = sum(rows.values())
+        record_tasks_deleted(project,completed=completed,pending=len(rows) - completed)
+        record_task_changes(project,TaskChange.DELETED,list(rows),user)
+
+    return len(rows)
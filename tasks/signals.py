@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from projects.cache import project_cache
+from projects.models import Project
+
+from .cache import task_cache
+from .models import Task
+
+
+@receiver(post_save,sender=Task)
+@receiver(post_delete,sender=Task)
+def task_changed(sender,instance,**kwargs):
+    task_cache.bump(instance.pk)
+
+
+def bump_user_tasks(user):
+    # Tasks show their assignee and completer, and project pages and searches
+    # are keyed by the project version.
+    tasks = Task.objects.filter(Q(assigned_to=user) | Q(completed_by=user))
+    rows = list(tasks.values_list("pk","project_id"))
+
+    if not rows:
+        return
+
+    task_cache.bump(*(pk for pk,_ in rows))
+
+    project_ids = {project_id for _,project_id in rows}
+    Project.objects.filter(pk__in=project_ids).update(version=F("version") + 1,updated_at=timezone.now())
+    project_cache.bump(*project_ids)
+
+
+@receiver(post_init,sender=User)
+def remember_username(sender,instance,**kwargs):
+    # __dict__, so a deferred username is not loaded just to remember it.
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+@receiver(post_save,sender=User)
+def user_saved(sender,instance,created,update_fields=None,**kwargs):
+    # Logins save last_login only and password changes leave the name alone;
+    # nothing cached shows anything else.
+    previous = instance._loaded_username
+    instance._loaded_username = instance.username
+
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+
+    if previous != instance.username:
+        bump_user_tasks(instance)
+
+
+@receiver(pre_delete,sender=User)
+def user_deleted(sender,instance,**kwargs):
+    # Before the delete: its SET_NULL updates send no signals for the tasks.
+    bump_user_tasks(instance)
@@ -1,20 +1,45 @@
 import re
+from functools import lru_cache
+
 from django import template
+from django.utils.html import conditional_escape
 from django.utils.safestring import mark_safe
 
 
 register = template.Library()
 
-@register.filter
-def highlight(text,search):
-    if search not in text:
-        return text
-    
-    pattern = re.compile(re.escape(search),re.IGNORECASE)
 
-    highlighted = pattern.sub(
-        lambda m : f"<mark>{m.group(0)}</mark>",
-        search
-    )
+@lru_cache(maxsize=256)
+def compile_highlight_pattern(search):
+    terms = {term.lower(): term for term in search.split()}
+
+    if not terms:
+        return None
+
+    # Longest first so "login" wins over "log" when both are searched.
+    alternatives = sorted(terms.values(),key=len,reverse=True)
+
+    return re.compile("|".join(re.escape(term) for term in alternatives),re.IGNORECASE)
+
+
+@register.filter(needs_autoescape=True)
+def highlight(text,search,autoescape=True):
+    escape = conditional_escape if autoescape else str
+    text = str(text)
+
+    pattern = compile_highlight_pattern(search.strip()) if search else None
+
+    if pattern is None:
+        return escape(text)
+
+    parts = []
+    last = 0
+
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f"<mark>{escape(match.group(0))}</mark>")
+        last = match.end()
+
+    parts.append(escape(text[last:]))
 
-    return mark_safe(highlighted)
\ No newline at end of file
+    return mark_safe("".join(parts))
@@ -1,13 +1,46 @@
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, override_settings
 from django.urls import reverse
 
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+
 from projects.models import Project, ProjectMembership
-from tasks.models import Task
+from tasks.models import ProjectTaskCounter, Task, TaskChange
 
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from .services import (get_ordering,get_tasks_preferences,filter_tasks,search_tasks)
+from asgiref.sync import sync_to_async
+
+from projects.cache import SingleFlight, project_cache
+from projects.permissions import OWNER
+
+from .access import resolve_project, resolve_task
+from .benchmarks import BENCHMARKS, compare_reports
+from .cache import CSRF_TOKEN_MARKER, USERNAME_MARKER, task_cache
+from .events import SUBSCRIBER_QUEUE_SIZE, get_event_hub, task_event
+from .imports import import_tasks, iter_csv_rows, iter_jsonl_rows
+from .templatetags.highlight import compile_highlight_pattern, highlight
+from .services import (get_ordering,get_tasks_preferences,filter_tasks,search_tasks,get_task_counter,
+                       record_task_changes,get_search_result_ids,get_task_list_queryset,rebuild_task_counter,remove_task,
+                       complete_tasks,delete_tasks,mark_task_completed)
+from projects.services import add_member, remove_member
+from projectapp.queries import query_budget
+from projectapp.testing import TestCase
 
 from tasks.models import Task
 
@@ -16,6 +49,7 @@ from tasks.models import Task
 class CreateTaskTest(TestCase):
 
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(
             username="owner",
             password="pass123"
@@ -99,6 +133,7 @@ class CreateTaskTest(TestCase):
 
 class EditTaskTest(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(
             username="owner",
             password="pass123"
@@ -201,6 +236,7 @@ class EditTaskTest(TestCase):
 
 class CompleteTaskTests(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(username="owner",password="pass123")
         self.member = User.objects.create_user(username="member",password="pass123")
         self.other_member = User.objects.create_user(username="other_member",password="pass123")
@@ -320,6 +356,7 @@ class CompleteTaskTests(TestCase):
 
 class TestAssignTask(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(username="owner",password="pass123")
         self.member = User.objects.create_user(username="member",password="pass123")
         self.other = User.objects.create_user(username="other",password="pass123")
@@ -399,6 +436,7 @@ class GetOrderingTest(TestCase):
 
 class GetTaskPreferenceTest(TestCase):
     def setUp(self):
+        super().setUp()
         self.factory = RequestFactory()
 
     
@@ -455,6 +493,7 @@ class GetTaskPreferenceTest(TestCase):
 
 class FilterTaskTests(TestCase):
     def setUp(self):
+        super().setUp()
         self.user = User.objects.create_user(
             username="user",
             password="pass123"
@@ -500,6 +539,7 @@ class FilterTaskTests(TestCase):
 
 class SearchTaskTests(TestCase):
     def setUp(self):
+        super().setUp()
         self.user = User.objects.create_user(
             username="user",
             password="pass123"
@@ -582,6 +622,7 @@ class SearchTaskTests(TestCase):
 
 class TestTaskViewList(TestCase):
     def setUp(self):
+        super().setUp()
         self.owner = User.objects.create_user(
             username="owner",
             password="pass123"
@@ -621,7 +662,7 @@ class TestTaskViewList(TestCase):
             completed_at=timezone.now()
         )
 
-        self.url = reverse("list_task",args=[self.project.pk])
+        self.url = reverse("list_tasks",args=[self.project.pk])
 
 
 
@@ -672,7 +713,7 @@ class TestTaskViewList(TestCase):
             "search": "pending"
         })
 
-        self.assertContains(response,"Pending Task")
+        self.assertContains(response,"<mark>Pending</mark> Task")
         self.assertNotContains(response,"Completed Task")
 
     def test_pagination_limit_results(self):
@@ -697,12 +738,1677 @@ class TestTaskViewList(TestCase):
         self.assertEqual(response.context["pending_count"],1)
 
 
-    
 
+class TaskCounterTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
 
-    
+        ProjectMembership.objects.create(
+            project=self.project,
+            user=self.member
+        )
+
+        self.task = Task.objects.create(
+            title="Existing Task",
+            project=self.project,
+            assigned_to=self.member
+        )
+
+        self.client.login(username="owner",password="pass123")
+
+    def counts(self):
+        counter = ProjectTaskCounter.objects.get(project=self.project)
+        return (counter.total_count,counter.completed_count,counter.pending_count)
+
+    def test_counter_is_built_lazily_from_tasks(self):
+        counter = get_task_counter(self.project)
+
+        self.assertEqual(counter.total_count,1)
+        self.assertEqual(counter.pending_count,1)
+
+    def test_create_complete_delete_keep_counter_in_sync(self):
+        get_task_counter(self.project)
+
+        self.client.post(reverse("create_task",args=[self.project.pk]),{"title": "New Task"})
+        self.assertEqual(self.counts(),(2,0,2))
+
+        self.client.post(reverse("complete_task",args=[self.task.pk]))
+        self.assertEqual(self.counts(),(2,1,1))
+
+        self.client.post(reverse("delete_task",args=[self.task.pk]))
+        self.assertEqual(self.counts(),(1,0,1))
+
+    def test_completing_twice_counts_once(self):
+        get_task_counter(self.project)
+
+        self.client.post(reverse("complete_task",args=[self.task.pk]))
+        response = self.client.post(reverse("complete_task",args=[self.task.pk]))
+
+        self.assertEqual(response.status_code,400)
+        self.assertEqual(self.counts(),(1,1,0))
+
+    def test_deleting_a_deleted_task_counts_once(self):
+        get_task_counter(self.project)
+        # Both requests loaded the task before either deleted it.
+        first,second = Task.objects.get(pk=self.task.pk),Task.objects.get(pk=self.task.pk)
+
+        self.assertTrue(remove_task(first,self.owner))
+        self.assertFalse(remove_task(second,self.owner))
+
+        self.assertEqual(self.counts(),(0,0,0))
+        self.assertEqual(TaskChange.objects.filter(kind=TaskChange.DELETED).count(),1)
+
+    def test_list_view_reads_counts_from_counter(self):
+        get_task_counter(self.project)
+        ProjectTaskCounter.objects.filter(project=self.project).update(total_count=42)
+
+        response = self.client.get(reverse("list_tasks",args=[self.project.pk]))
+
+        self.assertEqual(response.context["total_count"],42)
+
+    def test_rebuild_command_fixes_drift(self):
+        get_task_counter(self.project)
+        ProjectTaskCounter.objects.filter(project=self.project).update(total_count=42)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_task_counters","--check",stdout=StringIO())
+
+        call_command("rebuild_task_counters",stdout=StringIO())
+
+        self.assertEqual(self.counts(),(1,0,1))
+        call_command("rebuild_task_counters","--check",stdout=StringIO())
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        created_at = timezone.now()
+        self.tasks = []
+
+        for i in range(7):
+            task = Task.objects.create(title=f"Task {i}",project=self.project)
+            # Two tasks share every timestamp so the id tie-breaker is exercised.
+            Task.objects.filter(pk=task.pk).update(created_at=created_at + timezone.timedelta(minutes=i // 2))
+            self.tasks.append(task)
+
+        get_task_counter(self.project)
+
+        self.url = reverse("list_tasks",args=[self.project.pk])
+        self.client.login(username="owner",password="pass123")
+
+    def titles(self,response):
+        return [task.title for task in response.context["tasks"]]
+
+    def test_walks_forward_and_back_without_count_queries(self):
+        params = {"status": "all","order": "newest","paginate": "cursor"}
+
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url,params)
+
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in queries.captured_queries))
+        self.assertEqual(self.titles(first),["Task 6","Task 5","Task 4"])
+        self.assertFalse(first.context["page_obj"].has_previous())
+
+        second = self.client.get(self.url,{**params,"cursor": first.context["page_obj"].next_cursor})
+        self.assertEqual(self.titles(second),["Task 3","Task 2","Task 1"])
+
+        third = self.client.get(self.url,{**params,"cursor": second.context["page_obj"].next_cursor})
+        self.assertEqual(self.titles(third),["Task 0"])
+        self.assertFalse(third.context["page_obj"].has_next())
+
+        back = self.client.get(self.url,{**params,"cursor": third.context["page_obj"].previous_cursor})
+        self.assertEqual(self.titles(back),["Task 3","Task 2","Task 1"])
+
+    def test_oldest_ordering(self):
+        params = {"status": "all","order": "oldest","paginate": "cursor"}
+
+        first = self.client.get(self.url,params)
+        second = self.client.get(self.url,{**params,"cursor": first.context["page_obj"].next_cursor})
+
+        self.assertEqual(self.titles(first),["Task 0","Task 1","Task 2"])
+        self.assertEqual(self.titles(second),["Task 3","Task 4","Task 5"])
+
+    def test_respects_status_filter(self):
+        Task.objects.filter(pk=self.tasks[6].pk).update(
+            is_completed=True,
+            completed_by=self.owner,
+            completed_at=timezone.now()
+        )
+
+        response = self.client.get(self.url,{"status": "pending","order": "newest","paginate": "cursor"})
+
+        self.assertEqual(self.titles(response),["Task 5","Task 4","Task 3"])
+
+    def test_invalid_cursor_is_bad_request(self):
+        response = self.client.get(self.url,{"paginate": "cursor","cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code,400)
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="user",password="pass123")
+        self.assignee = User.objects.create_user(username="Alice",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.user
+        )
+
+        self.task1 = Task.objects.create(
+            title="Fix login bug",
+            project=self.project,
+            assigned_to=self.assignee
+        )
+
+        self.task2 = Task.objects.create(
+            title="Login page login copy",
+            project=self.project
+        )
+
+        self.base_qs = Task.objects.filter(project=self.project)
+
+    def test_prefix_terms_must_all_match(self):
+        qs = search_tasks(self.base_qs,"fi log")
+
+        self.assertEqual(list(qs),[self.task1])
+
+    def test_project_limits_the_index_lookup(self):
+        other = Project.objects.create(name="Other Project",owner=self.user)
+        Task.objects.create(title="Fix login elsewhere",project=other)
+
+        qs = search_tasks(Task.objects.all(),"fix login",project=self.project)
+
+        self.assertEqual(list(qs),[self.task1])
+
+    def test_index_follows_bulk_updates_and_deletes(self):
+        Task.objects.filter(pk=self.task2.pk).update(title="Refactor settings")
+
+        self.assertEqual(list(search_tasks(self.base_qs,"refactor")),[self.task2])
+
+        Task.objects.filter(pk=self.task2.pk).delete()
+
+        self.assertFalse(search_tasks(self.base_qs,"refactor").exists())
+
+    def test_renaming_assignee_updates_index(self):
+        self.assignee.username = "Carol"
+        self.assignee.save()
+
+        self.assertEqual(list(search_tasks(self.base_qs,"carol")),[self.task1])
+        self.assertFalse(search_tasks(self.base_qs,"alice").exists())
+
+    def test_ranked_search_orders_by_relevance(self):
+        qs = search_tasks(self.base_qs,"login",ranked=True)
+
+        self.assertEqual(list(qs),[self.task2,self.task1])
+
+    def test_query_without_words_falls_back_to_like(self):
+        self.assertFalse(search_tasks(self.base_qs,"%%").exists())
+
+    @override_settings(TASKS_SEARCH_BACKEND="tasks.search.LikeSearchBackend")
+    def test_like_backend_matches_substrings(self):
+        self.assertEqual(list(search_tasks(self.base_qs,"ogin bu")),[self.task1])
+
+class HighlightFilterTests(TestCase):
+    def test_highlights_matches_in_text_preserving_case(self):
+        self.assertEqual(highlight("Fix Login bug","login"),"Fix <mark>Login</mark> bug")
+
+    def test_highlights_several_terms_in_one_pass(self):
+        self.assertEqual(
+            highlight("Fix login bug","bug fix"),
+            "<mark>Fix</mark> login <mark>bug</mark>"
+        )
+
+    def test_prefers_longest_overlapping_term(self):
+        self.assertEqual(highlight("login","log login"),"<mark>login</mark>")
+
+    def test_escapes_title_and_terms(self):
+        self.assertEqual(
+            highlight("<b>Fix</b> & ship","<b>"),
+            "<mark>&lt;b&gt;</mark>Fix&lt;/b&gt; &amp; ship"
+        )
+
+    def test_without_search_returns_escaped_text(self):
+        self.assertEqual(highlight("<script>",""),"&lt;script&gt;")
+
+    def test_reuses_compiled_pattern(self):
+        compile_highlight_pattern.cache_clear()
+
+        highlight("Fix login bug","login")
+        highlight("Add search","login")
+
+        self.assertEqual(compile_highlight_pattern.cache_info().misses,1)
+
+class BulkTaskActionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        ProjectMembership.objects.create(
+            project=self.project,
+            user=self.member
+        )
+
+        self.task1 = Task.objects.create(title="Task 1",project=self.project,assigned_to=self.member)
+        self.task2 = Task.objects.create(title="Task 2",project=self.project,assigned_to=self.member)
+        self.task3 = Task.objects.create(title="Task 3",project=self.project)
+
+        get_task_counter(self.project)
+
+        self.url = reverse("bulk_task_action",args=[self.project.pk])
+
+    def post(self,action,tasks,**data):
+        return self.client.post(self.url,{
+            "action": action,
+            "task_ids": [task.pk for task in tasks],
+            **data
+        })
+
+    def counts(self):
+        counter = ProjectTaskCounter.objects.get(project=self.project)
+        return (counter.total_count,counter.completed_count,counter.pending_count)
+
+    def test_stale_selection_is_counted_from_the_current_rows(self):
+        # Loaded as pending, then completed elsewhere before the bulk write.
+        self.assertTrue(mark_task_completed(self.task1,self.other))
+
+        self.assertEqual(complete_tasks(self.project,[self.task1.pk,self.task2.pk],self.owner),1)
+        self.assertEqual(self.counts(),(3,2,1))
+        self.assertEqual(
+            list(TaskChange.objects.filter(kind=TaskChange.COMPLETED,changed_by=self.owner).values_list("task_id",flat=True)),
+            [self.task2.pk]
+        )
+
+        # task3 was deleted elsewhere; task1 and task2 were completed.
+        self.assertTrue(remove_task(Task.objects.get(pk=self.task3.pk),self.other))
+
+        self.assertEqual(delete_tasks(self.project,[self.task1.pk,self.task2.pk,self.task3.pk],self.owner),2)
+        self.assertEqual(self.counts(),(0,0,0))
+        self.assertEqual(TaskChange.objects.filter(kind=TaskChange.DELETED,changed_by=self.owner).count(),2)
+
+    def test_owner_completes_many_with_audit_data(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.post("complete",[self.task1,self.task3])
+
+        self.assertEqual(response.status_code,302)
+        self.assertEqual(
+            set(Task.objects.filter(is_completed=True,completed_by=self.owner,completed_at__isnull=False)),
+            {self.task1,self.task3}
+        )
+        self.assertEqual(self.counts(),(3,2,1))
+
+    def test_member_completes_own_tasks(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.post("complete",[self.task1,self.task2])
+
+        self.assertEqual(response.status_code,302)
+        self.assertEqual(Task.objects.filter(is_completed=True).count(),2)
+
+    def test_member_cannot_complete_unassigned_task(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.post("complete",[self.task1,self.task3])
+
+        self.assertEqual(response.status_code,403)
+        self.assertFalse(Task.objects.filter(is_completed=True).exists())
+
+    def test_owner_assigns_many(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.post("assign",[self.task1,self.task3],assigned_to=self.owner.pk)
+
+        self.assertEqual(response.status_code,302)
+        self.assertEqual(Task.objects.filter(assigned_to=self.owner).count(),2)
+
+    def test_cannot_assign_to_non_member(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.post("assign",[self.task3],assigned_to=self.other.pk)
+
+        self.assertEqual(response.status_code,400)
+        self.assertIsNone(Task.objects.get(pk=self.task3.pk).assigned_to)
+
+    def test_owner_deletes_many(self):
+        self.client.login(username="owner",password="pass123")
+
+        self.post("complete",[self.task1])
+        response = self.post("delete",[self.task1,self.task3])
+
+        self.assertEqual(response.status_code,302)
+        self.assertEqual(list(Task.objects.all()),[self.task2])
+        self.assertEqual(self.counts(),(1,0,1))
+
+    def test_member_cannot_delete(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.post("delete",[self.task1])
+
+        self.assertEqual(response.status_code,403)
+        self.assertEqual(Task.objects.count(),3)
+
+    def test_rejects_tasks_from_other_projects(self):
+        other_project = Project.objects.create(name="Other",owner=self.owner)
+        foreign = Task.objects.create(title="Foreign",project=other_project)
+
+        self.client.login(username="owner",password="pass123")
+
+        response = self.post("delete",[self.task1,foreign])
+
+        self.assertEqual(response.status_code,400)
+        self.assertTrue(Task.objects.filter(pk=foreign.pk).exists())
+
+class ExportTasksTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        self.pending = Task.objects.create(
+            title="Write, then ship",
+            project=self.project,
+            assigned_to=self.owner
+        )
+
+        self.completed = Task.objects.create(
+            title="Plan release",
+            project=self.project,
+            is_completed=True,
+            completed_by=self.owner,
+            completed_at=timezone.now()
+        )
+
+        self.url = reverse("export_tasks",args=[self.project.pk])
+
+    def content(self,response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_exports_csv(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url)
+        rows = list(csv.reader(StringIO(self.content(response))))
+
+        self.assertEqual(response["Content-Type"],"text/csv")
+        self.assertEqual(rows[0][:3],["id","title","is_completed"])
+        self.assertEqual([row[1] for row in rows[1:]],["Write, then ship","Plan release"])
+        self.assertEqual(rows[1][3],"owner")
+
+    def test_exports_jsonl_with_filters(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"format": "jsonl","status": "completed"})
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+
+        self.assertEqual(len(lines),1)
+        self.assertEqual(lines[0]["title"],"Plan release")
+        self.assertEqual(lines[0]["completed_by"],"owner")
+
+    def test_exports_search_results(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"format": "jsonl","search": "ship"})
+        lines = self.content(response).splitlines()
+
+        self.assertEqual([json.loads(line)["id"] for line in lines],[self.pending.pk])
+
+    def test_unknown_format_is_bad_request(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"format": "xlsx"})
+
+        self.assertEqual(response.status_code,400)
+
+    def test_stranger_cannot_export(self):
+        self.client.login(username="stranger",password="pass123")
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code,403)
+
+class ImportTasksTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other = User.objects.create_user(username="other",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        ProjectMembership.objects.create(
+            project=self.project,
+            user=self.member
+        )
+
+        self.csv = (
+            "title,assigned_to\n"
+            "First,member\n"
+            "Second,\n"
+            ",member\n"
+            "Fourth,other\n"
+            "Fifth,owner\n"
+        )
+
+    def test_imports_csv_in_chunks(self):
+        rows = iter_csv_rows(StringIO(self.csv))
+
+        report = import_tasks(self.project,rows,chunk_size=2)
+
+        self.assertEqual(report.created,3)
+        self.assertEqual([line for line,_ in report.errors],[4,5])
+        self.assertIn("other is not a member",report.errors[1][1])
+        self.assertEqual(
+            dict(Task.objects.values_list("title","assigned_to__username")),
+            {"First": "member","Second": None,"Fifth": "owner"}
+        )
+        self.assertEqual(get_task_counter(self.project).total_count,3)
+
+    def test_imports_jsonl_and_reports_bad_lines(self):
+        jsonl = '{"title": "First"}\n\nnot json\n["list"]\n{"title": "Second", "assigned_to": "member"}\n'
+
+        report = import_tasks(self.project,iter_jsonl_rows(StringIO(jsonl)))
+
+        self.assertEqual(report.created,2)
+        self.assertEqual([line for line,_ in report.errors],[3,4])
+
+    def test_member_cannot_assign_on_import(self):
+        report = import_tasks(self.project,iter_csv_rows(StringIO(self.csv)),user=self.member)
+
+        self.assertEqual(report.created,1)
+        self.assertEqual(list(Task.objects.values_list("title",flat=True)),["Second"])
+
+    def test_upload_view(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.post(reverse("import_tasks",args=[self.project.pk]),{
+            "format": "csv",
+            "file": SimpleUploadedFile("tasks.csv",self.csv.encode()),
+        })
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.context["report"].created,3)
+        self.assertContains(response,"Line 5: other is not a member")
+
+    def test_stranger_cannot_upload(self):
+        self.client.login(username="other",password="pass123")
+
+        response = self.client.post(reverse("import_tasks",args=[self.project.pk]),{
+            "format": "csv",
+            "file": SimpleUploadedFile("tasks.csv",self.csv.encode()),
+        })
+
+        self.assertEqual(response.status_code,403)
+        self.assertFalse(Task.objects.exists())
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w",suffix=".csv",delete=False) as handle:
+            handle.write(self.csv)
+
+        self.addCleanup(os.remove,handle.name)
+
+        out = StringIO()
+        call_command("import_tasks",self.project.pk,handle.name,stdout=out,stderr=StringIO())
+
+        self.assertIn("Created 3 task(s), skipped 2 row(s)",out.getvalue())
+
+    def upload(self,content,file_format="csv"):
+        self.client.login(username="owner",password="pass123")
+
+        return self.client.post(reverse("import_tasks",args=[self.project.pk]),{
+            "format": file_format,
+            "file": SimpleUploadedFile(f"tasks.{file_format}",content),
+        })
+
+    def test_upload_that_is_not_utf8_is_a_form_error(self):
+        response = self.upload("title\nCaf\xe9\n".encode("latin-1"))
+
+        self.assertEqual(response.status_code,200)
+        self.assertFormError(
+            response.context["form"],"file","The file is not valid UTF-8 (line 1); the rows after it were not imported."
+        )
+        self.assertFalse(Task.objects.exists())
+
+        response = self.upload('{"title": "Caf\xe9"}\n'.encode("latin-1"),"jsonl")
+
+        self.assertEqual(response.status_code,200)
+        self.assertTrue(response.context["form"].has_error("file"))
+
+    def test_malformed_csv_stops_the_import(self):
+        oversized = "title\nFirst\n" + "x" * (csv.field_size_limit() + 1) + "\nLast\n"
+
+        report = import_tasks(self.project,iter_csv_rows(StringIO(oversized)))
+
+        self.assertEqual(report.created,1)
+        self.assertEqual(report.unreadable[0],3)
+        self.assertIn("Invalid CSV",report.unreadable[1])
+
+        response = self.upload(oversized.encode())
+
+        self.assertEqual(response.status_code,200)
+        self.assertTrue(response.context["form"].has_error("file"))
+
+    def test_management_command_rejects_unreadable_files(self):
+        for content in ["title\nCaf\xe9\n".encode("latin-1"),("title\n" + "x" * (csv.field_size_limit() + 1) + "\n").encode()]:
+            with tempfile.NamedTemporaryFile("wb",suffix=".csv",delete=False) as handle:
+                handle.write(content)
+
+            self.addCleanup(os.remove,handle.name)
+
+            with self.assertRaises(CommandError):
+                call_command("import_tasks",self.project.pk,handle.name,stdout=StringIO(),stderr=StringIO())
+
+class TaskApiTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.other_member = User.objects.create_user(username="other_member",password="pass123")
+
+        self.project = Project.objects.create(
+            name="Test Project",
+            owner=self.owner
+        )
+
+        for user in (self.member,self.other_member):
+            ProjectMembership.objects.create(project=self.project,user=user)
+
+        self.task = Task.objects.create(title="Fix login bug",project=self.project,assigned_to=self.member)
+        Task.objects.create(title="Write docs",project=self.project)
+
+        self.list_url = reverse("api_task_list",args=[self.project.pk])
+        self.detail_url = reverse("api_task_detail",args=[self.task.pk])
+
+    def send(self,method,url,data):
+        return getattr(self.client,method)(url,data=json.dumps(data),content_type="application/json")
+
+    def test_lists_tasks_with_filters_and_counts(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.client.get(self.list_url,{"search": "login","limit": 1})
+        data = response.json()
+
+        self.assertEqual([task["title"] for task in data["results"]],["Fix login bug"])
+        self.assertEqual(data["results"][0]["assigned_to"]["username"],"member")
+        self.assertEqual(data["counts"],{"total": 2,"completed": 0,"pending": 2})
+        self.assertIsNone(data["next_cursor"])
+
+    def test_list_pages_with_cursor(self):
+        self.client.login(username="member",password="pass123")
+
+        first = self.client.get(self.list_url,{"limit": 1}).json()
+        second = self.client.get(self.list_url,{"limit": 1,"cursor": first["next_cursor"]}).json()
+
+        self.assertEqual(
+            [first["results"][0]["title"],second["results"][0]["title"]],
+            ["Write docs","Fix login bug"]
+        )
+
+    def test_list_rejects_bad_parameters(self):
+        self.client.login(username="member",password="pass123")
+
+        self.assertEqual(self.client.get(self.list_url,{"status": "done"}).status_code,400)
+        self.assertEqual(self.client.get(self.list_url,{"cursor": "bogus"}).status_code,400)
+
+    def test_list_conditional_get_until_a_write(self):
+        self.client.login(username="owner",password="pass123")
+
+        first = self.client.get(self.list_url)
+
+        # Session and user only: the project and role come from the cache.
+        with self.assertNumQueries(2):
+            cached = self.client.get(self.list_url,HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(cached.status_code,304)
+
+        created = self.send("post",self.list_url,{"title": "New","assigned_to": self.member.pk})
+        changed = self.client.get(self.list_url,HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(created.status_code,201)
+        self.assertEqual(created.json()["assigned_to"]["username"],"member")
+        self.assertEqual(changed.status_code,200)
+        self.assertEqual(changed.json()["counts"]["total"],3)
+
+    def test_member_cannot_assign_on_create(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.send("post",self.list_url,{"title": "New","assigned_to": self.member.pk})
+
+        self.assertEqual(response.status_code,403)
+
+    def test_assignee_completes_task(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.send("patch",self.detail_url,{"is_completed": True})
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()["completed_by"]["username"],"member")
+        self.assertEqual(
+            self.send("patch",self.detail_url,{"is_completed": True}).status_code,
+            400
+        )
+
+    def test_non_assigned_member_cannot_edit(self):
+        self.client.login(username="other_member",password="pass123")
+
+        response = self.send("patch",self.detail_url,{"title": "Other Edit"})
+
+        self.task.refresh_from_db()
+
+        self.assertEqual(response.status_code,403)
+        self.assertEqual(self.task.title,"Fix login bug")
+
+    def test_owner_reassigns_and_rejects_non_members(self):
+        stranger = User.objects.create_user(username="stranger",password="pass123")
+        self.client.login(username="owner",password="pass123")
+
+        self.assertEqual(self.send("patch",self.detail_url,{"assigned_to": stranger.pk}).status_code,400)
+
+        response = self.send("patch",self.detail_url,{"assigned_to": None,"title": "Renamed"})
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()["title"],"Renamed")
+        self.assertIsNone(response.json()["assigned_to"])
+
+    def test_patch_records_a_change_per_field(self):
+        self.client.login(username="owner",password="pass123")
+
+        self.send("patch",self.detail_url,{"assigned_to": self.other_member.pk,"title": "Renamed"})
+
+        self.assertEqual(
+            list(TaskChange.objects.filter(task_id=self.task.pk).order_by("sequence").values_list("kind",flat=True)),
+            [TaskChange.UPDATED,TaskChange.ASSIGNED]
+        )
+
+    def test_delete_is_owner_only(self):
+        self.client.login(username="member",password="pass123")
+        self.assertEqual(self.client.delete(self.detail_url).status_code,403)
+
+        self.client.login(username="owner",password="pass123")
+        self.assertEqual(self.client.delete(self.detail_url).status_code,204)
+        self.assertFalse(Task.objects.filter(pk=self.task.pk).exists())
+
+
+class AsyncTaskListTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        for i in range(4):
+            Task.objects.create(title=f"Task {i}",project=self.project)
+
+        Task.objects.create(
+            title="Done",
+            project=self.project,
+            is_completed=True,
+            completed_by=self.owner,
+            completed_at=timezone.now()
+        )
+
+        self.url = reverse("list_tasks_async",args=[self.project.pk])
+
+    def test_anonymous_user_is_redirected(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code,302)
+
+    def test_non_member_is_forbidden(self):
+        self.client.login(username="stranger",password="pass123")
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code,403)
+
+    def test_matches_sync_view(self):
+        self.client.login(username="member",password="pass123")
+
+        sync_response = self.client.get(reverse("list_tasks",args=[self.project.pk]),{"status": "all","page": 2})
+        async_response = self.client.get(self.url,{"status": "all","page": 2})
+
+        self.assertEqual(async_response.status_code,200)
+        self.assertEqual(
+            [task.pk for task in async_response.context["tasks"]],
+            [task.pk for task in sync_response.context["tasks"]]
+        )
+        self.assertEqual(async_response.context["paginator"].count,5)
+        self.assertEqual(async_response.context["page_obj"].number,2)
+        self.assertEqual(async_response.context["completed_count"],1)
+        self.assertEqual(async_response.context["pending_count"],4)
+
+    def test_out_of_range_page_is_404(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"status": "all","page": 9})
+
+        self.assertEqual(response.status_code,404)
+
+    def test_last_page(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"status": "all","page": "last"})
+
+        self.assertEqual(response.context["page_obj"].number,2)
+        self.assertEqual(len(response.context["tasks"]),2)
+
+    def test_cursor_pagination(self):
+        self.client.login(username="owner",password="pass123")
+
+        response = self.client.get(self.url,{"status": "all","paginate": "cursor"})
+
+        self.assertEqual(len(response.context["tasks"]),3)
+        self.assertTrue(response.context["page_obj"].has_next())
+
+
+class TaskChangeFeedTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.url = reverse("api_task_changes",args=[self.project.pk])
+        self.client.login(username="owner",password="pass123")
+
+    def create(self,title):
+        self.client.post(reverse("create_task",args=[self.project.pk]),{"title": title})
+        return Task.objects.get(title=title)
+
+    def test_views_record_changes_in_sequence(self):
+        task = self.create("First")
+        self.client.post(reverse("assign_task",args=[task.pk]),{"assigned_to": self.member.pk})
+        self.client.post(reverse("complete_task",args=[task.pk]))
+        self.client.post(reverse("delete_task",args=[task.pk]))
+
+        changes = list(TaskChange.objects.filter(project=self.project).order_by("sequence"))
+
+        self.assertEqual(
+            [change.kind for change in changes],
+            [TaskChange.CREATED,TaskChange.ASSIGNED,TaskChange.COMPLETED,TaskChange.DELETED]
+        )
+        self.assertTrue(all(change.task_id == task.pk for change in changes))
+        self.assertEqual(
+            [change.sequence for change in changes],
+            sorted({change.sequence for change in changes})
+        )
+        self.project.refresh_from_db()
+        self.assertEqual(changes[-1].sequence,self.project.version)
+
+    def test_delta_returns_only_changes_after_since(self):
+        first = self.create("First")
+        cursor = self.client.get(self.url).json()["cursor"]
+
+        second = self.create("Second")
+        self.client.post(reverse("delete_task",args=[first.pk]))
+
+        data = self.client.get(self.url,{"since": cursor}).json()
+
+        self.assertEqual([task["id"] for task in data["tasks"]],[second.pk])
+        self.assertEqual(data["deleted"],[first.pk])
+        self.assertFalse(data["has_more"])
+
+        caught_up = self.client.get(self.url,{"since": data["cursor"]}).json()
+
+        self.assertEqual(caught_up["tasks"],[])
+        self.assertEqual(caught_up["deleted"],[])
+        self.assertEqual(caught_up["cursor"],data["cursor"])
+
+    def test_repeated_changes_collapse_to_latest_state(self):
+        task = self.create("First")
+        self.client.post(reverse("edit_task",args=[task.pk]),{"title": "Renamed"})
+
+        data = self.client.get(self.url).json()
+
+        self.assertEqual([task["title"] for task in data["tasks"]],["Renamed"])
+
+    def test_limit_pages_at_sequence_boundaries(self):
+        for title in ("One","Two","Three"):
+            self.create(title)
+
+        tasks = list(Task.objects.filter(project=self.project))
+        self.client.post(
+            reverse("bulk_task_action",args=[self.project.pk]),
+            {"action": "complete","task_ids": [task.pk for task in tasks]}
+        )
+
+        first = self.client.get(self.url,{"limit": 4}).json()
+        second = self.client.get(self.url,{"since": first["cursor"],"limit": 4}).json()
+
+        # The three creations fit; the bulk completion is one write of three
+        # changes, so it is not split across pages.
+        self.assertTrue(first["has_more"])
+        self.assertEqual(len(first["tasks"]),3)
+        self.assertEqual(len(second["tasks"]),3)
+        self.assertTrue(all(task["is_completed"] for task in second["tasks"]))
+        self.assertFalse(second["has_more"])
+        self.assertEqual(
+            TaskChange.objects.filter(project=self.project,sequence__gt=first["cursor"]).count(),
+            3
+        )
+
+    def test_import_records_creations(self):
+        import_tasks(self.project,[(1,{"title": "Imported"},None)],user=self.owner)
+
+        change = TaskChange.objects.get(project=self.project)
+
+        self.assertEqual(change.kind,TaskChange.CREATED)
+        self.assertEqual(change.task_id,Task.objects.get(title="Imported").pk)
+
+    def test_invalid_since_is_400(self):
+        self.assertEqual(self.client.get(self.url,{"since": "x"}).status_code,400)
+        self.assertEqual(self.client.get(self.url,{"since": -1}).status_code,400)
+
+    def test_non_member_is_forbidden(self):
+        self.client.login(username="stranger",password="pass123")
+
+        self.assertEqual(self.client.get(self.url).status_code,403)
+
+    def test_cursor_older_than_pruned_changes_is_gone(self):
+        old = self.create("Old")
+        TaskChange.objects.filter(task_id=old.pk).update(changed_at=timezone.now() - timezone.timedelta(days=60))
+        floor = TaskChange.objects.get(task_id=old.pk).sequence
+        new = self.create("New")
+
+        out = StringIO()
+        call_command("prune_task_changes","--days",30,stdout=out)
+
+        self.assertIn("Pruned 1 task change(s)",out.getvalue())
+        self.assertFalse(TaskChange.objects.filter(task_id=old.pk).exists())
+        self.assertEqual(self.client.get(self.url).status_code,410)
+
+        data = self.client.get(self.url,{"since": floor}).json()
+
+        self.assertEqual([task["id"] for task in data["tasks"]],[new.pk])
+
+
+@override_settings(TASKS_EVENT_HUB="tasks.events.RecordingEventHub",TASKS_EVENTS_HEARTBEAT=0.05)
+class TaskEventsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        self.url = reverse("task_events",args=[self.project.pk])
+
+        self.hub = get_event_hub()
+        self.hub.clear()
+
+    def test_changes_are_published_after_commit(self):
+        self.client.login(username="owner",password="pass123")
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post(reverse("create_task",args=[self.project.pk]),{"title": "Live"})
+
+        self.assertEqual(self.hub.published,[])
+
+        for callback in callbacks:
+            callback()
+
+        task = Task.objects.get(title="Live")
+        project_id,event = self.hub.published[0]
+
+        self.assertEqual(project_id,self.project.pk)
+        self.assertEqual(event["kind"],TaskChange.CREATED)
+        self.assertEqual(event["tasks"],[task.pk])
+        self.assertEqual(event["user"],self.owner.pk)
+
+    def test_sync_server_is_refused(self):
+        self.client.login(username="owner",password="pass123")
+
+        self.assertEqual(self.client.get(self.url).status_code,501)
+
+    async def test_non_member_is_forbidden(self):
+        await self.async_client.aforce_login(self.stranger)
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code,403)
+
+    async def test_stream_replays_then_pushes_live_events(self):
+        sequence = await sync_to_async(
+            lambda: record_task_changes(self.project,TaskChange.CREATED,[41])
+        )()
+
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(self.url,{"since": 0})
+        stream = aiter(response.streaming_content)
+
+        self.assertEqual(response["Content-Type"],"text/event-stream")
+        self.assertEqual(await anext(stream),b"retry: 3000\n\n")
+
+        replayed = (await anext(stream)).decode()
+
+        self.assertIn(f"id: {sequence}\nevent: created\n",replayed)
+        self.assertIn('"tasks": [41]',replayed)
+
+        self.hub.publish(self.project.pk,task_event(self.project.pk,sequence,"created",[41]))
+        self.hub.publish(self.project.pk,task_event(self.project.pk,sequence + 1,"deleted",[41]))
+
+        # The first event is already covered by the replay.
+        self.assertIn(f"id: {sequence + 1}\nevent: deleted\n",(await anext(stream)).decode())
+        self.assertEqual(await anext(stream),b": keep-alive\n\n")
+
+        # A client disconnect cancels the pending read; the subscription
+        # goes with it.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+        self.assertEqual(self.hub.subscribers,{})
+
+    async def test_slow_listener_is_told_to_resync(self):
+        subscription = self.hub.subscribe(self.project.pk)
+
+        for sequence in range(SUBSCRIBER_QUEUE_SIZE + 1):
+            self.hub.publish(self.project.pk,task_event(self.project.pk,sequence,"created",[1]))
+
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.queue.qsize(),SUBSCRIBER_QUEUE_SIZE)
+        self.assertEqual(self.hub.subscribers,{})
+
+
+class ProjectAccessTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+        self.stranger = User.objects.create_user(username="stranger",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.task = Task.objects.create(title="Task",project=self.project,assigned_to=self.member)
+        self.factory = RequestFactory()
+
+    def resolve(self,user):
+        request = self.factory.get("/")
+        request.user = user
+
+        with self.assertNumQueries(1):
+            task = resolve_task(request,self.task.pk)
+            self.assertEqual(task.project.owner,self.owner)
+            self.assertEqual(task.assigned_to,self.member)
+
+        return request.project_role
+
+    def test_task_project_owner_and_role_in_one_query(self):
+        self.assertEqual(self.resolve(self.owner),OWNER)
+        self.assertEqual(self.resolve(self.member),ProjectMembership.MEMBER)
+        self.assertIsNone(self.resolve(self.stranger))
+
+    def test_resolve_project_sets_role(self):
+        request = self.factory.get("/")
+        request.user = self.member
+
+        with self.assertNumQueries(1):
+            project = resolve_project(request,self.project.pk)
+
+        self.assertEqual(project,self.project)
+        self.assertEqual(request.project_role,ProjectMembership.MEMBER)
+
+    def test_edit_view_resolves_access_once(self):
+        self.client.force_login(self.member)
+        url = reverse("edit_task",args=[self.task.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code,200)
+        # The task, its project and the membership flag come from the same statement.
+        self.assertEqual(
+            [query["sql"] for query in queries if '"tasks_task"' in query["sql"]],
+            [query["sql"] for query in queries if '"projects_project"' in query["sql"]]
+        )
+        self.assertEqual(len([query for query in queries if '"tasks_task"' in query["sql"]]),1)
+
+    def test_only_owner_can_delete_through_view(self):
+        self.client.force_login(self.member)
+
+        response = self.client.post(reverse("delete_task",args=[self.task.pk]))
+
+        self.assertEqual(response.status_code,403)
+        self.assertTrue(Task.objects.filter(pk=self.task.pk).exists())
+
+    def test_anonymous_user_is_redirected_from_list(self):
+        response = self.client.get(reverse("list_tasks",args=[self.project.pk]))
+
+        self.assertEqual(response.status_code,302)
+
+
+class TaskListPermissionsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.mine = Task.objects.create(title="Mine",project=self.project,assigned_to=self.member)
+        self.other = Task.objects.create(title="Other",project=self.project)
+
+    def test_list_rows_carry_permissions(self):
+        self.client.login(username="member",password="pass123")
+
+        response = self.client.get(reverse("list_tasks",args=[self.project.pk]),{"status": "all"})
+        permissions = {task.pk: task.permissions for task in response.context["tasks"]}
+
+        self.assertTrue(permissions[self.mine.pk].can_complete)
+        self.assertFalse(permissions[self.other.pk].can_edit)
+        self.assertContains(response,reverse("edit_task",args=[self.mine.pk]))
+        self.assertNotContains(response,reverse("edit_task",args=[self.other.pk]))
+        self.assertNotContains(response,reverse("delete_task",args=[self.mine.pk]))
+
+    def test_api_rows_carry_permissions(self):
+        self.client.login(username="member",password="pass123")
+
+        results = self.client.get(reverse("api_task_list",args=[self.project.pk])).json()["results"]
+        permissions = {task["id"]: task["permissions"] for task in results}
+
+        self.assertEqual(
+            permissions[self.mine.pk],
+            {"can_edit": True,"can_complete": True,"can_assign": False,"can_delete": False}
+        )
+        self.assertFalse(any(permissions[self.other.pk].values()))
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        task_cache.reset_stats()
+        project_cache.reset_stats()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.task = Task.objects.create(title="Task",project=self.project,assigned_to=self.member)
+        self.factory = RequestFactory()
+
+    def resolve(self,user,method="get"):
+        request = getattr(self.factory,method)("/")
+        request.user = user
+
+        return resolve_task(request,self.task.pk),request.project_role
+
+    def test_warm_lookup_costs_no_queries(self):
+        self.resolve(self.member)
+
+        with self.assertNumQueries(0):
+            task,role = self.resolve(self.member)
+            self.assertEqual(task.title,"Task")
+            self.assertEqual(task.project.owner,self.owner)
+            self.assertEqual(task.assigned_to,self.member)
+
+        self.assertEqual(role,ProjectMembership.MEMBER)
+        self.assertEqual(task_cache.stats()["hits"],1)
+        self.assertEqual(task_cache.stats()["misses"],1)
+
+    def test_writes_skip_the_cache(self):
+        self.resolve(self.member)
+
+        with self.assertNumQueries(1):
+            self.resolve(self.member,"post")
+
+    def test_cached_copy_has_no_annotations(self):
+        self.resolve(self.member)
+        task,role = self.resolve(self.member)
+
+        self.assertFalse(hasattr(task,"is_member"))
+
+    def test_save_invalidates(self):
+        self.resolve(self.member)
+
+        self.task.title = "Renamed"
+        self.task.save()
+
+        task,role = self.resolve(self.member)
+        self.assertEqual(task.title,"Renamed")
+
+    def test_recorded_changes_invalidate(self):
+        self.resolve(self.member)
+
+        Task.objects.filter(pk=self.task.pk).update(is_completed=True,completed_by=self.owner,completed_at=timezone.now())
+        record_task_changes(self.project,TaskChange.COMPLETED,[self.task.pk],self.owner)
+
+        task,role = self.resolve(self.member)
+        self.assertTrue(task.is_completed)
+
+    def test_project_version_bump_invalidates_project(self):
+        self.resolve(self.member)
+        version = self.task.project.version
+
+        record_task_changes(self.project,TaskChange.UPDATED,[self.task.pk],self.owner)
+
+        task,role = self.resolve(self.member)
+        self.assertEqual(task.project.version,version + 1)
+
+    def test_delete_invalidates(self):
+        self.resolve(self.member)
+
+        self.task.delete()
+
+        with self.assertRaises(Http404):
+            self.resolve(self.member)
+
+    def test_edit_view_saves_changes_once_cached(self):
+        self.client.force_login(self.member)
+        url = reverse("edit_task",args=[self.task.pk])
+
+        self.client.get(url)
+        self.client.post(url,{"title": "Edited"})
+
+        self.assertEqual(self.client.get(reverse("api_task_detail",args=[self.task.pk])).json()["title"],"Edited")
+
+
+@override_settings(TASKS_LIST_CACHE_TIMEOUT=60)
+class TaskListPageCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.alice = User.objects.create_user(username="alice",password="pass123")
+        self.bob = User.objects.create_user(username="bob",password="pass123")
+        self.carol = User.objects.create_user(username="carol",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+
+        for user in (self.alice,self.bob,self.carol):
+            ProjectMembership.objects.create(project=self.project,user=user)
+
+        self.alice_task = Task.objects.create(title="Alice task",project=self.project,assigned_to=self.alice)
+        self.bob_task = Task.objects.create(title="Bob task",project=self.project,assigned_to=self.bob)
+
+        self.url = reverse("list_tasks",args=[self.project.pk])
+
+    def get(self,user,**params):
+        self.client.force_login(user)
+        return self.client.get(self.url,{"status": "all",**params})
+
+    def edit_links(self,response):
+        return [
+            task.pk for task in (self.alice_task,self.bob_task)
+            if reverse("edit_task",args=[task.pk]) in response.content.decode()
+        ]
+
+    def test_repeat_view_skips_task_queries_and_rendering(self):
+        self.get(self.alice)
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertTemplateNotUsed("list_task.html"):
+                response = self.get(self.alice)
+
+        self.assertEqual(response.status_code,200)
+        self.assertContains(response,"Alice task")
+        self.assertFalse(any('"tasks_' in query["sql"] for query in queries))
+
+    def test_viewer_values_are_filled_in_per_request(self):
+        dave = User.objects.create_user(username="dave",password="pass123")
+        add_member(self.project,dave)
+
+        # Neither has an assignment, so both share one entry.
+        self.get(self.carol)
+        response = self.get(dave)
+        content = response.content.decode()
+
+        self.assertIn("Logged is as : dave",content)
+        self.assertNotIn("carol",content)
+        self.assertNotIn(CSRF_TOKEN_MARKER,content)
+        self.assertNotIn(USERNAME_MARKER,content)
+
+        # The token in the page is accepted for the viewer's own session.
+        csrf_client = self.client_class(enforce_csrf_checks=True)
+        csrf_client.force_login(dave)
+        page = csrf_client.get(self.url,{"status": "all"}).content.decode()
+        token = page.split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+
+        response = csrf_client.post(reverse("logout"),{"csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code,302)
+
+    def test_assignees_get_their_own_links(self):
+        self.assertEqual(self.edit_links(self.get(self.alice)),[self.alice_task.pk])
+        self.assertEqual(self.edit_links(self.get(self.bob)),[self.bob_task.pk])
+        self.assertEqual(self.edit_links(self.get(self.carol)),[])
+        self.assertEqual(len(self.edit_links(self.get(self.owner))),2)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.get(self.carol)
+
+        response = self.get(self.carol,search="Bob")
+
+        self.assertContains(response,f'name="task_ids" value="{self.bob_task.pk}"')
+        self.assertNotContains(response,"Alice task")
+
+    def test_task_writes_invalidate(self):
+        self.get(self.carol)
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse("create_task",args=[self.project.pk]),{"title": "Fresh task"})
+
+        self.assertContains(self.get(self.carol),"Fresh task")
+
+    def test_membership_changes_invalidate(self):
+        self.get(self.carol)
+
+        remove_member(self.project,self.carol)
+
+        self.assertEqual(self.get(self.carol).status_code,403)
+
+    @override_settings(TASKS_LIST_CACHE_TIMEOUT=0)
+    def test_disabled_by_default(self):
+        self.get(self.carol)
+
+        with self.assertTemplateUsed("list_task.html"):
+            self.get(self.carol)
+
+
+class TaskRowCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}",project=self.project,assigned_to=self.member)
+            for i in range(3)
+        ]
+
+        self.url = reverse("list_tasks",args=[self.project.pk])
+
+    def rendered_rows(self,user,**params):
+        self.client.force_login(user)
+        response = self.client.get(self.url,{"status": "all",**params})
+
+        self.assertEqual(response.status_code,200)
+        return len([template for template in response.templates if template.name == "task_row.html"]),response
+
+    def test_unchanged_rows_are_not_rendered_again(self):
+        self.assertEqual(self.rendered_rows(self.member)[0],3)
+        self.assertEqual(self.rendered_rows(self.member)[0],0)
+
+    def test_changed_row_is_rendered_again(self):
+        self.rendered_rows(self.member)
+
+        self.tasks[0].title = "Renamed"
+        self.tasks[0].save()
+
+        count,response = self.rendered_rows(self.member)
+
+        self.assertEqual(count,1)
+        self.assertContains(response,"Renamed")
+
+    def test_rows_depend_on_permissions_and_search(self):
+        self.rendered_rows(self.member)
+
+        count,response = self.rendered_rows(self.owner)
+        self.assertEqual(count,3)
+        self.assertContains(response,reverse("delete_task",args=[self.tasks[0].pk]))
+
+        count,response = self.rendered_rows(self.member,search="Task")
+        self.assertEqual(count,3)
+        self.assertContains(response,"<mark>Task</mark>")
+
+    def test_rows_hold_no_csrf_token(self):
+        count,response = self.rendered_rows(self.member)
+
+        self.assertEqual(response.content.decode().count("csrfmiddlewaretoken"),3)
+        self.assertContains(response,f'formaction="{reverse("complete_task",args=[self.tasks[0].pk])}"')
+
+    def test_renaming_or_deleting_the_assignee_renders_rows_again(self):
+        assignee = User.objects.create_user(username="assignee_before",password="pass123")
+        ProjectMembership.objects.create(project=self.project,user=assignee)
+        Task.objects.filter(pk=self.tasks[0].pk).update(assigned_to=assignee)
+        task_cache.bump(self.tasks[0].pk)
+
+        self.assertContains(self.rendered_rows(self.owner)[1],"assignee_before")
+
+        assignee.username = "assignee_after"
+        assignee.save()
+
+        count,response = self.rendered_rows(self.owner)
+        self.assertEqual(count,1)
+        self.assertContains(response,"assignee_after")
+
+        assignee.delete()
+
+        count,response = self.rendered_rows(self.owner)
+        self.assertEqual(count,1)
+        self.assertNotContains(response,"assignee_after")
+
+    def test_saving_a_user_without_renaming_keeps_the_rows(self):
+        Task.objects.filter(pk=self.tasks[0].pk).update(assigned_to=self.member)
+        version = Project.objects.get(pk=self.project.pk).version
+
+        self.member.first_name = "Mel"
+        self.member.save()
+
+        self.assertEqual(Project.objects.get(pk=self.project.pk).version,version)
+
+    @override_settings(TASKS_ROW_CACHE_TIMEOUT=0)
+    def test_can_be_turned_off(self):
+        self.rendered_rows(self.member)
+
+        self.assertEqual(self.rendered_rows(self.member)[0],3)
+
+
+class SearchResultCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+
+        self.login_task = Task.objects.create(title="Fix login",project=self.project)
+        Task.objects.create(title="Write docs",project=self.project)
+
+    def search(self,search="login",status="all"):
+        project = Project.objects.get(pk=self.project.pk)
+        return list(get_task_list_queryset(project,status,"newest",search))
+
+    def test_repeat_search_reuses_ids(self):
+        self.assertEqual(self.search(),[self.login_task])
+
+        project = Project.objects.get(pk=self.project.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_search_result_ids(project,"all","newest","login"),[self.login_task.pk])
+
+        self.assertEqual(len(queries),0)
+
+    def test_status_is_part_of_the_key(self):
+        self.search()
+
+        self.assertEqual(self.search(status="completed"),[])
+
+    def test_task_writes_start_a_new_entry(self):
+        self.search()
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse("create_task",args=[self.project.pk]),{"title": "Login page copy"})
+
+        self.assertEqual(len(self.search()),2)
+
+    def test_list_view_serves_search_from_cached_ids(self):
+        self.client.force_login(self.owner)
+        url = reverse("list_tasks",args=[self.project.pk])
+
+        self.client.get(url,{"status": "all","search": "login"})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url,{"status": "all","search": "login"})
+
+        self.assertContains(response,"<mark>login</mark>")
+        self.assertFalse(any("LIKE" in query["sql"] or "MATCH" in query["sql"] for query in queries))
+
+    @override_settings(TASKS_SEARCH_CACHE_TIMEOUT=0)
+    def test_can_be_turned_off(self):
+        project = Project.objects.get(pk=self.project.pk)
+
+        self.assertIsNone(get_search_result_ids(project,"all","newest","login"))
+        self.assertEqual(self.search(),[self.login_task])
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+        results = []
+
+        def slow():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        def call():
+            results.append(flight.do("key",slow))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+
+        followers = [threading.Thread(target=call) for _ in range(4)]
+
+        for thread in followers:
+            thread.start()
+
+        while flight.coalesced < 4:
+            time.sleep(0.001)
+
+        release.set()
+
+        for thread in [leader,*followers]:
+            thread.join(5)
+
+        self.assertEqual(len(runs),1)
+        self.assertEqual(results,["result"] * 5)
+        self.assertEqual(flight.calls,{})
+
+    def test_waiters_retry_after_an_error(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def flaky():
+            calls.append(1)
+
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+                raise ValueError("first call fails")
+
+            return "retried"
+
+        errors = []
+        leader = threading.Thread(target=lambda: errors.append(self.capture(flight,flaky)))
+        leader.start()
+        started.wait(5)
+
+        results = []
+        follower = threading.Thread(target=lambda: results.append(flight.do("key",flaky)))
+        follower.start()
+
+        while flight.coalesced < 1:
+            time.sleep(0.001)
+
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertIsInstance(errors[0],ValueError)
+        self.assertEqual(results,["retried"])
+
+    def capture(self,flight,func):
+        try:
+            flight.do("key",func)
+        except ValueError as exc:
+            return exc
+
+
+class TaskViewQueryBudgetTests(TestCase):
+    """Pinned query counts, session and auth lookups included.
+
+    Raise a budget only for a deliberate change; query_budget also fails on
+    any statement repeated in a loop.
+    """
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner",password="pass123")
+        self.member = User.objects.create_user(username="member",password="pass123")
+
+        self.project = Project.objects.create(name="Test Project",owner=self.owner)
+        ProjectMembership.objects.create(project=self.project,user=self.member)
+
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}",project=self.project,assigned_to=self.member)
+            for i in range(6)
+        ]
+        rebuild_task_counter(self.project)
+
+        self.client.force_login(self.owner)
+
+    def test_task_list(self):
+        with query_budget(10):
+            response = self.client.get(reverse("list_tasks",args=[self.project.pk]),{"status": "all"})
+
+        self.assertEqual(response.status_code,200)
+
+    def test_create_task(self):
+        with query_budget(10):
+            response = self.client.post(reverse("create_task",args=[self.project.pk]),{"title": "New"})
+
+        self.assertEqual(response.status_code,302)
+
+    def test_edit_task(self):
+        with query_budget(9):
+            response = self.client.post(reverse("edit_task",args=[self.tasks[0].pk]),{"title": "Edited"})
+
+        self.assertEqual(response.status_code,302)
+
+    def test_assign_task(self):
+        with query_budget(11):
+            response = self.client.post(
+                reverse("assign_task",args=[self.tasks[0].pk]),
+                {"assigned_to": self.member.pk}
+            )
+
+        self.assertEqual(response.status_code,302)
+
+    def test_complete_task(self):
+        with query_budget(10):
+            response = self.client.post(reverse("complete_task",args=[self.tasks[0].pk]))
+
+        self.assertEqual(response.status_code,302)
+
+    def test_delete_task(self):
+        with query_budget(11):
+            response = self.client.post(reverse("delete_task",args=[self.tasks[0].pk]))
+
+        self.assertEqual(response.status_code,302)
+
+    def test_bulk_action_is_flat_in_the_number_of_tasks(self):
+        with query_budget(12):
+            response = self.client.post(
+                reverse("bulk_task_action",args=[self.project.pk]),
+                {"action": "complete","task_ids": [task.pk for task in self.tasks]}
+            )
+
+        self.assertEqual(response.status_code,302)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def report(self,**medians):
+        return {"dataset": {},"benchmarks": {name: {"median_ms": median} for name,median in medians.items()}}
+
+    def run_benchmarks(self,*args):
+        out = StringIO()
+
+        # The test database is already a throwaway one.
+        with self.settings(BENCHMARK_DIR=self.directory):
+            call_command(
+                "run_benchmarks","--use-configured-database",
+                "--projects","1","--tasks","8","--members","2","--repeat","2","--warmup","0",
+                *args,stdout=out,stderr=StringIO()
+            )
+
+        return out.getvalue()
+
+    def test_compare_flags_slowdowns_over_the_threshold(self):
+        comparisons = compare_reports(
+            self.report(a=1.3,b=1.2,c=0.5,new=1.0),
+            self.report(a=1.0,b=1.0,c=1.0,gone=1.0),
+            0.25
+        )
+
+        self.assertEqual([(c.name,c.regressed) for c in comparisons],[("a",True),("b",False),("c",False)])
+
+    def test_every_benchmark_runs_and_results_are_saved(self):
+        self.run_benchmarks("--save-baseline")
+
+        with open(os.path.join(self.directory,"latest.json")) as handle:
+            report = json.load(handle)
+
+        self.assertEqual(set(report["benchmarks"]),set(BENCHMARKS))
+        self.assertEqual(report["dataset"],{"projects": 1,"tasks": 8,"members": 2})
+        self.assertTrue(os.path.exists(os.path.join(self.directory,"baseline.json")))
+        # The seeded rows are removed afterwards.
+        self.assertFalse(Project.objects.exists())
+
+    def test_cache_entries_of_the_site_are_left_alone(self):
+        cache.set("site-entry","kept")
+
+        self.run_benchmarks("--only","views.TaskListView")
 
+        self.assertEqual(cache.get("site-entry"),"kept")
+        self.assertFalse(any(key.startswith(":1:objects:") for key in cache._cache))
 
+    def test_regression_against_the_baseline_fails_the_run(self):
+        baseline = self.report(**{"services.filter_tasks": 1e-9})
+        baseline["dataset"] = {"projects": 1,"tasks": 8,"members": 2}
 
+        with open(os.path.join(self.directory,"baseline.json"),"w") as handle:
+            json.dump(baseline,handle)
 
+        with self.assertRaisesMessage(CommandError,"services.filter_tasks"):
+            self.run_benchmarks("--only","filter_tasks")
 
+        out = self.run_benchmarks("--only","filter_tasks","--threshold","1e12")
+        self.assertIn("services.filter_tasks",out)
@@ -7,7 +7,11 @@ urlpatterns = [
     path('projects/<int:project_id>/tasks/create/',views.TaskCreateView.as_view(),name="create_task"),
 
     #list Task
-    path('project/<int:project_id>/tasks/',views.TaskListView.as_view(),name = "list_task"),
+    path('project/<int:project_id>/tasks/',views.TaskListView.as_view(),name = "list_tasks"),
+    path('project/<int:project_id>/tasks/async/',views.list_tasks_async,name = "list_tasks_async"),
+
+    #Live task events (ASGI only)
+    path('project/<int:project_id>/tasks/events/',views.task_events,name="task_events"),
 
     #Edit Task
 
@@ -22,7 +26,16 @@ urlpatterns = [
     path('<int:task_id>/assign/',views.assign_task,name = "assign_task"),
 
     #Delete Task
-    path("<int:pk>/delete",views.TaskDeleteView.as_view(),name= "delete_task")
+    path("<int:pk>/delete",views.TaskDeleteView.as_view(),name= "delete_task"),
+
+    #Bulk complete/assign/delete
+    path('project/<int:project_id>/tasks/bulk/',views.bulk_task_action,name="bulk_task_action"),
+
+    #Export Tasks
+    path('project/<int:project_id>/tasks/export/',views.export_tasks,name="export_tasks"),
+
+    #Import Tasks
+    path('project/<int:project_id>/tasks/import/',views.upload_tasks,name="import_tasks"),
 
     
 
@@ -1,30 +1,47 @@
-from django.utils import timezone
-from django.shortcuts import render,get_object_or_404,redirect
+import asyncio
+import io
+from itertools import groupby
+
+from django.shortcuts import render,aget_object_or_404,redirect
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.contrib.auth.models import User
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView,UpdateView,CreateView,DeleteView
+from django.views.decorators.http import require_POST
 from django.urls import reverse
 
-from projects.models import Project,ProjectMembership
-from projects.permissions import can_edit_taks, is_project_member,can_toggle_task,can_assign_task,can_transfer_ownership
-from tasks.forms import TaskForm,AssignTaskForm
-from tasks.models import Task
-from django.http import HttpResponseBadRequest,HttpResponseForbidden
-from django.core.paginator import Paginator
-
-from .services import (get_ordering,filter_tasks,get_tasks_preferences,search_tasks)
+from projectapp.metrics import CACHE_REQUESTS
+from projects.permissions import OWNER,can_edit_taks,get_task_permissions,can_toggle_task
+from tasks.forms import TaskForm,AssignTaskForm,BulkTaskActionForm,TaskImportForm
+from tasks.models import Task,TaskChange
+from django.http import HttpResponseBadRequest,HttpResponseForbidden,StreamingHttpResponse
+from django.core.paginator import InvalidPage,Page,Paginator
+from django.http import Http404,HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from .access import ProjectAccessMixin,project_access_queryset,resolve_project,resolve_role,resolve_task
+from .cache import list_page_cache_key,list_page_placeholders,personalize_list_page,task_cache,task_row_cache_key
+from .events import format_sse,get_event_hub,task_event
+from .exports import EXPORT_FORMATS,export_rows
+from .imports import ROW_READERS,import_tasks
+from .pagination import paginate_by_cursor
+from .services import (get_ordering,filter_tasks,get_tasks_preferences,search_tasks,
+                       get_task_changes,get_task_counter,get_task_list_queryset,mark_task_completed,record_tasks_created,
+                       record_task_changes,remove_task,complete_tasks,delete_tasks)
 
 # Create your views here.
 
 @login_required
 def create_task(request,project_id):
-    project = get_object_or_404(Project,pk=project_id)
+    project = resolve_project(request,project_id)
 
-    if not (
-        project.owner == request.user or 
-        project.members.filter(pk=request.user.pk).exists()
-    ):
+    if request.project_role is None:
         return HttpResponseForbidden()
     
     if request.method == "POST":
@@ -33,7 +50,12 @@ def create_task(request,project_id):
         if form.is_valid()  :
             task = form.save(commit=False)
             task.project = project
-            task.save()
+
+            with transaction.atomic():
+                task.save()
+                record_tasks_created(project)
+                record_task_changes(project,TaskChange.CREATED,[task.pk],request.user)
+
             return redirect("list_projects")
 
     else:
@@ -45,21 +67,22 @@ def create_task(request,project_id):
 
 @login_required
 def edit_task(request,task_id):
-    task = get_object_or_404(Task,pk=task_id)
+    task = resolve_task(request,task_id)
 
     project = task.project
 
-    if not (
-        request.user == project.owner or task.assigned_to == request.user
-    ):
+    if request.project_role is None or not can_edit_taks(request.user,task):
         return HttpResponseForbidden()
     
     if request.method == "POST":
         form = TaskForm(request.POST,instance=task)
 
         if form.is_valid():
-            form.save()
-            return redirect('list_task',project_id=project.pk)
+            with transaction.atomic():
+                form.save()
+                record_task_changes(project,TaskChange.UPDATED,[task.pk],request.user)
+
+            return redirect('list_tasks',project_id=project.pk)
 
     else:
         form = TaskForm(instance=task)
@@ -78,37 +101,38 @@ def edit_task(request,task_id):
 
 @login_required
 def complete_task(request,task_id):
-    task = get_object_or_404(Task,pk=task_id)
+    task = resolve_task(request,task_id)
     project = task.project
 
-    if not can_toggle_task(request.user,task):
+    if request.project_role is None or not can_toggle_task(request.user,task):
         raise PermissionDenied
     
 
     if task.is_completed:
         return HttpResponseBadRequest("The Task is Already Completed")
     
-    task.is_completed = True
-    task.completed_by =  request.user
-    task.completed_at = timezone.now()
-    task.save()
+    if not mark_task_completed(task,request.user):
+        return HttpResponseBadRequest("The Task is Already Completed")
 
     return redirect("list_tasks",project_id=project.pk)
 
 
 @login_required
 def assign_task(request,task_id):
-    task = get_object_or_404(Task,pk=task_id)
+    task = resolve_task(request,task_id)
     project = task.project
 
 
-    if request.user != project.owner:
+    if request.project_role != OWNER:
         return HttpResponseForbidden()
     
     if request.method == "POST":
         form = AssignTaskForm(request.POST,instance=task,project=project)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                record_task_changes(project,TaskChange.ASSIGNED,[task.pk],request.user)
+
             return redirect('list_tasks',project_id=project.pk)
     else:
         form = AssignTaskForm(instance=task,project=project)
@@ -126,57 +150,228 @@ def assign_task(request,task_id):
 
 @login_required
 def delete_task(request,task_id):
-    task = get_object_or_404(Task,pk=task_id)
+    task = resolve_task(request,task_id)
 
     project = task.project
 
-    if not request.user == project.owner:
+    if request.project_role != OWNER:
         return HttpResponseForbidden()
     
     if request.method == "POST":
-        task.delete()
+        remove_task(task,request.user)
         
     return redirect("list_tasks",project_id=project.pk)
 
 
+@login_required
+@require_POST
+def bulk_task_action(request,project_id):
+    project = resolve_project(request,project_id)
+    is_owner = request.project_role == OWNER
+
+    if request.project_role is None:
+        return HttpResponseForbidden()
+
+    form = BulkTaskActionForm(request.POST,project=project)
+
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    action = form.cleaned_data["action"]
+    tasks = list(form.cleaned_data["task_ids"])
+    task_pks = [task.pk for task in tasks]
+
+    # Same rules as complete_task/assign_task/delete_task, evaluated on the
+    # rows the form already loaded instead of one lookup per task.
+    if action == BulkTaskActionForm.COMPLETE:
+        allowed = is_owner or all(task.assigned_to_id == request.user.pk for task in tasks)
+    else:
+        allowed = is_owner
+
+    if not allowed:
+        raise PermissionDenied
+
+    if action == BulkTaskActionForm.COMPLETE:
+        complete_tasks(project,task_pks,request.user)
+
+    elif action == BulkTaskActionForm.ASSIGN:
+        with transaction.atomic():
+            Task.objects.filter(pk__in=task_pks).update(
+                assigned_to=form.cleaned_data["assigned_to"]
+            )
+            record_task_changes(project,TaskChange.ASSIGNED,task_pks,request.user)
+
+    else:
+        delete_tasks(project,task_pks,request.user)
+
+    return redirect("list_tasks",project_id=project.pk)
+
+
+@login_required
+def export_tasks(request,project_id):
+    project = resolve_project(request,project_id)
+
+    if request.project_role is None:
+        return HttpResponseForbidden()
+
+    export_format = request.GET.get("format","csv")
+
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unsupported export format")
+
+    content_type,stream = EXPORT_FORMATS[export_format]
+
+    qs = Task.objects.filter(project=project)
+    qs = filter_tasks(qs,request.GET.get("status","all"))
+    qs = search_tasks(qs,request.GET.get("search","").strip(),project=project)
+
+    response = StreamingHttpResponse(stream(export_rows(qs)),content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="project-{project.pk}-tasks.{export_format}"'
+
+    return response
+
+
+@login_required
+def upload_tasks(request,project_id):
+    project = resolve_project(request,project_id)
+
+    if request.project_role is None:
+        return HttpResponseForbidden()
+
+    report = None
+
+    if request.method == "POST":
+        form = TaskImportForm(request.POST,request.FILES)
+
+        if form.is_valid():
+            # Large uploads are spooled to a temporary file; wrapping it
+            # reads rows lazily instead of loading the upload into memory.
+            textfile = io.TextIOWrapper(form.cleaned_data["file"].file,encoding="utf-8-sig",newline="")
+            rows = ROW_READERS[form.cleaned_data["format"]](textfile)
+
+            report = import_tasks(project,rows,user=request.user)
+
+            if report.unreadable:
+                line,message = report.unreadable
+                form.add_error("file",f"{message} (line {line}); the rows after it were not imported.")
+
+    else:
+        form = TaskImportForm()
+
+    return render(
+        request,
+        "import_tasks.html",
+        {
+            "form": form,
+            "project": project,
+            "report": report
+        }
+    )
+
+
+
+
+def task_list_context(project,status,order,search,counter,cursor_pagination):
+    return {
+        "project": project,
+        "status": status,
+        "order": order,
+        "search": search,
+        "total_count": counter.total_count,
+        "completed_count": counter.completed_count,
+        "pending_count": counter.pending_count,
+        "cursor_pagination": cursor_pagination,
+        "bulk_form": BulkTaskActionForm(project=project),
+    }
+
+
+def attach_task_permissions(user,project,tasks,role):
+    permissions = get_task_permissions(user,project,tasks,role)
+
+    for task in tasks:
+        task.permissions = permissions[task.pk]
 
 
-class TaskListView(ListView):
+def attach_task_rows(tasks,search):
+    """Set task.row_html, rendering only the rows not found in the cache.
+
+    Call after attach_task_permissions.
+    """
+    versions = task_cache.get_versions([task.pk for task in tasks])
+    keys = {task.pk: task_row_cache_key(task,versions[task.pk],search) for task in tasks}
+    rows = cache.get_many(keys.values())
+    rendered = {}
+
+    CACHE_REQUESTS.inc(len(rows),cache="tasks:row",result="hit")
+    CACHE_REQUESTS.inc(len(keys) - len(rows),cache="tasks:row",result="miss")
+
+    for task in tasks:
+        key = keys[task.pk]
+
+        if key not in rows:
+            rows[key] = rendered[key] = render_to_string("task_row.html",{"task": task,"search": search})
+
+        task.row_html = mark_safe(rows[key])
+
+    if rendered and settings.TASKS_ROW_CACHE_TIMEOUT:
+        cache.set_many(rendered,settings.TASKS_ROW_CACHE_TIMEOUT)
+
+
+class TaskListView(LoginRequiredMixin,ProjectAccessMixin,ListView):
     model = Task
     template_name = "list_task.html"
     context_object_name = "tasks"
     paginate_by = 3
+    page_cache_key = None
 
 
-    def dispatch(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
+        if not settings.TASKS_LIST_CACHE_TIMEOUT:
+            return super().get(request, *args, **kwargs)
 
-        self.project = get_object_or_404(Project,pk=kwargs["project_id"])
+        status,order = get_tasks_preferences(request)
+        self.page_cache_key = list_page_cache_key(request,self.project,request.project_role,status,order)
+        content = cache.get(self.page_cache_key)
+        CACHE_REQUESTS.inc(cache="tasks:list",result="miss" if content is None else "hit")
+
+        if content is not None:
+            return HttpResponse(personalize_list_page(request,content))
+
+        response = super().get(request, *args, **kwargs)
+        response.render()
+        cache.set(self.page_cache_key,response.content,settings.TASKS_LIST_CACHE_TIMEOUT)
+        response.content = personalize_list_page(request,response.content)
+
+        return response
 
-        if not (
-            request.user == self.project.owner or self.project.members.filter(pk=request.user.pk).exists()
-        ):
-            return HttpResponseForbidden()
-        
-        return super().dispatch(request, *args, **kwargs)
-    
 
     def get_queryset(self):
 
         status,order = get_tasks_preferences(self.request)
 
-        ordering = get_ordering(order)
-
         search = self.request.GET.get("search","").strip()
 
-        qs = (
-            Task.objects.filter(project=self.project).order_by(ordering).select_related("assigned_to")
-        )
+        return get_task_list_queryset(self.project,status,order,search)
+    
+
+    def uses_cursor_pagination(self):
+        return self.request.GET.get("paginate") == "cursor"
+    
 
-        qs = filter_tasks(qs,status)
-        qs = search_tasks(qs,search)
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
 
+        status,order = get_tasks_preferences(self.request)
+
+        page = paginate_by_cursor(
+            queryset,
+            self.request.GET.get("cursor"),
+            page_size,
+            descending=get_ordering(order).startswith("-")
+        )
 
-        return qs
+        return None,page,page.object_list,page.has_other_pages()
     
 
     def get_context_data(self, **kwargs):
@@ -184,38 +379,207 @@ class TaskListView(ListView):
 
         status,order = get_tasks_preferences(self.request)
 
-        base_qs = Task.objects.filter(project=self.project)
+        counter = get_task_counter(self.project)
+
+        context.update(task_list_context(
+            self.project,
+            status,
+            order,
+            self.request.GET.get("search","").strip(),
+            counter,
+            self.uses_cursor_pagination()
+        ))
+
+        attach_task_permissions(self.request.user,self.project,context["tasks"],self.request.project_role)
+        attach_task_rows(context["tasks"],context["search"])
 
-        context.update({
-            "project": self.project,
-            "status": status,
-            "order": order,
-            "search": self.request.GET.get("search","").strip(),
-            "total_count": base_qs.count(),
-            "completed_count": base_qs.filter(is_completed=True).count(),
-            "pending_count":base_qs.filter(is_completed=False).count(),
-        })
+        if self.page_cache_key is not None:
+            context.update(list_page_placeholders())
 
         return context
 
 
-class TaskUpdateView(UpdateView):
+async def aresolve_project(user,project_id):
+    project = await aget_object_or_404(project_access_queryset(user),pk=project_id)
+    return project,resolve_role(user,project,project.is_member)
+
+
+async def fetch_task_page(queryset,number,per_page):
+    bottom = (number - 1) * per_page
+    return [task async for task in queryset[bottom:bottom + per_page]]
+
+
+@login_required
+async def list_tasks_async(request,project_id):
+    """Async variant of TaskListView for the ASGI entry point.
+
+    The project and the caller's role come from one query. The ORM's
+    async calls run one after another on the request's connection, so the
+    page rows, the paginator COUNT and the status counters are awaited in
+    turn.
+    """
+    user = await request.auser()
+    project,role = await aresolve_project(user,project_id)
+
+    if role is None:
+        return HttpResponseForbidden()
+
+    status,order = await sync_to_async(get_tasks_preferences)(request)
+    search = request.GET.get("search","").strip()
+    cursor_pagination = request.GET.get("paginate") == "cursor"
+    per_page = TaskListView.paginate_by
+
+    # The search backend may probe the connection while building the queryset.
+    queryset = await sync_to_async(get_task_list_queryset)(project,status,order,search)
+    paginator = Paginator(queryset,per_page)
+
+    if cursor_pagination:
+        page = await sync_to_async(paginate_by_cursor)(
+            queryset,
+            request.GET.get("cursor"),
+            per_page,
+            descending=get_ordering(order).startswith("-")
+        )
+        counter = await sync_to_async(get_task_counter)(project)
+    else:
+        page_number = request.GET.get("page") or 1
+
+        if page_number == "last":
+            paginator.count = await queryset.acount()
+            page_number = paginator.num_pages
+
+        try:
+            number = int(page_number)
+        except (TypeError,ValueError):
+            raise Http404("Invalid page")
+
+        if number < 1:
+            raise Http404("Invalid page")
+
+        rows = await fetch_task_page(queryset,number,per_page)
+        paginator.count = await queryset.acount()
+        counter = await sync_to_async(get_task_counter)(project)
+
+        try:
+            paginator.validate_number(number)
+        except InvalidPage:
+            raise Http404("Invalid page")
+
+        page = Page(rows,number,paginator)
+
+    context = {
+        "paginator": None if cursor_pagination else paginator,
+        "page_obj": page,
+        "is_paginated": page.has_other_pages(),
+        "object_list": page.object_list,
+        "tasks": page.object_list,
+    }
+    context.update(task_list_context(project,status,order,search,counter,cursor_pagination))
+    attach_task_permissions(user,project,page.object_list,role)
+
+    # Row and template rendering still touch lazy relations and the session.
+    await sync_to_async(attach_task_rows)(page.object_list,search)
+
+    return await sync_to_async(render)(request,TaskListView.template_name,context)
+
+
+REPLAY_BATCH_SIZE = 500
+
+
+async def stream_task_events(project,since,heartbeat):
+    """Server-sent events for project, resuming after sequence since.
+
+    The subscription is taken before the replay from the change feed, so
+    nothing committed in between is lost; events the replay already covered
+    are skipped.
+    """
+    subscription = get_event_hub().subscribe(project.pk)
+    last = since
+
+    try:
+        yield "retry: 3000\n\n"
+
+        if since is not None:
+            has_more = True
+
+            while has_more:
+                changes,last,has_more = await sync_to_async(get_task_changes)(project,last,REPLAY_BATCH_SIZE)
+
+                for (sequence,kind,user_id),group in groupby(
+                    changes,
+                    key=lambda change: (change.sequence,change.kind,change.changed_by_id)
+                ):
+                    event = task_event(project.pk,sequence,kind,[change.task_id for change in group])
+                    event["user"] = user_id
+                    yield format_sse(event)
+
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                # Events were dropped: the client reconnects with
+                # Last-Event-ID and replays them from the change feed.
+                yield "event: resync\ndata: {}\n\n"
+                return
+
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            if last is not None and event["sequence"] <= last:
+                continue
+
+            last = event["sequence"]
+            yield format_sse(event)
+    finally:
+        subscription.close()
+
+
+@login_required
+async def task_events(request,project_id):
+    # Under WSGI the stream would be buffered to completion, i.e. forever.
+    if not isinstance(request,ASGIRequest):
+        return HttpResponse("Live task events need the ASGI server.",status=501)
+
+    user = await request.auser()
+    project,role = await aresolve_project(user,project_id)
+
+    if role is None:
+        return HttpResponseForbidden()
+
+    since = request.headers.get("Last-Event-ID") or request.GET.get("since")
+
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return HttpResponseBadRequest("since must be a number")
+
+    response = StreamingHttpResponse(
+        stream_task_events(project,since,settings.TASKS_EVENTS_HEARTBEAT),
+        content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+
+    return response
+
+
+class TaskUpdateView(LoginRequiredMixin,ProjectAccessMixin,UpdateView):
     model = Task
     form_class = TaskForm
     template_name = "edit_task.html"
     context_object_name = "task"
 
-    def dispatch(self, request, *args, **kwargs):
-        self.task = self.get_object()
-        self.project = self.task.project
+    def has_task_access(self):
+        return can_edit_taks(self.request.user,self.task)
+    
 
-        if not (
-            request.user == self.project.owner or self.project.members.filter(pk=request.user.pk).exists()
-        ):
-            return HttpResponseForbidden()
+    def form_valid(self, form):
+        with transaction.atomic():
+            response = super().form_valid(form)
+            record_task_changes(self.project,TaskChange.UPDATED,[self.object.pk],self.request.user)
 
-        return super().dispatch(request, *args, **kwargs)
-    
+        return response
 
     def get_success_url(self):
         return reverse("list_tasks",args=[self.project.pk])
@@ -226,28 +590,20 @@ class TaskUpdateView(UpdateView):
         return context
     
 
-class TaskCreateView(CreateView):
+class TaskCreateView(LoginRequiredMixin,ProjectAccessMixin,CreateView):
     model = Task
     form_class = TaskForm
     template_name = 'create_task.html'
 
-
-    def dispatch(self, request, *args, **kwargs):
-
-        self.project = get_object_or_404(Project,pk=kwargs["project_id"])
-
-        if not (
-            request.user == self.project.owner or self.project.members.filter(pk=request.user.pk).exists()
-        ):
-            return HttpResponseForbidden()
-        
-
-        return super().dispatch(request, *args, **kwargs)
-    
     def form_valid(self, form):
         form.instance.project = self.project
 
-        return super().form_valid(form)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            record_tasks_created(self.project)
+            record_task_changes(self.project,TaskChange.CREATED,[self.object.pk],self.request.user)
+
+        return response
     
     def get_success_url(self):
         return reverse("list_tasks",args=[self.project.pk])
@@ -258,22 +614,18 @@ class TaskCreateView(CreateView):
         return context
 
 
-class TaskDeleteView(DeleteView):
+class TaskDeleteView(LoginRequiredMixin,ProjectAccessMixin,DeleteView):
     model = Task
     template_name = 'delete_task.html'
     context_object_name = 'tasks'
 
+    def has_task_access(self):
+        return self.request.project_role == OWNER
+    
+    def form_valid(self, form):
+        remove_task(self.object,self.request.user)
 
-    def dispatch(self, request, *args, **kwargs):
-        self.task = self.get_object()
-        self.project = self.task.project
-
-        if not (
-            request.user == self.project.owner or self.project.members.filter(pk=request.user.pk).exists()
-        ):
-            return HttpResponseForbidden()
-
-        return super().dispatch(request, *args, **kwargs)
+        return redirect(self.get_success_url())
     
     def get_success_url(self):
         return reverse("list_tasks",args=[self.project.pk])